@@ -1,19 +1,14 @@
 # app/agents/research_agent.py
-import openai
 import os
 import datetime
 import re # <--- IMPORTANTE: Añadir import re
 from app.core.config import settings
 from app.services.gdrive_service import GDriveService
 from app.services.persistence_service import PersistenceService
+from app.core.llm_client import llm_client
 
-# Verificar que settings.OPENAI_API_KEY tiene un valor antes de asignarlo
-if not settings.OPENAI_API_KEY:
-    print("ERROR CRÍTICO research_agent.py: La clave API de OpenAI no está configurada en settings.")
-    openai.api_key = None # Asegurar que es None si no está configurado
-else:
-    openai.api_key = settings.OPENAI_API_KEY
-    print(f"DEBUG research_agent.py: OpenAI API Key configurada: {bool(openai.api_key)}")
+if not llm_client.available:
+    print("ERROR CRÍTICO research_agent.py: Cliente LLM no disponible (clave API de OpenAI no configurada o SDK ausente).")
 
 
 class ResearchAgent:
@@ -83,21 +78,20 @@ Asegúrate de que el informe sea profesional, esté bien organizado y sea direct
         print(f"INFO ResearchAgent: Iniciando investigación sobre '{topic}'...")
 
         prompt = self._generate_research_prompt(topic, content_to_analyze)
-        if not openai.api_key: # Doble chequeo, por si acaso.
+        if not llm_client.available: # Doble chequeo, por si acaso.
             error_msg = "Error de configuración: La clave API de OpenAI no está asignada al cliente de OpenAI."
             print(f"ERROR ResearchAgent: {error_msg}")
             return {"error": error_msg, "report_gdrive_link": None, "report_summary_for_db": None}
         try:
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
+            generated_report_content = llm_client.complete(
                 messages=[
                     {"role": "system", "content": "Eres un asistente de investigación de alta calidad."},
                     {"role": "user", "content": prompt}
                 ],
+                operation="research_agent",
                 temperature=0.6,
                 max_tokens=2000
             )
-            generated_report_content = response.choices[0].message.content.strip()
         except Exception as e:
             error_msg = f"Error al contactar OpenAI: {e}"
             print(f"ERROR ResearchAgent: {error_msg}")
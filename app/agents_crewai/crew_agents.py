@@ -5,6 +5,8 @@ from crewai import Agent
 import sys
 import os
 import logging
+import time
+from typing import Any, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO) # O DEBUG
@@ -46,8 +48,23 @@ except Exception as e_cat_inst:
 try:
     from langchain_community.tools.tavily_search import TavilySearchResults
     from app.core.config import settings
+    from app.core.metrics import instrument_tool
+    from app.core.cancellation import check_cancelled
+
+    class InstrumentedTavilySearchResults(TavilySearchResults):
+        """TavilySearchResults con métricas de duración/errores por ejecución y punto de cancelación."""
+        @instrument_tool("tavily_search")
+        def _run(self, *args, **kwargs):
+            check_cancelled()
+            return super()._run(*args, **kwargs)
+
+    if settings and settings.TAVILY_API_URL: # Endpoint alternativo (stub): el wrapper lo lee de una global del módulo
+        import langchain_community.utilities.tavily_search as tavily_search_module
+        tavily_search_module.TAVILY_API_URL = settings.TAVILY_API_URL.rstrip("/")
+        print(f"DEBUG crew_agents.py: Tavily apuntando a '{tavily_search_module.TAVILY_API_URL}'.")
+
     if settings and settings.TAVILY_API_KEY:
-        tavily_search_tool = TavilySearchResults(max_results=5, name="Tavily Search Results") # Añadir nombre explícito
+        tavily_search_tool = InstrumentedTavilySearchResults(max_results=5, name="Tavily Search Results") # Añadir nombre explícito
         available_researcher_tools.append(tavily_search_tool)
         print(f"DEBUG crew_agents.py: INSTANCIA '{tavily_search_tool.name}' creada y añadida.")
     else: print("WARN crew_agents.py: TAVILY_API_KEY ausente, Tavily tool no creada.")
@@ -81,49 +98,205 @@ except ImportError as e: print(f"ERROR CRITICO crew_agents.py: Fallo importando
 except Exception as e_mkt: print(f"ERROR CRITICO crew_agents.py: Excepción cargando marketing_tools. Error: {e_mkt}")
 
 
-# --- Definición Agente Investigador ---
-if not available_researcher_tools:
-     researcher_agent = Agent(role="Investigador (ERROR)", goal="Reportar fallo", tools=[], verbose=True)
-     print("ERROR CRITICO crew_agents.py: researcher_agent creado SIN herramientas.")
-else:
-    researcher_agent = Agent(
+# --- LLM de los agentes: modelo enrutado, planificador compartido y streaming de tokens del editor ---
+# Cada agente pide su modelo al enrutador (app.core.model_router: 'researcher', 'editor', 'marketing_agent'); sin
+# nivel configurado, el mismo modelo que el LLM por defecto de CrewAI. Los pasos de razonamiento de los agentes son
+# la mayoría de las llamadas de un crew: pasan por el planificador de llm_client (presupuestos RPM/TPM y reintentos
+# con backoff + Retry-After) igual que las herramientas. El informe final sale del último paso del editor: con un
+# sink de tokens activo (app.core.token_stream), su LLM se crea con streaming=True y este callback reenvía lo que
+# sigue a "Final Answer:" (los pasos "Thought:" no se envían). Con una petición contabilizando uso (app.core.usage),
+# UsageCallbackHandler cuenta los pasos de razonamiento de cada agente.
+try:
+    from types import SimpleNamespace
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_openai import ChatOpenAI
+    from app.core import metrics
+    from app.core.cancellation import OperationCancelled, check_cancelled as _check_cancelled
+    from app.core.chunking import count_tokens
+    from app.core.llm_client import llm_client
+    from app.core.llm_scheduler import estimate_tokens
+    from app.core.model_router import model_router
+    from app.core.token_stream import current_token_sink, open_token_stream
+    from app.core.usage import current_usage, record_llm_usage
+
+    class FinalAnswerStreamHandler(BaseCallbackHandler):
+        FINAL_ANSWER_MARKER = "Final Answer:"
+        raise_error = True # Para que OperationCancelled corte el stream (LangChain ignora los errores de callbacks por defecto)
+
+        def __init__(self, operation: str):
+            super().__init__()
+            self.operation = operation
+            self._writer = None
+            self._buffer = ""
+            self._forwarding = False
+
+        def _start(self) -> None:
+            self._writer, self._buffer, self._forwarding = open_token_stream(self.operation), "", False
+
+        def on_llm_start(self, serialized, prompts, **kwargs) -> None: self._start()
+        def on_chat_model_start(self, serialized, messages, **kwargs) -> None: self._start()
+
+        def on_llm_new_token(self, token: str, **kwargs) -> None:
+            _check_cancelled()
+            if self._writer is None: return
+            if self._forwarding: self._writer.write(token); return
+            self._buffer += token
+            position = self._buffer.find(self.FINAL_ANSWER_MARKER)
+            if position >= 0:
+                self._forwarding = True
+                self._writer.write(self._buffer[position + len(self.FINAL_ANSWER_MARKER):].lstrip())
+
+        def on_retry(self, retry_state, **kwargs) -> None:
+            # Reintento del planificador tras tokens ya emitidos: el cliente descarta el texto parcial ("token_reset")
+            if self._writer is not None: self._writer.reset()
+            self._buffer, self._forwarding = "", False
+
+    class UsageCallbackHandler(BaseCallbackHandler):
+        """
+        Tokens, latencia y coste de cada paso del agente, como LLMClient con las llamadas de las herramientas: a la
+        petición en curso, al enrutador (p95 y presupuesto de coste) y a Prometheus. En streaming LangChain no trae
+        `token_usage`: se estiman con el tokenizador.
+        """
+
+        def __init__(self, stage: str, model: str):
+            super().__init__()
+            self.stage = stage
+            self.model = model
+            self._runs: Dict[Any, Tuple[float, int]] = {} # run_id -> (inicio, tokens de prompt estimados)
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+            self._runs[run_id] = (time.perf_counter(), sum(count_tokens(p) for p in prompts))
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+            self._runs[run_id] = (time.perf_counter(), sum(count_tokens(str(m.content)) for batch in messages for m in batch))
+
+        def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+            started, estimated_prompt_tokens = self._runs.pop(run_id, (time.perf_counter(), 0))
+            elapsed_s = time.perf_counter() - started
+            llm_output = response.llm_output or {}
+            token_usage = llm_output.get("token_usage") or {}
+            model = llm_output.get("model_name") or self.model
+            prompt_tokens = token_usage.get("prompt_tokens") or estimated_prompt_tokens
+            completion_tokens = token_usage.get("completion_tokens") or sum(count_tokens(g.text) for gens in response.generations for g in gens)
+            metrics.LLM_CALL_SECONDS.labels(operation=self.stage, model=model).observe(elapsed_s)
+            metrics.LLM_TOKENS_TOTAL.labels(operation=self.stage, model=model, kind="prompt").inc(prompt_tokens)
+            metrics.LLM_TOKENS_TOTAL.labels(operation=self.stage, model=model, kind="completion").inc(completion_tokens)
+            model_router.observe(self.stage, model, elapsed_s, prompt_tokens, completion_tokens)
+            record_llm_usage(self.stage, model, prompt_tokens, completion_tokens)
+
+        def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+            self._runs.pop(run_id, None)
+            metrics.ERRORS_TOTAL.labels(component=f"llm:{self.stage}").inc()
+
+    class ScheduledChatOpenAI(ChatOpenAI):
+        """
+        ChatOpenAI cuyas llamadas reservan petición + tokens estimados en llm_client.scheduler y se reintentan con su
+        backoff (el SDK no reintenta por su cuenta: max_retries=0). `_generate` cubre también el modo streaming.
+        """
+        scheduler_operation: str = "agent"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            scheduler, operation = llm_client.scheduler, self.scheduler_operation
+            reserved = estimate_tokens([{"content": m.content} for m in messages], self.max_tokens)
+            attempt = 0
+            while True:
+                scheduler.acquire(operation, reserved)
+                try:
+                    result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+                    break
+                except OperationCancelled: raise
+                except Exception as e:
+                    scheduler.settle(reserved, 0)
+                    delay = scheduler.retry_delay(operation, attempt, e)
+                    if delay is None: raise
+                    if run_manager: run_manager.on_retry(SimpleNamespace(attempt_number=attempt + 1, outcome=e))
+                    scheduler.backoff(delay)
+                    attempt += 1
+            token_usage = (result.llm_output or {}).get("token_usage") or {} # En streaming no viene: se queda la reserva
+            scheduler.settle(reserved, token_usage.get("total_tokens") or reserved)
+            return result
+
+    def _create_agent_llm(route: str, stream_operation: Optional[str] = None):
+        """LLM del agente: siempre planificado; streaming y contabilidad de uso solo si la petición los tiene activos."""
+        streaming = stream_operation is not None and current_token_sink() is not None
+        model = model_router.choose(route) or os.environ.get("OPENAI_MODEL_NAME", "gpt-4") # Sin ruta: el modelo por defecto de CrewAI
+        callbacks = [UsageCallbackHandler(route, model)] if current_usage() is not None else []
+        if streaming: callbacks.append(FinalAnswerStreamHandler(stream_operation))
+        return ScheduledChatOpenAI(model=model, streaming=streaming, callbacks=callbacks or None, max_retries=0, scheduler_operation=route)
+except ImportError as e:
+    print(f"WARN crew_agents.py: LLM planificado / enrutado / streaming de los agentes no disponible. Error: {e}")
+    def _create_agent_llm(route: str, stream_operation: Optional[str] = None): return None
+
+
+def _llm_option(route: str, stream_operation: Optional[str] = None) -> dict:
+    llm = _create_agent_llm(route, stream_operation)
+    return {"llm": llm} if llm else {} # Sin llm: el LLM por defecto de CrewAI, como siempre
+
+
+# --- Fábricas de Agentes ---
+# CrewAI muta el Agent durante kickoff() (agent.crew, agent_executor, tools_handler), por lo que
+# dos crews concurrentes en el pool de workers NO deben compartir la misma instancia.
+# Cada ejecución de crew crea sus agentes con estas fábricas; las herramientas sí se comparten.
+def create_researcher_agent() -> Agent:
+    if not available_researcher_tools:
+        return Agent(role="Investigador (ERROR)", goal="Reportar fallo", backstory="Sin herramientas disponibles.", tools=[], verbose=True)
+    return Agent(
         role="Investigador y Analista Estratégico Senior",
         goal="Buscar web (Tavily) y analizar contenido para generar informes.",
         backstory="Experto combinando búsqueda y análisis para estrategia.",
         tools=available_researcher_tools, # Lista con INSTANCIAS
         allow_delegation=False,
-        verbose=True
+        verbose=True,
+        **_llm_option("researcher")
+    )
+
+
+def create_editor_agent() -> Agent:
+    return Agent(
+        role="Editor Profesional Senior",
+        goal="Revisar y pulir borradores de informes para mejorar claridad y estilo.",
+        backstory="Experto en comunicación escrita con ojo para el detalle.",
+        tools=[],
+        allow_delegation=False,
+        verbose=True,
+        **_llm_option("editor", stream_operation="editor") # Streaming solo si la petición consume tokens (variantes /stream)
+    )
+
+
+def create_marketing_content_agent() -> Agent:
+    if not available_marketing_tools:
+        return Agent(role="Marketing (ERROR)", goal="Reportar fallo", backstory="Sin herramientas disponibles.", tools=[], verbose=True)
+    return Agent(
+        role="Especialista Marketing Contenidos IA",
+        goal="Generar ideas, posts y prompts de imagen para redes sociales.",
+        backstory="Experto creativo IA en copywriting y visuales.",
+        tools=available_marketing_tools, # Lista con funciones @tool
+        allow_delegation=False,
+        verbose=True,
+        **_llm_option("marketing_agent")
     )
+
+
+# --- Definición Agente Investigador ---
+researcher_agent = create_researcher_agent()
+if not available_researcher_tools:
+     print("ERROR CRITICO crew_agents.py: researcher_agent creado SIN herramientas.")
+else:
     # CORRECCIÓN del log para obtener nombre (acceder directo a .name)
     tool_names_res = [t.name for t in available_researcher_tools if hasattr(t, 'name')]
     print(f"DEBUG crew_agents.py: 'researcher_agent' definido con herramientas: {tool_names_res}")
 
 
 # --- Definición Agente Editor (Sin cambios) ---
-editor_agent = Agent(
-    role="Editor Profesional Senior",
-    goal="Revisar y pulir borradores de informes para mejorar claridad y estilo.",
-    backstory="Experto en comunicación escrita con ojo para el detalle.",
-    tools=[],
-    allow_delegation=False,
-    verbose=True
-)
+editor_agent = create_editor_agent()
 print("DEBUG crew_agents.py: 'editor_agent' definido.")
 
 
 # --- Definición Agente Marketing ---
+marketing_content_agent = create_marketing_content_agent()
 if not available_marketing_tools:
-     marketing_content_agent = Agent(role="Marketing (ERROR)", goal="Reportar fallo", tools=[], verbose=True)
      print("ERROR CRITICO crew_agents.py: marketing_content_agent creado SIN herramientas de marketing.")
 else:
-    marketing_content_agent = Agent(
-        role="Especialista Marketing Contenidos IA",
-        goal="Generar ideas, posts y prompts de imagen para redes sociales.",
-        backstory="Experto creativo IA en copywriting y visuales.",
-        tools=available_marketing_tools, # Lista con funciones @tool
-        allow_delegation=False,
-        verbose=True
-    )
     # CORRECCIÓN del log para obtener nombre
     tool_names_mkt = [t.name for t in available_marketing_tools if hasattr(t, 'name')]
     print(f"DEBUG crew_agents.py: 'marketing_content_agent' definido con herramientas: {tool_names_mkt}")
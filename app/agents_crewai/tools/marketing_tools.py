@@ -19,31 +19,24 @@ except ImportError as e:
 
 
 # Otros imports necesarios
-import openai
 # Pydantic V1 para schema inferido si @tool lo necesita (no lo usamos explícitamente ahora)
 from pydantic.v1 import BaseModel, Field
 import logging
 
+from app.core.metrics import instrument_tool
+from app.core.cancellation import OperationCancelled, check_cancelled
+from app.core.llm_client import llm_client
+
 logger = logging.getLogger(__name__)
 # Cambiar a DEBUG si necesitas más detalle aquí
 logger.setLevel(logging.INFO)
 
-# API Key Setup
-openai_api_key_status = False
-try:
-    from app.core.config import settings
-    if settings and settings.OPENAI_API_KEY:
-        openai.api_key = settings.OPENAI_API_KEY
-        openai_api_key_status = True
-        logger.debug("MarketingTools: OpenAI API Key OK.")
-    else:
-        logger.error("MarketingTools: OpenAI API Key NO encontrada en settings.")
-except ImportError:
-    logger.error("MarketingTools: Fallo al importar settings para API Key.")
+if not llm_client.available: logger.error("MarketingTools: Cliente LLM no disponible (OpenAI API Key o SDK ausentes).")
 
 
 # --- Herramienta 1: Generar Ideas de Marketing ---
 @tool("Generador de Ideas de Marketing") # SIN args_schema
+@instrument_tool("generate_marketing_ideas") # functools.wraps conserva docstring y anotaciones que lee @tool
 def generate_marketing_ideas(topic: str, context: str | None = None) -> str:
     """
     Genera ideas de marketing (ángulos, tipos post, hashtags, CTAs) basadas en 'topic' (REQ) y 'context' (OPT).
@@ -52,7 +45,8 @@ def generate_marketing_ideas(topic: str, context: str | None = None) -> str:
     'context': Información adicional para refinar ideas (string, opcional).
     """
     logger.info(f"Tool Exec: generate_marketing_ideas para '{topic[:30]}...'")
-    if not openai_api_key_status: return "Error Configuración: Clave OpenAI no disponible."
+    check_cancelled() # Petición cancelada: no gastar otra llamada a OpenAI
+    if not llm_client.available: return "Error Configuración: Clave OpenAI no disponible."
     if not topic: return "Error Input: El parámetro 'topic' es obligatorio."
 
     prompt_parts = [
@@ -72,21 +66,20 @@ def generate_marketing_ideas(topic: str, context: str | None = None) -> str:
     prompt = "\n".join(prompt_parts)
 
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
+        ideas = llm_client.complete(
             messages=[
                 {"role": "system", "content": "Asistente brainstorming marketing."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.8, max_tokens=1000
+            operation="generate_marketing_ideas", temperature=0.8, max_tokens=1000
         )
-        if response.choices and response.choices[0].message and response.choices[0].message.content:
-            ideas = response.choices[0].message.content.strip()
+        if ideas:
             logger.info(f"Tool OK: generate_marketing_ideas generó {len(ideas)} chars.")
             return ideas
         else:
             logger.error("Tool Error: generate_marketing_ideas - OpenAI devolvió respuesta vacía.")
             return "Error: No se recibieron ideas válidas de OpenAI."
+    except OperationCancelled: raise # Cancelación/deadline: la maneja la petición (499/504), no el agente
     except Exception as e:
         logger.error(f"Tool Error: generate_marketing_ideas - Excepción OpenAI: {e}", exc_info=True)
         return f"Error Interno (Ideas Tool): {type(e).__name__}"
@@ -94,6 +87,7 @@ def generate_marketing_ideas(topic: str, context: str | None = None) -> str:
 
 # --- Herramienta 2: Escribir Texto para Post Social ---
 @tool("Redactor de Posts para Redes Sociales") # SIN args_schema
+@instrument_tool("write_social_post")
 def write_social_post(topic_or_idea: str, platform: str, context: str | None = None) -> str:
     """
     Redacta texto (copy) para un post social sobre 'topic_or_idea' (REQ)
@@ -104,7 +98,8 @@ def write_social_post(topic_or_idea: str, platform: str, context: str | None = N
     'context': Contexto adicional (string, opcional).
     """
     logger.info(f"Tool Exec: write_social_post para '{topic_or_idea[:30]}...' en '{platform}'")
-    if not openai_api_key_status: return "Error Configuración: Clave OpenAI no disponible."
+    check_cancelled()
+    if not llm_client.available: return "Error Configuración: Clave OpenAI no disponible."
     if not topic_or_idea or not platform: return "Error Input: 'topic_or_idea' y 'platform' son obligatorios."
 
     valid_platforms = ['instagram', 'linkedin', 'twitter/x', 'facebook', 'general']
@@ -122,21 +117,21 @@ def write_social_post(topic_or_idea: str, platform: str, context: str | None = N
     prompt = "\n".join(prompt_parts)
 
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
+        post_text = llm_client.complete(
             messages=[
                 {"role": "system", "content": f"Copywriter experto para {platform}."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.7, max_tokens=600 # Más corto para posts
+            operation="write_social_post", temperature=0.7, max_tokens=600, # Más corto para posts
+            stream=True, stream_label=platform # Tokens al cliente (por plataforma) si la petición llegó por una variante /stream
         )
-        if response.choices and response.choices[0].message and response.choices[0].message.content:
-            post_text = response.choices[0].message.content.strip()
+        if post_text:
             logger.info(f"Tool OK: write_social_post generó texto (len: {len(post_text)}).")
             return post_text
         else:
             logger.error("Tool Error: write_social_post - OpenAI devolvió respuesta vacía.")
             return "Error: No se recibió texto de post válido de OpenAI."
+    except OperationCancelled: raise
     except Exception as e:
         logger.error(f"Tool Error: write_social_post - Excepción OpenAI: {e}", exc_info=True)
         return f"Error Interno (Post Tool): {type(e).__name__}"
@@ -144,6 +139,7 @@ def write_social_post(topic_or_idea: str, platform: str, context: str | None = N
 
 # --- Herramienta 3: Sugerir Prompt para Imagen (DALL-E) ---
 @tool("Generador de Prompts para DALL-E") # SIN args_schema
+@instrument_tool("suggest_image_prompt")
 def suggest_image_prompt(post_concept_or_text: str, style_preferences: str | None = None) -> str:
     """
     Genera un prompt detallado para IA de imágenes (DALL-E, etc.) basado en 'post_concept_or_text' (REQ).
@@ -153,7 +149,8 @@ def suggest_image_prompt(post_concept_or_text: str, style_preferences: str | Non
     'style_preferences': Estilo visual deseado (string, opcional).
     """
     logger.info(f"Tool Exec: suggest_image_prompt para '{post_concept_or_text[:30]}...'")
-    if not openai_api_key_status: return "Error Configuración: Clave OpenAI no disponible."
+    check_cancelled()
+    if not llm_client.available: return "Error Configuración: Clave OpenAI no disponible."
     if not post_concept_or_text: return "Error Input: 'post_concept_or_text' es obligatorio."
 
     prompt_parts = [
@@ -168,16 +165,14 @@ def suggest_image_prompt(post_concept_or_text: str, style_preferences: str | Non
     prompt = "\n".join(prompt_parts)
 
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
+        image_prompt = llm_client.complete(
             messages=[
                 {"role": "system", "content": "Experto en prompts para IA de imágenes."},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.7, max_tokens=350
+            operation="suggest_image_prompt", temperature=0.7, max_tokens=350
         )
-        if response.choices and response.choices[0].message and response.choices[0].message.content:
-            image_prompt = response.choices[0].message.content.strip()
+        if image_prompt:
             # Limpiar comillas iniciales/finales si existen
             if image_prompt.startswith(('"', "'")) and image_prompt.endswith(('"', "'")):
                  image_prompt = image_prompt[1:-1]
@@ -186,6 +181,7 @@ def suggest_image_prompt(post_concept_or_text: str, style_preferences: str | Non
         else:
              logger.error("Tool Error: suggest_image_prompt - OpenAI devolvió respuesta vacía.")
              return "Error: No se recibió prompt de imagen válido de OpenAI."
+    except OperationCancelled: raise
     except Exception as e:
         logger.error(f"Tool Error: suggest_image_prompt - Excepción OpenAI: {e}", exc_info=True)
         return f"Error Interno (Image Prompt Tool): {type(e).__name__}"
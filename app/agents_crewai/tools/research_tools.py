@@ -3,26 +3,24 @@
 
 from langchain_core.tools import BaseTool
 from pydantic.v1 import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import contextvars
 import openai
 import logging
 
+from app.core.metrics import instrument_tool
+from app.core.cancellation import OperationCancelled, check_cancelled
+from app.core.chunking import count_tokens, split_into_chunks
+from app.core.llm_client import llm_client # Pool, timeouts y métricas de tokens compartidos con el resto de herramientas
+
+try: from app.core.config import settings
+except ImportError: settings = None
+
 logger = logging.getLogger("research_tools")
 logger.setLevel(logging.INFO) # O DEBUG para más detalle
 
-# Configuración de API Key de OpenAI
-openai_api_key_configured_status = False
-try:
-    from app.core.config import settings
-    if settings and settings.OPENAI_API_KEY:
-        openai.api_key = settings.OPENAI_API_KEY
-        openai_api_key_configured_status = True
-        logger.debug("ResearchTools: OpenAI API Key asignada y lista.")
-    else:
-        logger.error("ResearchTools: OpenAI API Key NO ESTÁ en settings o settings no disponible.")
-except ImportError:
-    logger.error("ResearchTools: Fallo importando 'settings' (OpenAI API Key).")
-except Exception as e_conf:
-    logger.error(f"ResearchTools: Excepción config API Key OpenAI: {e_conf}")
+if not llm_client.available: logger.error("ResearchTools: Cliente LLM no disponible (OpenAI API Key o SDK ausentes).")
 
 class ContentAnalysisToolInput(BaseModel):
     """Inputs para ContentAnalysisTool. Usa Pydantic v1."""
@@ -82,10 +80,75 @@ Actúa como un analista estratégico y consultor senior. Tu misión es destilar
 """
         # --- FIN DEL PROMPT DETALLADO ---
 
+    # --- Map-reduce para contenido largo ---
+    def _summarize_chunk(self, topic: str, chunk: str, index: int, total: int) -> str:
+        """Map: notas en viñetas de un fragmento (solo lo que dice el texto)."""
+        return llm_client.complete(
+            messages=[
+                {"role": "system", "content": "Eres un analista que extrae información de documentos largos sin añadir nada que no esté en el texto."},
+                {"role": "user", "content": (
+                    f"Fragmento {index}/{total} de un documento sobre: {topic}\n---\n{chunk}\n---\n"
+                    "Extrae en viñetas concisas los hechos, datos, hallazgos, argumentos y conclusiones relevantes para el tema. "
+                    "Conserva cifras y nombres propios. No introduzcas información externa ni opiniones.")}
+            ],
+            operation="content_analysis_map",
+            temperature=0.2,
+            max_tokens=settings.CONTENT_ANALYSIS_MAP_MAX_TOKENS if settings else 600
+        )
+
+    def _map_chunks(self, topic: str, chunks: List[str]) -> List[str]:
+        """Resume todos los fragmentos en paralelo (el planificador LLM aplica los límites RPM/TPM)."""
+        concurrency = max(1, min(len(chunks), settings.CONTENT_ANALYSIS_MAP_CONCURRENCY if settings else 8))
+        # Cada hilo corre en una copia del contexto: hereda el token de cancelación de la petición
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="content-map") as executor:
+            futures = [executor.submit(contextvars.copy_context().run, self._summarize_chunk, topic, chunk, i + 1, len(chunks))
+                       for i, chunk in enumerate(chunks)]
+            summaries, failures = [], 0
+            for i, future in enumerate(futures):
+                try: summaries.append(future.result() or f"(Fragmento {i + 1}: sin contenido relevante.)")
+                except OperationCancelled: raise
+                except Exception as e:
+                    failures += 1
+                    logger.warning(f"ContentAnalysisTool: fragmento {i + 1}/{len(chunks)} fallido: {type(e).__name__} - {e}")
+                    summaries.append(f"(Fragmento {i + 1}: no disponible.)")
+        if failures == len(chunks): raise RuntimeError(f"Fallaron los {len(chunks)} fragmentos del análisis.")
+        return summaries
+
+    def _condense(self, topic: str, content: str) -> str:
+        """Devuelve `content` si cabe en un prompt; si no, las notas de sus fragmentos (re-trocea si aún no caben)."""
+        single_pass = settings.CONTENT_ANALYSIS_SINGLE_PASS_TOKENS if settings else 6000
+        chunk_tokens = settings.CONTENT_ANALYSIS_CHUNK_TOKENS if settings else 3000
+        overlap = settings.CONTENT_ANALYSIS_CHUNK_OVERLAP_TOKENS if settings else 150
+        model = llm_client.default_model
+        for level in range(1, 4): # Un nivel basta salvo documentos enormes
+            tokens = count_tokens(content, model)
+            if tokens <= single_pass: return content
+            chunks = split_into_chunks(content, chunk_tokens, overlap, model)
+            logger.info(f"ContentAnalysisTool: contenido de {tokens} tokens -> {len(chunks)} fragmentos (nivel {level}).")
+            summaries = self._map_chunks(topic, chunks)
+            content = "\n\n".join(f"### Notas del fragmento {i + 1}/{len(chunks)}\n{summary}" for i, summary in enumerate(summaries))
+        return content
+
+    def analyze(self, topic: str, content_to_analyze: str) -> str:
+        """Informe completo: contenido corto en un solo prompt; largo, map (fragmentos en paralelo) + reduce."""
+        condensed = self._condense(topic, content_to_analyze)
+        return llm_client.complete(
+            messages=[
+                {"role": "system", "content": "Eres un asistente IA altamente competente en análisis profundo de texto y generación de informes estratégicos estructurados."},
+                {"role": "user", "content": self._get_analysis_prompt(topic, condensed)}
+            ],
+            operation="content_analysis",
+            temperature=0.4, # Un poco menos creativo para análisis
+            max_tokens=2048,
+            stream=True # Tokens al cliente si la petición llegó por una variante /stream
+        )
+
+    @instrument_tool("content_analysis")
     def _run(self, topic: str, content_to_analyze: str) -> str:
         logger.info(f"ContentAnalysisTool._run: Tema: '{topic[:40]}...', Longitud contenido: {len(content_to_analyze)}")
+        check_cancelled() # Sin token activo (fuera de una petición) no hace nada
         
-        if not openai_api_key_configured_status: # Verifica la flag del módulo
+        if not llm_client.available:
             return "Error Crítico Config (ContentAnalysisTool): OpenAI API Key no disponible."
         
         if not topic or not isinstance(topic, str) or not topic.strip():
@@ -93,22 +156,11 @@ Actúa como un analista estratégico y consultor senior. Tu misión es destilar
         if not content_to_analyze or not isinstance(content_to_analyze, str) or len(content_to_analyze) < 20: # Un mínimo para tener algo que analizar
             return "Error Input (ContentAnalysisTool): 'content_to_analyze' es requerido y debe tener al menos 20 caracteres."
 
-        analysis_prompt = self._get_analysis_prompt(topic, content_to_analyze)
-
         try:
             logger.debug("ContentAnalysisTool._run: Llamando a OpenAI ChatCompletions...")
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo-0125",      # Keyword argument
-                messages=[                       # Keyword argument
-                    {"role": "system", "content": "Eres un asistente IA altamente competente en análisis profundo de texto y generación de informes estratégicos estructurados."},
-                    {"role": "user", "content": analysis_prompt}
-                ],
-                temperature=0.4,                 # Keyword argument (un poco menos creativo para análisis)
-                max_tokens=2048                  # Keyword argument
-            )
-            
-            if response.choices and response.choices[0].message and response.choices[0].message.content:
-                report = response.choices[0].message.content.strip()
+            report = self.analyze(topic, content_to_analyze)
+
+            if report:
                 logger.info(f"ContentAnalysisTool._run: Informe generado por IA (Longitud: {len(report)}).")
                 return report
             else:
@@ -119,7 +171,8 @@ Actúa como un analista estratégico y consultor senior. Tu misión es destilar
             return f"Error de Autenticación con OpenAI. Revisa tu API Key. Detalle: {e}"
         except openai.RateLimitError as e:
             logger.error(f"ContentAnalysisTool - OpenAI RateLimitError: {e}", exc_info=True)
-            return f"Error: Límite de Tasa de OpenAI alcanzado. Intenta más tarde. Detalle: {e}"
+            return f"Error: Límite de Tasa de OpenAI alcanzado (agotados los reintentos). Intenta más tarde. Detalle: {e}"
+        except OperationCancelled: raise # Como en _map_chunks: la petición termina en 499/504 sin otro turno del agente
         except Exception as e:
             logger.error(f"ContentAnalysisTool - Excepción llamando a OpenAI: {type(e).__name__} - {e}", exc_info=True)
             return f"Error Interno en ContentAnalysisTool al contactar OpenAI: {type(e).__name__}"
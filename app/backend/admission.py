@@ -0,0 +1,174 @@
+# app/backend/admission.py
+# Control de admisión de ejecuciones de crew: tope global y por cliente, cola de espera acotada y rechazo rápido.
+import asyncio
+import logging
+import math
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+REJECT_CLIENT_QUOTA = "client_quota" # 429: el cliente ya tiene su cupo de ejecuciones activas/en cola
+REJECT_QUEUE_FULL = "queue_full"     # 503: todos los slots ocupados y la cola de espera llena
+REJECT_QUEUE_TIMEOUT = "queue_timeout" # 503: esperó en cola más de lo permitido
+
+
+class AdmissionRejected(Exception):
+    """Petición no admitida. El backend la traduce a `status_code` con cabecera `Retry-After` (segundos)."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class AdmissionTicket:
+    """Reserva de un cliente: admitida (ocupa slot) o en cola (espera a que otra ejecución libere el suyo)."""
+
+    def __init__(self, client_id: str, kind: str, future: "asyncio.Future"):
+        self.ticket_id = uuid.uuid4().hex
+        self.client_id = client_id
+        self.kind = kind
+        self.future = future # Resuelto cuando el ticket obtiene slot
+        self.enqueued_at = time.monotonic()
+        self.admitted_at: Optional[float] = None
+        self.released = False
+
+
+class AdmissionController:
+    """
+    Limita las ejecuciones de crew simultáneas para no lanzar más de las que el pool y la cuota de OpenAI soportan:
+    - `max_concurrent` slots globales; `max_per_client` ejecuciones activas + en cola por cliente (si no: 429).
+    - Saturado el global, las peticiones esperan en una cola FIFO de tamaño `max_queue` (llena: 503) como mucho
+      `max_queue_wait_seconds` (vencido: 503). Ambos rechazos llevan `Retry-After`, estimado con la duración media
+      de las ejecuciones recientes.
+    Estado por proceso/event loop (como SingleFlight): con varios workers de uvicorn cada uno aplica sus límites.
+    """
+
+    def __init__(self, max_concurrent: int, max_per_client: int, max_queue: int, max_queue_wait_seconds: float,
+                 initial_run_seconds: float = 60.0):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_per_client = max(1, int(max_per_client))
+        self.max_queue = max(0, int(max_queue))
+        self.max_queue_wait_seconds = float(max_queue_wait_seconds)
+        self._avg_run_seconds = float(initial_run_seconds) # Media móvil exponencial de la duración con slot
+        self._active: Dict[str, AdmissionTicket] = {}
+        self._queue: Deque[AdmissionTicket] = deque()
+        self._per_client: Dict[str, int] = defaultdict(int) # Activas + en cola por cliente
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.rejected: Dict[str, int] = defaultdict(int)
+
+    # --- Reserva / espera / liberación ---
+    def reserve(self, client_id: str, kind: str, enforce_limits: bool = True) -> AdmissionTicket:
+        """
+        Reserva sin esperar: admite si hay slot libre, encola si no, o lanza AdmissionRejected al instante.
+        `enforce_limits=False` (ítems de un lote, ya acotados por su propio semáforo) omite cupo por cliente y tope de cola.
+        """
+        client_load = self._per_client.get(client_id, 0)
+        if enforce_limits and client_load >= self.max_per_client:
+            raise self._reject(kind, 429, REJECT_CLIENT_QUOTA, self._client_retry_after(client_id),
+                               f"Cliente '{client_id}' con {client_load} ejecuciones activas/en cola (máx. {self.max_per_client}).")
+        if len(self._active) >= self.max_concurrent and enforce_limits and len(self._queue) >= self.max_queue:
+            raise self._reject(kind, 503, REJECT_QUEUE_FULL, self._queue_retry_after(len(self._queue)),
+                               f"Sistema saturado: {len(self._active)} ejecuciones en curso y cola de espera llena ({self.max_queue}).")
+        ticket = AdmissionTicket(client_id, kind, asyncio.get_running_loop().create_future())
+        self._per_client[client_id] += 1
+        if len(self._active) < self.max_concurrent and not self._queue:
+            self._admit(ticket)
+        else:
+            self._queue.append(ticket)
+            self.queued_total += 1
+            metrics.ADMISSION_QUEUE_DEPTH.set(len(self._queue))
+            logger.info(f"Admisión: '{kind}' de '{client_id}' en cola (posición {len(self._queue)}).")
+        return ticket
+
+    async def wait(self, ticket: AdmissionTicket, timeout: Optional[float] = -1) -> AdmissionTicket:
+        """Espera a que el ticket obtenga slot. timeout=-1: `max_queue_wait_seconds`; None: sin límite."""
+        if ticket.future.done(): return ticket
+        timeout = self.max_queue_wait_seconds if timeout == -1 else timeout
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout)
+            return ticket
+        except asyncio.TimeoutError:
+            if ticket.future.done(): return ticket # Admitido justo al vencer
+            self._drop_queued(ticket)
+            raise self._reject(ticket.kind, 503, REJECT_QUEUE_TIMEOUT, self._queue_retry_after(len(self._queue)),
+                               f"Sin capacidad tras esperar {timeout:.0f}s en cola.")
+        except asyncio.CancelledError: # Cliente desconectado mientras esperaba
+            if ticket.future.done(): self.release(ticket)
+            else: self._drop_queued(ticket)
+            raise
+
+    async def acquire(self, client_id: str, kind: str, enforce_limits: bool = True,
+                      timeout: Optional[float] = -1) -> AdmissionTicket:
+        """`reserve` + `wait`: devuelve un ticket admitido (liberar con `release`) o lanza AdmissionRejected."""
+        return await self.wait(self.reserve(client_id, kind, enforce_limits), timeout)
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        """Libera el slot del ticket (idempotente) y se lo cede al primero de la cola. Llamar desde el event loop."""
+        if ticket.released: return
+        ticket.released = True
+        if self._active.pop(ticket.ticket_id, None) is not None and ticket.admitted_at is not None:
+            self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * (time.monotonic() - ticket.admitted_at)
+        self._decrement_client(ticket.client_id)
+        while self._queue and len(self._active) < self.max_concurrent:
+            self._admit(self._queue.popleft())
+        metrics.ADMISSION_QUEUE_DEPTH.set(len(self._queue))
+
+    # --- Internos ---
+    def _admit(self, ticket: AdmissionTicket) -> None:
+        ticket.admitted_at = time.monotonic()
+        self._active[ticket.ticket_id] = ticket
+        self.admitted_total += 1
+        metrics.ADMISSION_QUEUE_WAIT_SECONDS.labels(kind=ticket.kind).observe(ticket.admitted_at - ticket.enqueued_at)
+        if not ticket.future.done(): ticket.future.set_result(True)
+
+    def _drop_queued(self, ticket: AdmissionTicket) -> None:
+        try: self._queue.remove(ticket)
+        except ValueError: return
+        ticket.released = True
+        self._decrement_client(ticket.client_id)
+        metrics.ADMISSION_QUEUE_DEPTH.set(len(self._queue))
+
+    def _decrement_client(self, client_id: str) -> None:
+        self._per_client[client_id] -= 1
+        if self._per_client[client_id] <= 0: del self._per_client[client_id]
+
+    def _reject(self, kind: str, status_code: int, reason: str, retry_after: int, detail: str) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        metrics.ADMISSION_REJECTIONS_TOTAL.labels(kind=kind, reason=reason).inc()
+        logger.warning(f"Admisión: '{kind}' rechazada ({status_code}, {reason}, Retry-After {retry_after}s): {detail}")
+        return AdmissionRejected(status_code, reason, retry_after, detail)
+
+    def _queue_retry_after(self, queue_length: int) -> int:
+        """Tiempo estimado hasta que se vacíe la cola actual: (en cola + 1) rondas de `max_concurrent` ejecuciones."""
+        return max(1, math.ceil(self._avg_run_seconds * (queue_length + 1) / self.max_concurrent))
+
+    def _client_retry_after(self, client_id: str) -> int:
+        """Tiempo estimado hasta que termine la ejecución activa más antigua del cliente."""
+        now = time.monotonic()
+        elapsed = [now - t.admitted_at for t in self._active.values() if t.client_id == client_id and t.admitted_at is not None]
+        return max(1, math.ceil(self._avg_run_seconds - max(elapsed, default=0.0)))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_per_client": self.max_per_client,
+            "max_queue": self.max_queue,
+            "max_queue_wait_seconds": self.max_queue_wait_seconds,
+            "active": len(self._active),
+            "queued": len(self._queue),
+            "clients": len(self._per_client),
+            "admitted_total": self.admitted_total,
+            "queued_total": self.queued_total,
+            "rejected": dict(self.rejected),
+            "avg_run_seconds": round(self._avg_run_seconds, 3),
+        }
@@ -1,6 +1,6 @@
 # app/backend/api_models.py
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, List, Dict, Any, Literal
 
 # --- Modelos para Investigación ---
 class ResearchAPIRequest(BaseModel):
@@ -8,6 +8,10 @@ class ResearchAPIRequest(BaseModel):
     content_to_analyze: Optional[str] = Field( # Opcional ahora
         None, min_length=10, description="(Opcional) Contenido textual adicional para analizar."
     )
+    bypass_cache: bool = Field(False, description="Ignora la caché de resultados y fuerza una ejecución nueva (el resultado refresca la caché).")
+    deadline_seconds: Optional[float] = Field(None, gt=0, description="(Opcional) Plazo máximo en segundos desde la recepción; al vencer se cancela el crew y se responde 504.")
+    stream_tokens: bool = Field(True, description="Solo en las variantes /stream: reenvía los tokens del LLM (eventos 'token') a medida que se generan.")
+    max_cost_usd: Optional[float] = Field(None, gt=0, description="(Opcional) Presupuesto de coste LLM estimado en USD; con LLM_ROUTING_POLICY=adaptive las llamadas bajan de nivel de modelo para no superarlo.")
 
 class ResearchMemoryItem(BaseModel):
     id: str
@@ -26,15 +30,46 @@ class ResearchAPIResponse(BaseModel):
     local_fallback_path: Optional[str] = None
     error_details: Optional[str] = None
     relevant_past_research: List[ResearchMemoryItem] = [] # Default a lista vacía
+    stage_timings: Optional[Dict[str, float]] = None # Segundos por etapa (tareas del crew, GDrive, ChromaDB...)
+    persistence_task_id: Optional[str] = None # Tarea de escritura diferida (GDrive + ChromaDB): GET /persistence/tasks/{id}
+    cache_hit: bool = False # True si la respuesta sale de la caché de resultados
+    cached_at: Optional[str] = None # Momento (UTC, ISO) en que se generó el resultado cacheado
+    usage: Optional[Dict[str, Any]] = None # Tokens y coste estimado por etapa (herramientas y agentes); en aciertos de caché, los de la ejecución original
 
 
 # --- Modelos para Marketing (NUEVOS) ---
 class MarketingContentRequest(BaseModel):
     topic: str = Field(..., description="Tema central o producto para la campaña/post.")
-    platform: str = Field(..., description="Plataforma destino (ej. Instagram, LinkedIn, Twitter/X).")
+    platform: Optional[str] = Field(None, description="Plataforma destino (ej. Instagram, LinkedIn, Twitter/X).")
+    platforms: Optional[List[str]] = Field(None, description="(Opcional) Varias plataformas: las ideas se generan una vez y post/prompt se generan en paralelo por plataforma.")
     context: Optional[str] = Field(None, description="Contexto adicional (audiencia, objetivos, resultados de investigación previa, etc.).")
+    bypass_cache: bool = Field(False, description="Ignora la caché de resultados y fuerza una ejecución nueva (el resultado refresca la caché).")
+    use_semantic_cache: bool = Field(True, description="Permite servir un resultado guardado de una petición parecida (mismas plataformas, tema/contexto similares).")
+    deadline_seconds: Optional[float] = Field(None, gt=0, description="(Opcional) Plazo máximo en segundos desde la recepción; al vencer se cancela el crew y se responde 504.")
+    stream_tokens: bool = Field(True, description="Solo en las variantes /stream: reenvía los tokens del LLM (eventos 'token') a medida que se generan.")
+    max_cost_usd: Optional[float] = Field(None, gt=0, description="(Opcional) Presupuesto de coste LLM estimado en USD; con LLM_ROUTING_POLICY=adaptive las llamadas bajan de nivel de modelo para no superarlo.")
+    mode: Optional[Literal["crew", "fast"]] = Field(None, description="(Opcional) 'crew': agente CrewAI; 'fast': ideas -> post -> prompt llamando a las herramientas directamente (menos llamadas al LLM). Por defecto MARKETING_DEFAULT_MODE.")
     # style_preferences: Optional[str] = Field(None, description="Preferencias de estilo para imagen (opcional).") # Añadir si implementas DALL-E Tool
 
+    @model_validator(mode="after")
+    def _require_platform(self) -> "MarketingContentRequest":
+        if not self.resolved_platforms():
+            raise ValueError("Debe indicarse 'platform' o 'platforms'.")
+        return self
+
+    def resolved_platforms(self) -> List[str]:
+        """'platform' + 'platforms' sin duplicados (insensible a mayúsculas), conservando el orden."""
+        resolved, seen = [], set()
+        for p in ([self.platform] if self.platform else []) + (self.platforms or []):
+            if p and p.strip() and p.strip().lower() not in seen:
+                seen.add(p.strip().lower()); resolved.append(p.strip())
+        return resolved
+
+class MarketingPlatformContent(BaseModel):
+    post_text: Optional[str] = None
+    image_prompt: Optional[str] = None
+    error_details: Optional[str] = None
+
 class MarketingContentResponse(BaseModel):
     message: str
     topic: str
@@ -43,4 +78,97 @@ class MarketingContentResponse(BaseModel):
     post_text: Optional[str] = None      # Texto redactado para el post
     image_prompt: Optional[str] = None   # Prompt sugerido para DALL-E
     # generated_image_url: Optional[str] = None # Añadir si implementas DALL-E Tool
-    error_details: Optional[str] = None # Para errores específicos
\ No newline at end of file
+    error_details: Optional[str] = None # Para errores específicos
+    stage_timings: Optional[Dict[str, float]] = None # Segundos por tarea del crew
+    platform_results: Optional[Dict[str, MarketingPlatformContent]] = None # Solo en peticiones multi-plataforma
+    cache_hit: bool = False # True si la respuesta sale de la caché de resultados
+    cached_at: Optional[str] = None # Momento (UTC, ISO) en que se generó el resultado cacheado
+    semantic_similarity: Optional[float] = None # Solo en aciertos de la caché semántica: similitud con la petición original
+    usage: Optional[Dict[str, Any]] = None # Tokens y coste estimado por etapa (herramientas y agentes); en aciertos de caché, los de la ejecución original
+
+
+# --- Modelos para Jobs asíncronos (pool de workers) ---
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    status_url: str # Ruta para consultar el estado: GET /jobs/{job_id}
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str # queued | running | completed | failed
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None # ResearchAPIResponse / MarketingContentResponse serializado
+    error_details: Optional[str] = None
+    error_status_code: Optional[int] = None
+
+
+
+# --- Modelos para la cola de escritura diferida (GDrive + ChromaDB) ---
+class PersistenceTaskStatus(BaseModel):
+    task_id: str
+    topic: str
+    filename: str
+    summary: str
+    doc_id: str
+    status: str # pending | running | done | failed
+    attempts: int
+    last_error: Optional[str] = None
+    gdrive_id: Optional[str] = None
+    gdrive_link: Optional[str] = None
+    chroma_doc_id: Optional[str] = None
+    gdrive_upload_s: Optional[float] = None
+    chroma_insert_s: Optional[float] = None
+    created_at: str
+    updated_at: str
+    next_attempt_at: Optional[str] = None # Solo en tareas pendientes de reintento
+
+class PersistenceQueueStatusResponse(BaseModel):
+    workers: int
+    counts: Dict[str, int] # pending | running | done | failed
+    recent_pending: List[PersistenceTaskStatus] = []
+    recent_failed: List[PersistenceTaskStatus] = []
+
+
+# --- Modelos para el ledger de uso de LLM ---
+class UsageDailyResponse(BaseModel):
+    since: str # Primer día incluido (UTC, YYYY-MM-DD)
+    kind: Optional[str] = None
+    days: List[Dict[str, Any]] = [] # Por día: requests, llm_calls, cache_hits, tokens, estimated_cost_usd, by_stage, by_kind
+    stages_by_cost: List[Dict[str, Any]] = [] # Totales del periodo por etapa, de más a menos coste
+
+
+# --- Modelos para Lotes de Investigación ---
+class ResearchBatchRequest(BaseModel):
+    items: List[ResearchAPIRequest] = Field(..., min_length=1, description="Temas a investigar (cada uno como en /research/conduct).")
+    max_concurrency: Optional[int] = Field(None, ge=1, description="(Opcional) Máx. de temas en paralelo para este lote. Por defecto RESEARCH_BATCH_MAX_CONCURRENCY.")
+
+class ResearchBatchItemStatus(BaseModel):
+    index: int
+    topic: str
+    status: str # pending | running | completed | failed
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    duration_s: Optional[float] = None
+    result: Optional[ResearchAPIResponse] = None
+    error_details: Optional[str] = None
+    error_status_code: Optional[int] = None
+
+class ResearchBatchStatusResponse(BaseModel):
+    batch_id: str
+    kind: str
+    status: str # running | completed
+    max_concurrency: int
+    created_at: str
+    finished_at: Optional[str] = None
+    total_items: int
+    pending_items: int
+    running_items: int
+    completed_items: int
+    failed_items: int
+    elapsed_s: float
+    throughput_topics_per_minute: float # Temas terminados por minuto de reloj
+    items: List[ResearchBatchItemStatus] = []
@@ -0,0 +1,64 @@
+# app/backend/loop_monitor.py
+# Monitor de retraso del event loop: una tarea duerme `interval_s` y mide cuánto tarda de más en despertar.
+# Ese exceso es el tiempo que el loop estuvo ocupado con trabajo bloqueante (CPU, E/S síncrona) y es lo que
+# suma a la latencia de todas las peticiones que comparten el proceso.
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class EventLoopLagMonitor:
+    """`start()` desde el event loop (startup); `get_stats()` desde cualquier hilo. Ventana de las últimas `window` muestras."""
+
+    def __init__(self, interval_s: float = 0.5, window: int = 600):
+        self.interval_s = float(interval_s)
+        self._samples: Deque[float] = deque(maxlen=max(1, int(window)))
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.max_lag_s = 0.0
+        self.samples_total = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval_s > 0
+
+    def start(self) -> None:
+        if self.enabled and self._task is None: self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None: self._task.cancel(); self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            lag = max(0.0, time.perf_counter() - expected)
+            metrics.EVENT_LOOP_LAG_SECONDS.observe(lag)
+            with self._lock:
+                self._samples.append(lag)
+                self.samples_total += 1
+                self.max_lag_s = max(self.max_lag_s, lag)
+            if lag > 1.0: logger.warning(f"Event loop bloqueado {lag:.2f}s (trabajo síncrono en el loop).")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock: samples = sorted(self._samples)
+        percentile = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2) if samples else None
+        return {
+            "enabled": self.enabled,
+            "interval_s": self.interval_s,
+            "samples_total": self.samples_total,
+            "window_samples": len(samples),
+            "last_lag_ms": round(self._samples[-1] * 1000, 2) if self._samples else None,
+            "p50_lag_ms": percentile(0.5),
+            "p99_lag_ms": percentile(0.99),
+            "max_window_lag_ms": round(samples[-1] * 1000, 2) if samples else None,
+            "max_lag_ms": round(self.max_lag_s * 1000, 2),
+        }
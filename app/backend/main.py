@@ -1,43 +1,175 @@
 # app/backend/main.py
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import asyncio
 import logging
 import datetime
 import os
 import re
-from typing import List, Optional, Dict, Any
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 # --- Imports de Config, Modelos y Servicios ---
 try: from app.core.config import settings
 except ImportError: settings = None # Definir como None si falla
 from app.backend.api_models import ( # Asegúrate que este archivo exista y defina estos + los nuevos de Marketing
      ResearchAPIRequest, ResearchAPIResponse, ResearchMemoryItem,
-     MarketingContentRequest, MarketingContentResponse # <-- NUEVOS
+     MarketingContentRequest, MarketingContentResponse, # <-- NUEVOS
+     MarketingPlatformContent, JobSubmitResponse, JobStatusResponse,
+     ResearchBatchRequest, ResearchBatchStatusResponse,
+     PersistenceTaskStatus, PersistenceQueueStatusResponse, UsageDailyResponse
 )
 from app.services.gdrive_service import GDriveService
 from app.services.persistence_service import PersistenceService
+from app.services.job_service import JobService
+from app.services.batch_service import BatchService
+from app.services.cache_service import SQLiteCache
+from app.services.semantic_cache import SemanticCache
+from app.services.write_behind_service import WriteBehindService
+from app.services.usage_ledger import UsageLedger
+from app.core.rate_limit import TokenBucket
+from app.backend.sse import ProgressEventBridge, sse_event_stream
+from app.backend.loop_monitor import EventLoopLagMonitor
+from app.backend.single_flight import SingleFlight
+from app.backend.admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from app.core.keys import normalize_topic, request_key
+from app.core.cancellation import CANCEL_STATUS_CODES, CancellationToken, OperationCancelled, cancellation_scope, check_cancelled
+from app.core import metrics
+from app.core.lazy import LazyComponent
+from app.core.llm_client import llm_client
+from app.core.token_stream import token_stream_scope
+from app.core.model_router import RequestBudget, request_budget_scope
+from app.core.usage import RequestUsage, current_usage, usage_scope
 
-# --- Imports de Crews ---
-try: from app.crews.research_crew_definitions import create_research_crew_and_kickoff as research_crew_exec
-except ImportError: research_crew_exec = None # Marcar como None si falla
-try: from app.crews.marketing_crew_definitions import create_marketing_content_crew_and_kickoff as marketing_crew_exec
-except ImportError: marketing_crew_exec = None # Marcar como None si falla
-
-# --- Logger y Servicios Globales ---
+# --- Logger ---
 logger = logging.getLogger("app.backend.main")
 logger.setLevel(logging.INFO)
-gdrive_service_instance: Optional[GDriveService] = None
-persistence_service_instance: Optional[PersistenceService] = None
-try: # Instanciación global (con manejo básico de errores)
-    if GDriveService: gdrive_service_instance = GDriveService()
-    if not gdrive_service_instance or not gdrive_service_instance.service: logger.error("GDriveService global falló.")
-    if PersistenceService: persistence_service_instance = PersistenceService()
-    if not persistence_service_instance or not persistence_service_instance.collection: logger.error("PersistenceService global falló.")
-except Exception as e: logger.error(f"Excepción instanciando servicios globales: {e}", exc_info=True)
+
+# --- Componentes pesados (inicialización perezosa) ---
+# Importar CrewAI/LangChain, construir los agentes, el cliente de Drive y abrir ChromaDB (modelo de embeddings)
+# cuesta segundos: se hace en el primer uso (en un hilo del pool, nunca en el event loop) o con POST /warmup.
+def _load_research_crew():
+    from app.crews.research_crew_definitions import create_research_crew_and_kickoff
+    return create_research_crew_and_kickoff
+
+def _load_marketing_crews():
+    from app.crews import marketing_crew_definitions # Una y varias plataformas: mismo módulo
+    return marketing_crew_definitions
+
+def _load_marketing_fast_pipeline():
+    from app.crews import marketing_fast_pipeline # Solo las herramientas: no importa CrewAI
+    return marketing_fast_pipeline
+
+def _create_persistence_service():
+    """PERSISTENCE_MODE=remote: cliente HTTP del servidor de persistencia (un solo modelo de embeddings para todos los workers)."""
+    if settings and settings.PERSISTENCE_MODE == "remote":
+        from app.services.remote_persistence_service import RemotePersistenceService
+        return RemotePersistenceService()
+    return PersistenceService()
+
+research_crew_component = LazyComponent("research_crew", _load_research_crew, critical=True)
+marketing_crew_component = LazyComponent("marketing_crew", _load_marketing_crews, critical=True)
+marketing_fast_component = LazyComponent("marketing_fast", _load_marketing_fast_pipeline)
+gdrive_component = LazyComponent("gdrive", GDriveService, is_usable=lambda svc: svc is not None and svc.service is not None)
+persistence_component = LazyComponent("persistence", _create_persistence_service, is_usable=lambda svc: svc is not None and svc.collection is not None)
+LAZY_COMPONENTS: Dict[str, LazyComponent] = {c.name: c for c in (research_crew_component, marketing_crew_component, marketing_fast_component, gdrive_component, persistence_component)}
+
+# Pool acotado de workers: los crews son bloqueantes (minutos) y no deben correr en el event loop.
+job_service = JobService(
+    max_workers=settings.CREW_WORKER_POOL_SIZE if settings else 4,
+    max_finished_jobs=settings.JOB_RESULT_RETENTION if settings else 500,
+)
+batch_service = BatchService()
+# Presupuesto Tavily compartido por todos los lotes: cada tema reserva sus búsquedas estimadas antes de arrancar.
+# Las llamadas al LLM no se reservan aquí: cada una pasa por el planificador de llm_client (LLM_REQUESTS_PER_MINUTE).
+tavily_rate_budget = TokenBucket("tavily", settings.TAVILY_CALLS_PER_MINUTE if settings else 60)
+# Escritura diferida: el informe se encola (durable) y GDrive + ChromaDB se hacen fuera del request path.
+write_behind_service: Optional[WriteBehindService] = None
+try:
+    if settings and settings.WRITE_BEHIND_ENABLED: # Solo SQLite: barato. Drive/ChromaDB se resuelven en los workers
+        write_behind_service = WriteBehindService(
+            os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')), settings.WRITE_BEHIND_DB_PATH),
+            gdrive_component.get, persistence_component.get,
+            workers=settings.WRITE_BEHIND_WORKERS,
+            max_attempts=settings.WRITE_BEHIND_MAX_ATTEMPTS,
+            backoff_seconds=settings.WRITE_BEHIND_BACKOFF_SECONDS,
+        )
+except Exception as e: logger.error(f"No se pudo abrir la cola write-behind (se persistirá en línea): {e}", exc_info=True)
+# Pool pequeño para consultas a ChromaDB lanzadas en paralelo con el crew (no ocupan workers de crew).
+memory_lookup_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-lookup")
+_background_tasks: set = set() # Referencias a tareas asyncio en segundo plano (evita que el GC las cancele)
+single_flight = SingleFlight() # Peticiones idénticas en curso comparten una sola ejecución del crew
+event_loop_monitor = EventLoopLagMonitor(settings.EVENT_LOOP_LAG_INTERVAL_SECONDS if settings else 0.5)
+_cancellation_stats: Dict[str, float] = defaultdict(float) # Crews cancelados por motivo + segundos de worker desperdiciados
+_cancellation_stats_lock = threading.Lock() # Se actualiza desde los hilos worker
+# Control de admisión: tope global y por cliente de crews simultáneos + cola de espera acotada (429/503 con Retry-After)
+admission_controller: Optional[AdmissionController] = None
+if settings and settings.ADMISSION_ENABLED:
+    admission_controller = AdmissionController(
+        max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+        max_per_client=settings.ADMISSION_MAX_PER_CLIENT,
+        max_queue=settings.ADMISSION_MAX_QUEUE,
+        max_queue_wait_seconds=settings.ADMISSION_MAX_QUEUE_WAIT_SECONDS,
+    )
+result_cache: Optional[SQLiteCache] = None # Caché persistente de resultados finales (TTL + LRU)
+try:
+    if settings and settings.RESULT_CACHE_ENABLED:
+        result_cache = SQLiteCache(
+            "results",
+            os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')), settings.RESULT_CACHE_DB_PATH),
+            ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+        )
+except Exception as e: logger.error(f"No se pudo abrir la caché de resultados (se continúa sin caché): {e}", exc_info=True)
+
+def _semantic_embed(texts: List[str]) -> List[List[float]]:
+    """Embeddings de PersistenceService (local o servidor remoto); sin servicio, lista vacía (la consulta cuenta como miss)."""
+    persistence_svc = persistence_component.get()
+    return persistence_svc.embed_texts(texts) if persistence_svc is not None else []
+
+semantic_cache: Optional[SemanticCache] = None # Caché semántica de marketing (peticiones parecidas, mismas plataformas)
+try:
+    if settings and settings.MARKETING_SEMANTIC_CACHE_ENABLED:
+        semantic_cache = SemanticCache(
+            "marketing_semantic",
+            os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')), settings.MARKETING_SEMANTIC_CACHE_DB_PATH),
+            _semantic_embed,
+            threshold=settings.MARKETING_SEMANTIC_CACHE_THRESHOLD,
+            ttl_seconds=settings.MARKETING_SEMANTIC_CACHE_TTL_SECONDS,
+            max_entries=settings.MARKETING_SEMANTIC_CACHE_MAX_ENTRIES,
+        )
+except Exception as e: logger.error(f"No se pudo abrir la caché semántica de marketing (se continúa sin ella): {e}", exc_info=True)
+
+usage_ledger: Optional[UsageLedger] = None # Tokens y coste estimado por petición y etapa (agregado por día)
+try:
+    if settings and settings.USAGE_LEDGER_ENABLED:
+        usage_ledger = UsageLedger(
+            os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')), settings.USAGE_LEDGER_DB_PATH),
+            retention_days=settings.USAGE_LEDGER_RETENTION_DAYS,
+        )
+except Exception as e: logger.error(f"No se pudo abrir el ledger de uso (se continúa sin él): {e}", exc_info=True)
 
 # --- Dependencias FastAPI ---
-def get_gdrive_service_dependency() -> Optional[GDriveService]: return gdrive_service_instance
-def get_persistence_service_dependency() -> Optional[PersistenceService]: return persistence_service_instance
+# Dependencias síncronas: FastAPI las ejecuta en su threadpool, así que la primera inicialización no bloquea el event loop.
+def get_gdrive_service_dependency() -> Optional[GDriveService]: return gdrive_component.get()
+def get_persistence_service_dependency() -> Optional[PersistenceService]: return persistence_component.get()
+
+def _ensure_component(component: LazyComponent, detail: str) -> None:
+    """503 solo si el componente ya se intentó inicializar y falló; si aún no se inicializó, lo hará el worker."""
+    if component.unusable(): raise HTTPException(status_code=503, detail=f"{detail} ({component.status()['error']})")
+
+def _marketing_mode(request: MarketingContentRequest) -> str:
+    return request.mode or (settings.MARKETING_DEFAULT_MODE if settings and settings.MARKETING_DEFAULT_MODE in ("crew", "fast") else "crew")
+
+def _marketing_component(request: MarketingContentRequest) -> LazyComponent:
+    """Crew de CrewAI o pipeline directo de herramientas ('fast'): misma respuesta y mismas cachés."""
+    return marketing_fast_component if _marketing_mode(request) == "fast" else marketing_crew_component
 
 # --- App FastAPI ---
 app = FastAPI(
@@ -47,40 +179,329 @@ app = FastAPI(
 )
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
+class MetricsMiddleware:
+    """
+    Peticiones en curso + latencia por ruta (plantilla, p.ej. /jobs/{job_id}, para no disparar la cardinalidad).
+    Middleware ASGI puro: con @app.middleware("http") (BaseHTTPMiddleware) `Request.is_disconnected()` nunca ve
+    el 'http.disconnect' del cliente y la cancelación por desconexión no funcionaría.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http": return await self.app(scope, receive, send)
+        metrics.HTTP_REQUESTS_IN_FLIGHT.inc()
+        started, observed = time.perf_counter(), False
+
+        def _observe(status: int) -> None:
+            nonlocal observed
+            observed = True
+            route = scope.get("route") # El router lo añade al scope al resolver la ruta
+            metrics.HTTP_REQUEST_SECONDS.labels(method=scope["method"], route=getattr(route, "path", "unmatched"),
+                                                status=str(status)).observe(time.perf_counter() - started)
+
+        async def _send(message):
+            if message["type"] == "http.response.start" and not observed: _observe(message["status"]) # Hasta el inicio de la respuesta
+            await send(message)
+
+        try: await self.app(scope, receive, _send)
+        finally:
+            metrics.HTTP_REQUESTS_IN_FLIGHT.dec()
+            if not observed: _observe(500)
+
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Rechazo rápido por saturación: el cliente sabe cuándo reintentar en vez de esperar al timeout."""
+    return JSONResponse(status_code=exc.status_code, headers={"Retry-After": str(exc.retry_after)},
+                        content={"detail": exc.detail, "reason": exc.reason, "retry_after": exc.retry_after})
+
+@app.exception_handler(OperationCancelled)
+async def operation_cancelled_handler(request: Request, exc: OperationCancelled):
+    """El receptor dejó de esperar: 504 si venció su plazo, 499 si se desconectó (el crew se cancela si nadie más espera)."""
+    return JSONResponse(status_code=CANCEL_STATUS_CODES.get(exc.reason, 499), content={"detail": str(exc), "reason": exc.reason})
+
 # --- Eventos Startup ---
 @app.on_event("startup")
 async def startup_event():
     logger.info("FastAPI startup...")
-    # Verificar dependencias críticas
-    if not research_crew_exec: logger.critical("Función 'research_crew_exec' NO DISPONIBLE.")
-    if not marketing_crew_exec: logger.critical("Función 'marketing_crew_exec' NO DISPONIBLE.")
-    # (Verificaciones de servicios...)
+    event_loop_monitor.start()
+    if write_behind_service: write_behind_service.start() # Retoma también las tareas pendientes de ejecuciones previas
+    if settings and settings.WARMUP_ON_STARTUP: # Calentamiento en segundo plano: /health/live responde ya
+        task = asyncio.create_task(_warmup_components(list(LAZY_COMPONENTS.values())))
+        _background_tasks.add(task); task.add_done_callback(_background_tasks.discard)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("FastAPI shutdown...")
+    event_loop_monitor.stop()
+    job_service.shutdown(wait=False)
+    if write_behind_service: write_behind_service.stop()
+    metrics.mark_process_dead()
+    memory_lookup_executor.shutdown(wait=False, cancel_futures=True)
+    llm_client.close()
 
 # --- Endpoints ---
 @app.get("/", tags=["General"])
 async def read_root(): return {"message": "API Suite Agentes Inteligentes v0.4"}
 
+# --- Salud y calentamiento (componentes perezosos) ---
+async def _warmup_components(components: List[LazyComponent]) -> Dict[str, Dict[str, Any]]:
+    """Inicializa los componentes en paralelo, en hilos (las importaciones/constructores son bloqueantes)."""
+    await asyncio.gather(*(asyncio.to_thread(c.get) for c in components))
+    return {c.name: c.status() for c in components}
+
+@app.get("/health/live", tags=["General"])
+async def liveness_endpoint():
+    """Liveness: el proceso atiende peticiones. No toca ningún componente pesado."""
+    return {"status": "ok"}
+
+@app.get("/health/ready", tags=["General"])
+async def readiness_endpoint(require_warm: bool = False):
+    """
+    Readiness: estado, duración y error de inicialización de cada componente. 503 si un componente crítico falló
+    (o, con `require_warm=true`, si alguno crítico aún no se ha inicializado).
+    """
+    components = {name: c.status() for name, c in LAZY_COMPONENTS.items()}
+    not_ready = [name for name, c in LAZY_COMPONENTS.items() if c.critical and (c.unusable() or (require_warm and not c.initialized))]
+    body = {"status": "not_ready" if not_ready else "ready", "not_ready": not_ready, "components": components}
+    return JSONResponse(status_code=503 if not_ready else 200, content=body)
+
+@app.post("/warmup", tags=["General"])
+async def warmup_endpoint(components: Optional[List[str]] = Query(None), retry_failed: bool = False):
+    """Inicializa ahora los componentes indicados (todos por defecto) para que la primera petición real no pague el coste."""
+    names = components or list(LAZY_COMPONENTS)
+    unknown = [n for n in names if n not in LAZY_COMPONENTS]
+    if unknown: raise HTTPException(status_code=422, detail=f"Componentes desconocidos: {unknown}. Válidos: {list(LAZY_COMPONENTS)}")
+    if retry_failed:
+        for n in names:
+            if LAZY_COMPONENTS[n].unusable(): LAZY_COMPONENTS[n].reset()
+    started = time.perf_counter()
+    statuses = await _warmup_components([LAZY_COMPONENTS[n] for n in names])
+    return {"elapsed_s": round(time.perf_counter() - started, 3), "components": statuses}
+
 def _sanitize_filename_for_api(filename_base: str) -> str: # Helper
     # ... (código de sanitización como antes)
     if not filename_base: return "documento_sin_titulo"
     s=filename_base.replace(' ','_');s=re.sub(r'[^\w.\-]','',s);s=re.sub(r'_{2,}','_',s);s=re.sub(r'\.{2,}','.',s);s=s.strip('_.-');return s[:100] if s else"doc_procesado"
 
+def _stage_timing_collector(stage_timings: Dict[str, float], progress_callback: Optional[Callable[[str, Dict[str, Any]], None]]):
+    """Callback de progreso que registra la duración de cada tarea del crew y reenvía el evento (SSE) si hay consumidor."""
+    def _on_progress(event: str, data: Dict[str, Any]) -> None:
+        if event == "task_completed": stage_timings[data["task"]] = data["duration_s"]
+        if progress_callback: progress_callback(event, data)
+    return _on_progress
 
-@app.post("/research/conduct", response_model=ResearchAPIResponse, tags=["Investigación (CrewAI + Web + Editor)"])
-async def conduct_research_with_crew_endpoint( # Endpoint de Investigación existente
+def _token_stream_for(request: Any, progress_callback: Optional[Callable[[str, Dict[str, Any]], None]]):
+    """Tokens del LLM por el mismo canal que el progreso (variantes /stream); jobs y endpoints síncronos no tienen consumidor."""
+    return token_stream_scope(progress_callback if progress_callback and request.stream_tokens else None)
+
+def _request_budget_for(request: Any):
+    """Presupuesto de coste LLM de la petición (el plazo lo lleva el token de cancelación): lo usa el enrutado adaptativo."""
+    default_max_cost = settings.REQUEST_DEFAULT_MAX_COST_USD if settings else 0.0
+    return request_budget_scope(RequestBudget(request.max_cost_usd or default_max_cost))
+
+@contextmanager
+def _request_usage(kind: str, topic: str):
+    """Contabiliza las llamadas al LLM de la ejecución (response.usage) y la registra en el ledger al terminar, también si falla."""
+    usage, status = RequestUsage(kind, topic), "ok"
+    try:
+        with usage_scope(usage): yield usage
+    except OperationCancelled: status = "cancelled"; raise
+    except Exception: status = "error"; raise
+    finally:
+        if usage_ledger: usage_ledger.record(kind, usage.ref, usage.summary(), topic, status)
+
+def _usage_summary(ref: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Uso acumulado hasta ahora por la petición en curso; `ref` lo enlaza en el ledger (investigación: doc_id de ChromaDB)."""
+    usage = current_usage()
+    if usage is None: return None
+    if ref: usage.ref = ref
+    return usage.summary()
+
+@contextmanager
+def _crew_execution(crew: str):
+    """
+    Gauge de ejecuciones de crew en curso y contador de errores (excepciones y HTTPException) por crew.
+    Las cancelaciones no son errores: cuentan aparte, con los segundos de worker desperdiciados, y salen como 499/504.
+    """
+    metrics.CREW_EXECUTIONS_IN_FLIGHT.labels(crew=crew).inc()
+    started = time.perf_counter()
+    try:
+        check_cancelled() # Cancelada mientras esperaba worker: ni siquiera empezar
+        yield
+    except OperationCancelled as e:
+        wasted_s = time.perf_counter() - started
+        metrics.CREW_CANCELLATIONS_TOTAL.labels(crew=crew, reason=e.reason).inc()
+        metrics.CREW_ABANDONED_SECONDS_TOTAL.labels(crew=crew, reason=e.reason).inc(wasted_s)
+        with _cancellation_stats_lock: _cancellation_stats[e.reason] += 1; _cancellation_stats["abandoned_seconds"] += wasted_s
+        logger.info(f"Crew '{crew}' cancelado ({e.reason}) tras {wasted_s:.1f}s de trabajo.")
+        raise HTTPException(status_code=CANCEL_STATUS_CODES.get(e.reason, 499), detail=f"Ejecución cancelada ({e.reason}) tras {wasted_s:.1f}s.")
+    except Exception: metrics.ERRORS_TOTAL.labels(component=f"crew:{crew}").inc(); raise
+    finally: metrics.CREW_EXECUTIONS_IN_FLIGHT.labels(crew=crew).dec()
+
+def _cancel_token_for(request: Any) -> CancellationToken:
+    """Token de una ejecución: plazo `deadline_seconds` de la petición o REQUEST_DEFAULT_DEADLINE_SECONDS (0 = sin plazo)."""
+    return CancellationToken(request.deadline_seconds or (settings.REQUEST_DEFAULT_DEADLINE_SECONDS if settings else 0) or None)
+
+def _client_id(http_request: Request) -> str:
+    """Identidad del cliente para las cuotas de admisión: cabecera ADMISSION_CLIENT_HEADER o, si falta, su IP."""
+    header = settings.ADMISSION_CLIENT_HEADER if settings else "X-Client-ID"
+    return http_request.headers.get(header) or (http_request.client.host if http_request.client else "anonymous")
+
+async def _run_admitted(client_id: str, kind: str, factory: Callable[[], Any],
+                        enforce_limits: bool = True, timeout: Optional[float] = -1) -> Any:
+    """Espera slot de admisión (o lanza AdmissionRejected) y ejecuta `factory()` (awaitable del pool de crews)."""
+    if not admission_controller: return await factory()
+    ticket = await admission_controller.acquire(client_id, kind, enforce_limits=enforce_limits, timeout=timeout)
+    try: return await factory()
+    finally: admission_controller.release(ticket)
+
+async def _start_admitted(client_id: str, kind: str, func: Callable[..., Any], *args) -> "asyncio.Future":
+    """SSE: la admisión se resuelve antes de abrir el stream (el 429/503 llega como respuesta HTTP); el slot se libera al terminar."""
+    ticket = await admission_controller.acquire(client_id, kind) if admission_controller else None
+    future = job_service.run_async(func, *args)
+    if ticket: future.add_done_callback(lambda _f: admission_controller.release(ticket))
+    return future
+
+def _submit_admitted_job(client_id: str, kind: str, func: Callable[..., Any], *args) -> str:
+    """API de jobs: reserva al instante (429/503 si no cabe); el job queda 'queued' y pasa al pool al obtener slot."""
+    if not admission_controller: return job_service.submit(kind, func, *args)
+    ticket = admission_controller.reserve(client_id, kind)
+    job_id = job_service.create(kind)
+    task = asyncio.create_task(_start_job_when_admitted(ticket, job_id, func, *args))
+    _background_tasks.add(task); task.add_done_callback(_background_tasks.discard)
+    return job_id
+
+async def _start_job_when_admitted(ticket: AdmissionTicket, job_id: str, func: Callable[..., Any], *args) -> None:
+    try: await admission_controller.wait(ticket, timeout=None) # Nadie espera con la conexión abierta: sin límite de espera
+    except asyncio.CancelledError: job_service.fail(job_id, "Cancelado mientras esperaba admisión.", 503); raise
+    loop = asyncio.get_running_loop()
+    try: future = job_service.start(job_id, func, *args)
+    except Exception as e: admission_controller.release(ticket); job_service.fail(job_id, f"{type(e).__name__}: {e}", 500); return
+    # El callback del Future del pool corre en el hilo worker: liberar en el event loop
+    future.add_done_callback(lambda _f: loop.call_soon_threadsafe(admission_controller.release, ticket))
+
+def _research_request_key(request: ResearchAPIRequest) -> str:
+    return request_key("research", request.topic, request.content_to_analyze)
+
+def _marketing_request_key(request: MarketingContentRequest) -> str:
+    return request_key("marketing", request.topic, sorted(p.lower() for p in request.resolved_platforms()), request.context)
+
+def _cache_lookup(key: str, response_model: type) -> Optional[Any]:
+    """Respuesta cacheada para `key` (etiquetada con cache_hit/cached_at) o None. Nunca lanza: la caché es opcional."""
+    if not result_cache: return None
+    try:
+        entry = result_cache.get(key)
+        if not entry: return None
+        return response_model(**{**entry["value"], "cache_hit": True,
+                                 "cached_at": datetime.datetime.utcfromtimestamp(entry["created_at"]).isoformat()})
+    except Exception as e: logger.warning(f"Caché de resultados: lectura fallida para '{key}': {e}"); return None
+
+async def _cached_response(key: str, response_model: type, bypass: bool) -> Optional[Any]:
+    """Consulta la caché fuera del event loop (SQLite es E/S de disco); None si hay bypass o no hay entrada."""
+    if bypass or not result_cache: return None
+    response = await asyncio.to_thread(_cache_lookup, key, response_model)
+    if response: logger.info(f"Caché de resultados: acierto para '{key}'.")
+    return response
+
+def _cache_store(key: str, response: Any) -> None:
+    """Guarda una respuesta completa y sin errores (se llama desde el worker, al final del flujo)."""
+    if not result_cache or getattr(response, "error_details", None): return
+    try: result_cache.set(key, response.model_dump(exclude={"cache_hit", "cached_at"}))
+    except Exception as e: logger.warning(f"Caché de resultados: escritura fallida para '{key}': {e}")
+
+def _marketing_semantic_entry(request: MarketingContentRequest) -> Tuple[str, str]:
+    """(namespace, texto a embeber): solo se comparan peticiones con las mismas plataformas."""
+    platforms = sorted(p.lower() for p in request.resolved_platforms())
+    return "|".join(platforms), f"Tema: {normalize_topic(request.topic)}\nPlataforma: {', '.join(platforms)}\nContexto: {(request.context or '').strip()}"
+
+def _semantic_cache_lookup(request: MarketingContentRequest) -> Optional[MarketingContentResponse]:
+    try:
+        entry = semantic_cache.lookup(*_marketing_semantic_entry(request))
+        if not entry: return None
+        return MarketingContentResponse(**{**entry["value"], "cache_hit": True, "semantic_similarity": entry["similarity"],
+                                           "cached_at": datetime.datetime.utcfromtimestamp(entry["created_at"]).isoformat()})
+    except Exception as e: logger.warning(f"Caché semántica: lectura fallida para '{request.topic[:50]}': {e}"); return None
+
+async def _cached_marketing_response(request: MarketingContentRequest) -> Optional[MarketingContentResponse]:
+    """Caché exacta y, si no acierta, la semántica (omitida con bypass_cache o use_semantic_cache=false). Un acierto evita el crew."""
+    cached = await _cached_response(_marketing_request_key(request), MarketingContentResponse, request.bypass_cache)
+    if cached or request.bypass_cache or not request.use_semantic_cache or not semantic_cache: return cached
+    response = await asyncio.to_thread(_semantic_cache_lookup, request) # Embedding + SQLite: fuera del event loop
+    if response: logger.info(f"Caché semántica: acierto para '{request.topic[:50]}' (similitud {response.semantic_similarity}, tema original '{response.topic[:50]}').")
+    return response
+
+def _marketing_cache_store(request: MarketingContentRequest, response: MarketingContentResponse) -> None:
+    """Guarda en la caché exacta y en la semántica (desde el worker, al final del flujo)."""
+    _cache_store(_marketing_request_key(request), response)
+    if not semantic_cache or response.error_details: return
+    try: semantic_cache.store(*_marketing_semantic_entry(request), response.model_dump(exclude={"cache_hit", "cached_at", "semantic_similarity"}))
+    except Exception as e: logger.warning(f"Caché semántica: escritura fallida para '{request.topic[:50]}': {e}")
+
+def _completed_future(result: Any) -> "asyncio.Future":
+    future = asyncio.get_running_loop().create_future(); future.set_result(result)
+    return future
+
+def _timed_memory_lookup(persistence_svc: PersistenceService, topic: str, n_results: int) -> Dict[str, Any]:
+    t_stage = time.perf_counter()
+    items = persistence_svc.query_similar_research(query_text=topic, n_results=n_results)
+    return {"items": items, "duration_s": round(time.perf_counter() - t_stage, 3)}
+
+def _collect_memory_lookup(memory_future: Optional[Future], exclude_doc_id: str, n_results: int, stage_timings: Dict[str, float],
+                           progress_callback: Optional[Callable[[str, Dict[str, Any]], None]]) -> List[ResearchMemoryItem]:
+    """Recoge la búsqueda de memoria lanzada antes del crew, excluyendo el documento insertado por esta misma petición."""
+    if memory_future is None: return []
+    try: lookup = memory_future.result(timeout=settings.RESEARCH_MEMORY_LOOKUP_TIMEOUT_SECONDS if settings else 30)
+    except Exception as e: logger.warning(f"Búsqueda de memoria relevante fallida/expirada: {e}"); return []
+    stage_timings["memory_lookup"] = lookup["duration_s"]
+    if progress_callback: progress_callback("stage_completed", {"stage": "memory_lookup", "duration_s": lookup["duration_s"]})
+    return [ResearchMemoryItem(**item) for item in lookup["items"] if item.get("id") != exclude_doc_id][:n_results]
+
+def _job_is_active(job_id: str) -> bool:
+    job = job_service.get_job(job_id)
+    return bool(job) and job["status"] in ("queued", "running")
+
+
+def _execute_research_request(
     request: ResearchAPIRequest,
-    gdrive_svc: Optional[GDriveService] = Depends(get_gdrive_service_dependency),
-    persistence_svc: Optional[PersistenceService] = Depends(get_persistence_service_dependency)
-):
-    logger.info(f"POST /research/conduct | Tema: '{request.topic[:50]}...' | Contenido: {bool(request.content_to_analyze)}")
+    gdrive_svc: Optional[GDriveService],
+    persistence_svc: Optional[PersistenceService],
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    cancel_token: Optional[CancellationToken] = None,
+) -> ResearchAPIResponse:
+    """Flujo completo (bloqueante) de investigación: crew + GDrive + ChromaDB. Se ejecuta en el pool de workers."""
+    research_crew_exec = research_crew_component.get()
     if not research_crew_exec: raise HTTPException(status_code=503, detail="Servicio de Investigación no disponible.")
+    with cancellation_scope(cancel_token), _request_budget_for(request), _token_stream_for(request, progress_callback), \
+            _request_usage("research", request.topic), _crew_execution("research"):
+        return _execute_research_flow(research_crew_exec, request, gdrive_svc, persistence_svc, progress_callback)
 
+def _execute_research_flow(
+    research_crew_exec: Callable[..., Optional[str]],
+    request: ResearchAPIRequest,
+    gdrive_svc: Optional[GDriveService],
+    persistence_svc: Optional[PersistenceService],
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]],
+) -> ResearchAPIResponse:
+    stage_timings: Dict[str, float] = {}
     final_report_content: Optional[str] = None
+    doc_id = f"research_{uuid.uuid4()}" # Id del documento que insertará esta petición (se excluye de su propia memoria)
+    n_memory = settings.RESEARCH_MEMORY_RESULTS if settings else 3
+    memory_future: Optional[Future] = None
+    if persistence_svc and persistence_svc.collection: # La consulta corre mientras el crew trabaja: no suma latencia
+        memory_future = memory_lookup_executor.submit(_timed_memory_lookup, persistence_svc, request.topic, n_memory + 1)
     try:
-        final_report_content = research_crew_exec(topic=request.topic, content_to_analyze=request.content_to_analyze)
+        t_crew = time.perf_counter()
+        final_report_content = research_crew_exec(topic=request.topic, content_to_analyze=request.content_to_analyze,
+                                                  progress_callback=_stage_timing_collector(stage_timings, progress_callback))
+        stage_timings["crew_kickoff"] = round(time.perf_counter() - t_crew, 3)
         if isinstance(final_report_content, str) and ("Error crítico:" in final_report_content or "Error:" in final_report_content[:150]):
             logger.error(f"Crew de Investigación devolvió error: {final_report_content}")
             raise HTTPException(status_code=502, detail=f"Error procesando investigación: {final_report_content}")
+    except (HTTPException, OperationCancelled): raise
     except Exception as e_exec: logger.error(f"Error ejecución crew invest: {e_exec}", exc_info=True); raise HTTPException(500, f"Error interno crew invest: {e_exec}")
 
     if not isinstance(final_report_content, str) or not final_report_content.strip():
@@ -91,46 +512,239 @@ async def conduct_research_with_crew_endpoint( # Endpoint de Investigación exis
     # (Esta lógica puede permanecer muy similar a como estaba en tu última versión funcional)
     # Solo asegúrate de usar 'final_report_content'
     report_summary_for_db = final_report_content[:500] + "..." # Simplificado para el ejemplo
-    gdrive_link, gdrive_id, local_fallback_path = None, None, None
-    if gdrive_svc:
-         filename = f"InformeEditado_{_sanitize_filename_for_api(request.topic)}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.md"
+    gdrive_link, gdrive_id, local_fallback_path, persistence_task_id = None, None, None, None
+    filename = f"InformeEditado_{_sanitize_filename_for_api(request.topic)}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.md"
+    if write_behind_service and gdrive_svc and gdrive_svc.service: # Encolar y responder: la subida a Drive y el embedding no suman latencia al cliente
+        t_stage = time.perf_counter()
+        persistence_task_id = write_behind_service.enqueue(request.topic, final_report_content, report_summary_for_db, filename, doc_id)
+        stage_timings["persistence_enqueue"] = round(time.perf_counter() - t_stage, 3)
+        if progress_callback: progress_callback("stage_completed", {"stage": "persistence_enqueue", "duration_s": stage_timings["persistence_enqueue"], "persistence_task_id": persistence_task_id})
+    elif gdrive_svc: # Sin cola write-behind: persistencia en línea como antes
+         t_stage = time.perf_counter()
          res = gdrive_svc.upload_text_as_md(final_report_content, filename)
          if not res.get("error"): gdrive_link, gdrive_id = res.get("webViewLink"), res.get("id")
          else: logger.error("Fallo GDrive en /research"); # Podría haber fallback aquí
+         stage_timings["gdrive_upload"] = round(time.perf_counter() - t_stage, 3)
+         if progress_callback: progress_callback("stage_completed", {"stage": "gdrive_upload", "duration_s": stage_timings["gdrive_upload"], "gdrive_link": gdrive_link})
     if persistence_svc and gdrive_id:
-        try: persistence_svc.add_research_document(topic=request.topic, summary=report_summary_for_db, gdrive_id=gdrive_id, gdrive_link=gdrive_link or "")
+        t_stage = time.perf_counter()
+        try: persistence_svc.add_research_document(topic=request.topic, summary=report_summary_for_db, gdrive_id=gdrive_id, gdrive_link=gdrive_link or "", doc_id=doc_id)
         except Exception as e: logger.error(f"Fallo ChromaDB en /research: {e}")
-    # ... búsqueda de memoria relevante ...
-    relevant_past = []
+        stage_timings["chroma_insert"] = round(time.perf_counter() - t_stage, 3)
+        if progress_callback: progress_callback("stage_completed", {"stage": "chroma_insert", "duration_s": stage_timings["chroma_insert"]})
+    relevant_past = _collect_memory_lookup(memory_future, doc_id, n_memory, stage_timings, progress_callback)
 
-    return ResearchAPIResponse(
-        message="Investigación+Edición completada y guardada.", topic=request.topic,
+    response = ResearchAPIResponse(
+        message="Investigación+Edición completada; guardado en Drive/ChromaDB en segundo plano." if persistence_task_id else "Investigación+Edición completada y guardada.",
+        topic=request.topic,
         report_gdrive_link=gdrive_link, report_gdrive_id=gdrive_id,
         report_summary_for_db=report_summary_for_db, full_report_content=final_report_content,
-        local_fallback_path=local_fallback_path, relevant_past_research=relevant_past
+        local_fallback_path=local_fallback_path, relevant_past_research=relevant_past,
+        stage_timings=stage_timings, persistence_task_id=persistence_task_id, usage=_usage_summary(doc_id)
     )
+    _cache_store(_research_request_key(request), response)
+    return response
 
-# --- NUEVO ENDPOINT PARA MARKETING ---
-@app.post("/marketing/generate-content", response_model=MarketingContentResponse, tags=["Marketing (CrewAI)"])
-async def generate_marketing_content_endpoint(
-    request: MarketingContentRequest, # Necesitamos definir este modelo en api_models.py
+
+@app.post("/research/conduct", response_model=ResearchAPIResponse, tags=["Investigación (CrewAI + Web + Editor)"])
+async def conduct_research_with_crew_endpoint( # Endpoint de Investigación existente
+    request: ResearchAPIRequest,
+    http_request: Request,
+    gdrive_svc: Optional[GDriveService] = Depends(get_gdrive_service_dependency),
+    persistence_svc: Optional[PersistenceService] = Depends(get_persistence_service_dependency)
+):
+    logger.info(f"POST /research/conduct | Tema: '{request.topic[:50]}...' | Contenido: {bool(request.content_to_analyze)}")
+    _ensure_component(research_crew_component, "Servicio de Investigación no disponible.")
+    return await _run_research_coalesced(request, _client_id(http_request), gdrive_svc, persistence_svc,
+                                         is_disconnected=http_request.is_disconnected)
+
+async def _run_research_coalesced(
+    request: ResearchAPIRequest,
+    client_id: str,
+    gdrive_svc: Optional[GDriveService],
+    persistence_svc: Optional[PersistenceService],
+    check_cache: bool = True,
+    in_batch: bool = False,
+    is_disconnected: Optional[Callable[[], Any]] = None,
+) -> ResearchAPIResponse:
+    if check_cache:
+        cached = await _cached_response(_research_request_key(request), ResearchAPIResponse, request.bypass_cache)
+        if cached: return cached
+    # El crew corre en el pool de workers: el event loop sigue atendiendo /, /research/memory, /jobs...
+    # Peticiones idénticas (tema normalizado + hash de contenido) se adjuntan a la misma ejecución (sin pasar por admisión).
+    # Los ítems de lote ya están acotados por su semáforo: esperan slot sin cupo por cliente ni límite de cola.
+    # Si todos los receptores se desconectan o vence el plazo, el token detiene el crew y el slot se libera antes.
+    cancel_token = _cancel_token_for(request)
+    response, _shared = await single_flight.do(
+        _research_request_key(request),
+        lambda: _run_admitted(client_id, "research", lambda: job_service.run_async(_execute_research_request, request, gdrive_svc, persistence_svc, None, cancel_token),
+                              enforce_limits=not in_batch, timeout=None if in_batch else -1),
+        cancel_token=cancel_token, is_disconnected=is_disconnected, poll_seconds=settings.DISCONNECT_POLL_SECONDS if settings else 1.0,
+    )
+    return response
+
+@app.post("/research/conduct/stream", tags=["Investigación (CrewAI + Web + Editor)"])
+async def conduct_research_stream_endpoint(
+    request: ResearchAPIRequest,
+    http_request: Request,
+    gdrive_svc: Optional[GDriveService] = Depends(get_gdrive_service_dependency),
+    persistence_svc: Optional[PersistenceService] = Depends(get_persistence_service_dependency)
 ):
-    logger.info(f"POST /marketing/generate-content | Tema: '{request.topic[:50]}...' | Plataforma: {request.platform}")
-    if not marketing_crew_exec: raise HTTPException(status_code=503, detail="Servicio de Marketing no disponible.")
+    """Variante SSE de /research/conduct: emite eventos por tarea (el borrador llega con 'task_completed' de 'research_task') y al final 'result'."""
+    logger.info(f"POST /research/conduct/stream | Tema: '{request.topic[:50]}...' | Contenido: {bool(request.content_to_analyze)}")
+    _ensure_component(research_crew_component, "Servicio de Investigación no disponible.")
+    bridge = ProgressEventBridge(asyncio.get_running_loop())
+    cached = await _cached_response(_research_request_key(request), ResearchAPIResponse, request.bypass_cache)
+    cancel_token = _cancel_token_for(request)
+    result_future = _completed_future(cached) if cached else await _start_admitted(
+        _client_id(http_request), "research", _execute_research_request, request, gdrive_svc, persistence_svc, bridge.emit, cancel_token)
+    return StreamingResponse(sse_event_stream(bridge, result_future, cancel_token), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
+# --- Lotes de investigación: concurrencia acotada + presupuesto compartido Tavily ---
+async def _run_research_batch(
+    batch_id: str,
+    items: List[ResearchAPIRequest],
+    max_concurrency: int,
+    client_id: str,
+    gdrive_svc: Optional[GDriveService],
+    persistence_svc: Optional[PersistenceService],
+) -> None:
+    semaphore = asyncio.Semaphore(max_concurrency)
+    est_tavily = settings.RESEARCH_EST_TAVILY_CALLS if settings else 2
+
+    async def _run_item(index: int, item: ResearchAPIRequest) -> None:
+        cached = await _cached_response(_research_request_key(item), ResearchAPIResponse, item.bypass_cache)
+        if cached: # Un acierto de caché no consume concurrencia ni presupuesto Tavily
+            batch_service.mark_item_running(batch_id, index)
+            batch_service.mark_item_finished(batch_id, index, result=cached.model_dump())
+            return
+        async with semaphore:
+            await tavily_rate_budget.acquire_async(est_tavily)
+            batch_service.mark_item_running(batch_id, index)
+            try:
+                response = await _run_research_coalesced(item, client_id, gdrive_svc, persistence_svc, check_cache=False, in_batch=True)
+                batch_service.mark_item_finished(batch_id, index, result=response.model_dump())
+            except HTTPException as e_http:
+                batch_service.mark_item_finished(batch_id, index, error_details=str(e_http.detail), error_status_code=e_http.status_code)
+            except Exception as e_item:
+                logger.error(f"Lote '{batch_id}' ítem {index}: {e_item}", exc_info=True)
+                batch_service.mark_item_finished(batch_id, index, error_details=f"{type(e_item).__name__}: {e_item}", error_status_code=500)
+
+    await asyncio.gather(*(_run_item(i, item) for i, item in enumerate(items)))
+    logger.info(f"Lote '{batch_id}' finalizado: {batch_service.get_batch(batch_id, include_results=False)['throughput_topics_per_minute']} temas/min.")
+
+@app.post("/research/conduct-batch", response_model=ResearchBatchStatusResponse, status_code=202, tags=["Investigación (CrewAI + Web + Editor)"])
+async def conduct_research_batch_endpoint(
+    request: ResearchBatchRequest,
+    http_request: Request,
+    gdrive_svc: Optional[GDriveService] = Depends(get_gdrive_service_dependency),
+    persistence_svc: Optional[PersistenceService] = Depends(get_persistence_service_dependency)
+):
+    """Encola un lote de temas y devuelve su estado inicial; consultar el progreso en GET /research/batch/{batch_id}."""
+    max_items = settings.RESEARCH_BATCH_MAX_ITEMS if settings else 200
+    logger.info(f"POST /research/conduct-batch | {len(request.items)} temas | max_concurrency: {request.max_concurrency}")
+    _ensure_component(research_crew_component, "Servicio de Investigación no disponible.")
+    if len(request.items) > max_items: raise HTTPException(status_code=422, detail=f"Máximo {max_items} temas por lote.")
+
+    max_concurrency = request.max_concurrency or (settings.RESEARCH_BATCH_MAX_CONCURRENCY if settings else 4)
+    batch_id = batch_service.create_batch("research", [item.topic for item in request.items], max_concurrency)
+    task = asyncio.create_task(_run_research_batch(batch_id, request.items, max_concurrency, _client_id(http_request), gdrive_svc, persistence_svc))
+    _background_tasks.add(task); task.add_done_callback(_background_tasks.discard)
+    return ResearchBatchStatusResponse(**batch_service.get_batch(batch_id))
+
+@app.get("/research/batch/{batch_id}", response_model=ResearchBatchStatusResponse, tags=["Investigación (CrewAI + Web + Editor)"])
+async def get_research_batch_endpoint(batch_id: str, include_results: bool = True):
+    batch = batch_service.get_batch(batch_id, include_results=include_results)
+    if not batch: raise HTTPException(status_code=404, detail=f"Lote '{batch_id}' no encontrado (o ya expirado).")
+    return ResearchBatchStatusResponse(**batch)
+
+
+def _execute_multiplatform_marketing_request(
+    request: MarketingContentRequest,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+) -> MarketingContentResponse:
+    """Fan-out multi-plataforma: ideas una vez, post + prompt en paralelo por plataforma."""
+    platforms = request.resolved_platforms()
+    max_platforms = settings.MARKETING_MAX_PLATFORMS if settings else 5
+    if len(platforms) > max_platforms: raise HTTPException(status_code=422, detail=f"Máximo {max_platforms} plataformas por petición.")
+    marketing_multi_exec = getattr(_marketing_component(request).get(), "run_multiplatform_marketing_fast_pipeline" if _marketing_mode(request) == "fast"
+                                   else "create_multiplatform_marketing_content_and_kickoff", None)
+    if not marketing_multi_exec: raise HTTPException(status_code=503, detail="Servicio de Marketing multi-plataforma no disponible.")
+
+    stage_timings: Dict[str, float] = {}
+    try:
+        t_crew = time.perf_counter()
+        results_dict = marketing_multi_exec(topic=request.topic, platforms=platforms, context=request.context,
+                                            progress_callback=_stage_timing_collector(stage_timings, progress_callback))
+        stage_timings["crew_kickoff"] = round(time.perf_counter() - t_crew, 3)
+    except OperationCancelled: raise
+    except Exception as e_exec_mk:
+        logger.error(f"Error ejecución crew marketing multi-plataforma: {e_exec_mk}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error interno crew marketing: {str(e_exec_mk)}")
+    if not isinstance(results_dict, dict) or results_dict.get("error"):
+        error_msg = results_dict.get("error") if isinstance(results_dict, dict) else "Resultado inesperado."
+        logger.error(f"Crew de Marketing multi-plataforma devolvió error: {error_msg}")
+        raise HTTPException(status_code=502, detail=f"Error procesando marketing: {error_msg}")
+
+    platform_results = {
+        p: MarketingPlatformContent(post_text=r.get("post_text"), image_prompt=r.get("image_prompt"), error_details=r.get("error"))
+        for p, r in results_dict.get("platforms", {}).items()
+    }
+    failed = [p for p, r in platform_results.items() if r.error_details or not r.post_text]
+    logger.info(f"Generación multi-plataforma OK ({len(platforms) - len(failed)}/{len(platforms)}).")
+    response = MarketingContentResponse(
+         message="Contenido de marketing generado para varias plataformas." + (f" Con errores en: {', '.join(failed)}." if failed else ""),
+         topic=request.topic,
+         platform=", ".join(platforms),
+         marketing_ideas=results_dict.get("ideas"),
+         error_details=f"Fallaron: {', '.join(failed)}" if failed else None,
+         stage_timings=stage_timings,
+         platform_results=platform_results,
+         usage=_usage_summary()
+    )
+    _marketing_cache_store(request, response) # Solo si no falló ninguna plataforma
+    return response
+
+
+def _execute_marketing_request(
+    request: MarketingContentRequest,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    cancel_token: Optional[CancellationToken] = None,
+) -> MarketingContentResponse:
+    """Flujo completo (bloqueante) de marketing, con el crew o con el pipeline rápido según `mode`. Se ejecuta en el pool de workers."""
+    if not _marketing_component(request).get(): raise HTTPException(status_code=503, detail="Servicio de Marketing no disponible.")
+    crew = "marketing_fast" if _marketing_mode(request) == "fast" else "marketing"
+    with cancellation_scope(cancel_token), _request_budget_for(request), _token_stream_for(request, progress_callback), \
+            _request_usage("marketing", request.topic):
+        if len(request.resolved_platforms()) > 1:
+            with _crew_execution(f"{crew}_multiplatform"): return _execute_multiplatform_marketing_request(request, progress_callback)
+        with _crew_execution(crew): return _execute_single_platform_marketing_request(request, progress_callback)
+
+def _execute_single_platform_marketing_request(
+    request: MarketingContentRequest,
+    progress_callback: Optional[Callable[[str, Dict[str, Any]], None]],
+) -> MarketingContentResponse:
+    component = _marketing_component(request).get()
+    marketing_crew_exec = component.run_marketing_fast_pipeline if _marketing_mode(request) == "fast" else component.create_marketing_content_crew_and_kickoff
+    stage_timings: Dict[str, float] = {}
     results_dict: Optional[dict] = None
     try:
+        t_crew = time.perf_counter()
         results_dict = marketing_crew_exec(
             topic=request.topic,
-            platform=request.platform,
-            context=request.context # Pasamos el contexto opcional
+            platform=request.resolved_platforms()[0],
+            context=request.context, # Pasamos el contexto opcional
+            progress_callback=_stage_timing_collector(stage_timings, progress_callback)
         )
+        stage_timings["crew_kickoff"] = round(time.perf_counter() - t_crew, 3)
         # Verificar si el diccionario devuelto contiene un error clave
         if isinstance(results_dict, dict) and results_dict.get("error"):
             error_msg = results_dict["error"]
             logger.error(f"Crew de Marketing devolvió error: {error_msg}")
             raise HTTPException(status_code=502, detail=f"Error procesando marketing: {error_msg}")
 
+    except (HTTPException, OperationCancelled): raise
     except Exception as e_exec_mk:
         logger.error(f"Error ejecución crew marketing: {e_exec_mk}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error interno crew marketing: {str(e_exec_mk)}")
@@ -142,14 +756,151 @@ async def generate_marketing_content_endpoint(
     logger.info("Generación de contenido de marketing OK por Crew.")
     
     # Construir la respuesta API desde el diccionario devuelto por el crew
-    return MarketingContentResponse(
+    response = MarketingContentResponse(
          message="Contenido de marketing generado.",
          topic=request.topic,
-         platform=request.platform,
+         platform=request.resolved_platforms()[0],
          marketing_ideas=results_dict.get("ideas"),
          post_text=results_dict.get("post_text"),
-         image_prompt=results_dict.get("image_prompt")
+         image_prompt=results_dict.get("image_prompt"),
+         stage_timings=stage_timings,
+         usage=_usage_summary()
+    )
+    _marketing_cache_store(request, response)
+    return response
+
+
+# --- NUEVO ENDPOINT PARA MARKETING ---
+@app.post("/marketing/generate-content", response_model=MarketingContentResponse, tags=["Marketing (CrewAI)"])
+async def generate_marketing_content_endpoint(
+    request: MarketingContentRequest, # Necesitamos definir este modelo en api_models.py
+    http_request: Request,
+):
+    logger.info(f"POST /marketing/generate-content | Tema: '{request.topic[:50]}...' | Plataforma: {', '.join(request.resolved_platforms())}")
+    _ensure_component(_marketing_component(request), "Servicio de Marketing no disponible.")
+    cached = await _cached_marketing_response(request)
+    if cached: return cached
+    cancel_token = _cancel_token_for(request)
+    response, _shared = await single_flight.do(
+        _marketing_request_key(request),
+        lambda: _run_admitted(_client_id(http_request), "marketing", lambda: job_service.run_async(_execute_marketing_request, request, None, cancel_token)),
+        cancel_token=cancel_token, is_disconnected=http_request.is_disconnected, poll_seconds=settings.DISCONNECT_POLL_SECONDS if settings else 1.0,
+    )
+    return response
+
+@app.post("/marketing/generate-content/stream", tags=["Marketing (CrewAI)"])
+async def generate_marketing_content_stream_endpoint(request: MarketingContentRequest, http_request: Request):
+    """Variante SSE de /marketing/generate-content: ideas, post y prompt llegan a medida que termina cada tarea."""
+    logger.info(f"POST /marketing/generate-content/stream | Tema: '{request.topic[:50]}...' | Plataforma: {', '.join(request.resolved_platforms())}")
+    _ensure_component(_marketing_component(request), "Servicio de Marketing no disponible.")
+    bridge = ProgressEventBridge(asyncio.get_running_loop())
+    cached = await _cached_marketing_response(request)
+    cancel_token = _cancel_token_for(request)
+    result_future = _completed_future(cached) if cached else await _start_admitted(
+        _client_id(http_request), "marketing", _execute_marketing_request, request, bridge.emit, cancel_token)
+    return StreamingResponse(sse_event_stream(bridge, result_future, cancel_token), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- Jobs asíncronos: POST devuelve job_id al instante, GET /jobs/{id} devuelve estado y resultado ---
+def _job_submit_response(job_id: str, kind: str) -> JobSubmitResponse:
+    job = job_service.get_job(job_id) or {}
+    return JobSubmitResponse(job_id=job_id, kind=kind, status=job.get("status", "queued"), status_url=f"/jobs/{job_id}")
+
+@app.post("/jobs/research", response_model=JobSubmitResponse, status_code=202, tags=["Jobs"])
+async def submit_research_job_endpoint(
+    request: ResearchAPIRequest,
+    http_request: Request,
+    gdrive_svc: Optional[GDriveService] = Depends(get_gdrive_service_dependency),
+    persistence_svc: Optional[PersistenceService] = Depends(get_persistence_service_dependency)
+):
+    logger.info(f"POST /jobs/research | Tema: '{request.topic[:50]}...'")
+    _ensure_component(research_crew_component, "Servicio de Investigación no disponible.")
+    cached = await _cached_response(_research_request_key(request), ResearchAPIResponse, request.bypass_cache)
+    if cached: return _job_submit_response(job_service.complete("research", cached), "research")
+    job_id, _shared = single_flight.submit_job(
+        _research_request_key(request),
+        lambda: _submit_admitted_job(_client_id(http_request), "research", _execute_research_request, request, gdrive_svc, persistence_svc,
+                                     None, _cancel_token_for(request)), # Sin conexión que vigilar: solo el plazo
+        _job_is_active,
     )
+    return _job_submit_response(job_id, "research")
+
+@app.post("/jobs/marketing", response_model=JobSubmitResponse, status_code=202, tags=["Jobs"])
+async def submit_marketing_job_endpoint(request: MarketingContentRequest, http_request: Request):
+    logger.info(f"POST /jobs/marketing | Tema: '{request.topic[:50]}...' | Plataforma: {', '.join(request.resolved_platforms())}")
+    _ensure_component(_marketing_component(request), "Servicio de Marketing no disponible.")
+    cached = await _cached_marketing_response(request)
+    if cached: return _job_submit_response(job_service.complete("marketing", cached), "marketing")
+    job_id, _shared = single_flight.submit_job(
+        _marketing_request_key(request),
+        lambda: _submit_admitted_job(_client_id(http_request), "marketing", _execute_marketing_request, request, None, _cancel_token_for(request)),
+        _job_is_active,
+    )
+    return _job_submit_response(job_id, "marketing")
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse, tags=["Jobs"])
+async def get_job_status_endpoint(job_id: str):
+    job = job_service.get_job(job_id)
+    if not job: raise HTTPException(status_code=404, detail=f"Job '{job_id}' no encontrado (o ya expirado).")
+    return JobStatusResponse(**job)
+
+
+# --- Cola de escritura diferida (GDrive + ChromaDB) ---
+@app.get("/persistence/status", response_model=PersistenceQueueStatusResponse, tags=["Persistencia"])
+async def get_persistence_status_endpoint(limit: int = 20):
+    if not write_behind_service: raise HTTPException(status_code=503, detail="Cola write-behind no habilitada.")
+    return PersistenceQueueStatusResponse(**await asyncio.to_thread(write_behind_service.get_status, limit))
+
+@app.get("/persistence/tasks/{task_id}", response_model=PersistenceTaskStatus, tags=["Persistencia"])
+async def get_persistence_task_endpoint(task_id: str):
+    if not write_behind_service: raise HTTPException(status_code=503, detail="Cola write-behind no habilitada.")
+    task = await asyncio.to_thread(write_behind_service.get_task, task_id)
+    if not task: raise HTTPException(status_code=404, detail=f"Tarea de persistencia '{task_id}' no encontrada.")
+    return PersistenceTaskStatus(**task)
+
+
+# --- Métricas Prometheus ---
+@app.get("/metrics", tags=["General"])
+async def metrics_endpoint():
+    """Formato de exposición de Prometheus. Con PROMETHEUS_MULTIPROC_DIR agrega todos los workers de uvicorn."""
+    if not metrics.METRICS_ENABLED: raise HTTPException(status_code=503, detail="prometheus_client no instalado.")
+    payload, content_type = await asyncio.to_thread(metrics.render_latest)
+    return Response(content=payload, media_type=content_type)
+
+
+# --- Estadísticas operativas (dimensionamiento del pool) ---
+@app.get("/stats", tags=["General"])
+async def get_stats_endpoint() -> Dict[str, Any]:
+    return {
+        "jobs": job_service.get_stats(),
+        "event_loop": event_loop_monitor.get_stats(),
+        "rate_budgets": {"tavily": tavily_rate_budget.get_stats()}, # LLM: llm_client.scheduler
+        "llm_client": llm_client.get_stats(),
+        "single_flight": single_flight.get_stats(),
+        "admission": admission_controller.get_stats() if admission_controller else None,
+        "cancellations": {k: round(v, 3) if k == "abandoned_seconds" else int(v) for k, v in _cancellation_stats.items()},
+        "result_cache": result_cache.get_stats() if result_cache else None,
+        "semantic_cache": await asyncio.to_thread(semantic_cache.get_stats) if semantic_cache else None,
+        "write_behind": (await asyncio.to_thread(write_behind_service.get_status, 0))["counts"] if write_behind_service else None,
+        "usage_ledger": usage_ledger.get_stats() if usage_ledger else None,
+    }
+
+
+# --- Uso de LLM (tokens y coste estimado) ---
+@app.get("/usage/daily", response_model=UsageDailyResponse, tags=["Uso de LLM"])
+async def get_usage_daily_endpoint(days: int = Query(7, ge=1, le=366), kind: Optional[str] = Query(None, description="research | marketing")):
+    """Tokens y coste estimado por día (desglosados por etapa y tipo de petición) y etapas ordenadas por coste del periodo."""
+    if not usage_ledger: raise HTTPException(status_code=503, detail="Ledger de uso no habilitado.")
+    return UsageDailyResponse(**await asyncio.to_thread(usage_ledger.daily, days, kind))
+
+@app.get("/usage/requests/{ref}", tags=["Uso de LLM"])
+async def get_usage_request_endpoint(ref: str) -> List[Dict[str, Any]]:
+    """Filas del ledger de una petición (`ref`: doc_id del informe en ChromaDB para investigación)."""
+    if not usage_ledger: raise HTTPException(status_code=503, detail="Ledger de uso no habilitado.")
+    rows = await asyncio.to_thread(usage_ledger.get_request, ref)
+    if not rows: raise HTTPException(status_code=404, detail=f"Sin uso registrado para '{ref}'.")
+    return rows
 
 
 # --- Endpoint de Memoria (Sin cambios necesarios) ---
@@ -162,7 +913,7 @@ async def query_research_memory_endpoint( # ... código como antes ...
     logger.info(f"GET /research/memory | query: '{query}'")
     if not persistence_svc or not persistence_svc.collection: raise HTTPException(503,"Servicio persistencia no disponible.")
     try:
-        items = persistence_svc.query_similar_research(query_text=query, n_results=5)
+        items = await asyncio.to_thread(persistence_svc.query_similar_research, query_text=query, n_results=5) # Bloqueante (ChromaDB o HTTP remoto): fuera del event loop
         if not items: return []
         return [ResearchMemoryItem(**item) for item in items]
     except Exception as e: logger.error(f"Error en GET /memory: {e}"); raise HTTPException(500, "Error consultando memoria")
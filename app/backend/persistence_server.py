@@ -0,0 +1,218 @@
+# app/backend/persistence_server.py
+# Proceso único dueño de la colección ChromaDB (y del modelo de embeddings) para PERSISTENCE_MODE=remote.
+# Los workers de la API le hablan por HTTP (RemotePersistenceService); inserciones y consultas que llegan a la vez
+# desde varios workers se agrupan en lotes: un solo cálculo de embeddings y un único escritor sobre el disco.
+#
+# Arranque (un solo worker, siempre):
+#   python -m app.backend.persistence_server
+#   uvicorn app.backend.persistence_server:app --host 127.0.0.1 --port 8100 --workers 1
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.core import metrics
+from app.services.persistence_service import PersistenceService
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class MicroBatcher:
+    """
+    Agrupa los ítems que llegan en `window_s` (o hasta `max_size`) y los procesa con una sola llamada a
+    `process_batch(items) -> results` en `executor`. Mientras un lote se procesa, los siguientes se acumulan.
+    """
+
+    def __init__(self, name: str, process_batch: Callable[[List[Any]], List[Any]], executor: ThreadPoolExecutor,
+                 max_size: int, window_s: float):
+        self.name = name
+        self.process_batch = process_batch
+        self.executor = executor
+        self.max_size = max(1, int(max_size))
+        self.window_s = max(0.0, float(window_s))
+        self._pending: List[Tuple[Any, "asyncio.Future"]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches_total = 0
+        self.items_total = 0
+        self.max_batch_size_seen = 0
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size: self._flush()
+        elif self._timer is None: self._timer = loop.call_later(self.window_s, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None: self._timer.cancel(); self._timer = None
+        batch, self._pending = self._pending, []
+        if batch: asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Any, "asyncio.Future"]]) -> None:
+        self.batches_total += 1
+        self.items_total += len(batch)
+        self.max_batch_size_seen = max(self.max_batch_size_seen, len(batch))
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.process_batch, [item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"MicroBatcher '{self.name}': lote de {len(batch)} fallido: {e}", exc_info=True)
+            for _, future in batch:
+                if not future.done(): future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done(): future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "batches_total": self.batches_total,
+            "items_total": self.items_total,
+            "avg_batch_size": round(self.items_total / self.batches_total, 2) if self.batches_total else None,
+            "max_batch_size": self.max_batch_size_seen,
+            "pending": len(self._pending),
+        }
+
+
+# --- Modelos del protocolo (API interna entre workers y este proceso) ---
+class ResearchDocumentIn(BaseModel):
+    topic: str
+    summary: str
+    gdrive_id: str
+    gdrive_link: str = ""
+    content_preview: str = ""
+    doc_id: Optional[str] = None
+
+class AddDocumentsRequest(BaseModel):
+    documents: List[ResearchDocumentIn] = Field(..., min_length=1)
+
+class EmbedRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1)
+
+class QueryRequest(BaseModel):
+    query_texts: List[str] = Field(..., min_length=1)
+    n_results: int = Field(3, ge=1, le=100)
+    where_filter: Optional[Dict[str, Any]] = None
+
+
+# --- Estado del proceso ---
+persistence_service: Optional[PersistenceService] = None
+# Un único hilo escritor: ChromaDB nunca recibe escrituras concurrentes. Las consultas van por su propio hilo.
+write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-writer")
+query_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-query")
+_started_at = time.time()
+
+
+def _add_batch(documents: List[Dict[str, Any]]) -> List[Optional[str]]:
+    return persistence_service.add_research_documents(documents)
+
+def _query_batch(queries: List[Tuple[str, int, Optional[Dict[str, Any]]]]) -> List[List[dict]]:
+    """Agrupa por (n_results, filtro): cada grupo es una sola llamada a ChromaDB con varias query_texts."""
+    groups: Dict[Tuple[int, str], List[int]] = defaultdict(list)
+    for index, (_text, n_results, where_filter) in enumerate(queries):
+        groups[(n_results, json.dumps(where_filter, sort_keys=True))].append(index)
+    results: List[List[dict]] = [[] for _ in queries]
+    for (n_results, where_json), indexes in groups.items():
+        group_results = persistence_service.query_similar_research_batch(
+            [queries[i][0] for i in indexes], n_results=n_results, where_filter=json.loads(where_json))
+        for i, items in zip(indexes, group_results): results[i] = items
+    return results
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    vectors = persistence_service.embed_texts(texts)
+    if len(vectors) != len(texts): raise RuntimeError("No se pudieron calcular los embeddings.")
+    return vectors
+
+_window_s = (settings.PERSISTENCE_BATCH_WINDOW_MS if settings else 20) / 1000.0
+_max_batch = settings.PERSISTENCE_BATCH_MAX_SIZE if settings else 32
+add_batcher = MicroBatcher("add", _add_batch, write_executor, _max_batch, _window_s)
+query_batcher = MicroBatcher("query", _query_batch, query_executor, _max_batch, _window_s)
+embed_batcher = MicroBatcher("embed", _embed_batch, query_executor, _max_batch, _window_s)
+
+
+def _require_collection() -> None:
+    if not persistence_service or not persistence_service.collection:
+        error = persistence_service.initialization_error if persistence_service else "no inicializado"
+        raise HTTPException(status_code=503, detail=f"Colección ChromaDB no disponible: {error}")
+
+
+# --- App ---
+app = FastAPI(title="Servidor de Persistencia (ChromaDB)", version="0.4.0",
+              description="Dueño único de la colección vectorial para varios workers de la API.")
+
+@app.on_event("startup")
+async def startup_event():
+    global persistence_service
+    # La carga de ChromaDB + modelo de embeddings ocurre una sola vez y antes de aceptar conexiones
+    persistence_service = await asyncio.get_running_loop().run_in_executor(write_executor, PersistenceService)
+    logger.info(f"Servidor de persistencia listo (colección: {persistence_service.collection_name}, "
+                f"ok: {persistence_service.collection is not None}).")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    write_executor.shutdown(wait=True) # Terminar las escrituras en curso antes de salir
+    query_executor.shutdown(wait=False, cancel_futures=True)
+    metrics.mark_process_dead()
+
+@app.get("/health")
+async def health_endpoint():
+    ready = bool(persistence_service and persistence_service.collection)
+    return {
+        "ready": ready,
+        "collection": persistence_service.collection_name if persistence_service else None,
+        "error": None if ready else (persistence_service.initialization_error if persistence_service else "inicializando"),
+    }
+
+@app.post("/documents")
+async def add_documents_endpoint(request: AddDocumentsRequest):
+    """Inserta documentos; cada uno entra en el lote en curso. `ids[i]` es None si su inserción falló."""
+    _require_collection()
+    ids = await asyncio.gather(*(add_batcher.submit(doc.model_dump()) for doc in request.documents))
+    return {"ids": ids}
+
+@app.post("/query")
+async def query_endpoint(request: QueryRequest):
+    """Una lista de resultados por cada texto de `query_texts` (mismo formato que `query_similar_research`)."""
+    _require_collection()
+    results = await asyncio.gather(*(query_batcher.submit((text, request.n_results, request.where_filter)) for text in request.query_texts))
+    return {"results": results}
+
+@app.post("/embed")
+async def embed_endpoint(request: EmbedRequest):
+    """Embeddings de `texts` con la función de la colección (caché semántica de los workers)."""
+    _require_collection()
+    try: embeddings = await asyncio.gather(*(embed_batcher.submit(text) for text in request.texts))
+    except RuntimeError as e: raise HTTPException(status_code=503, detail=str(e))
+    return {"embeddings": embeddings}
+
+@app.get("/stats")
+async def stats_endpoint():
+    return {
+        "uptime_s": round(time.time() - _started_at, 1),
+        "collection_count": await asyncio.get_running_loop().run_in_executor(query_executor, persistence_service.collection.count)
+        if persistence_service and persistence_service.collection else None,
+        "add_batches": add_batcher.get_stats(),
+        "query_batches": query_batcher.get_stats(),
+        "embed_batches": embed_batcher.get_stats(),
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    if not metrics.METRICS_ENABLED: raise HTTPException(status_code=503, detail="prometheus_client no instalado.")
+    payload, content_type = metrics.render_latest()
+    return Response(content=payload, media_type=content_type)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    if not logging.getLogger().hasHandlers(): logging.basicConfig(level=logging.INFO)
+    server_url = urlparse(settings.PERSISTENCE_SERVER_URL if settings else "http://127.0.0.1:8100")
+    uvicorn.run(app, host=server_url.hostname or "127.0.0.1", port=server_url.port or 8100, workers=1)
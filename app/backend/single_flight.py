@@ -0,0 +1,118 @@
+# app/backend/single_flight.py
+# Coalescencia de peticiones idénticas en curso: una sola ejecución del crew, N receptores del resultado.
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core import metrics
+from app.core.cancellation import CANCEL_REASON_CLIENT_DISCONNECTED, CancellationToken, OperationCancelled
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class SingleFlight:
+    """
+    Mientras una ejecución para `key` está en curso, las peticiones con la misma clave se adjuntan
+    a ella en lugar de lanzar otra. La ejecución corre como tarea asyncio independiente (protegida con
+    `shield`), de modo que si el primer cliente se desconecta los demás siguen recibiendo el resultado.
+    Solo cuando TODOS los receptores se desconectan (o vence el plazo) se cancela el token de la ejecución.
+    Estado por proceso/event loop: con varios workers de uvicorn cada uno coalesce lo suyo.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Task"] = {}
+        self._waiters: Dict[str, int] = {}
+        self._tokens: Dict[str, Optional[CancellationToken]] = {} # Token de cancelación de cada ejecución en curso
+        self._inflight_jobs: Dict[str, str] = {} # clave -> job_id (API de jobs asíncronos)
+        self.executions: Dict[str, int] = defaultdict(int) # Ejecuciones reales por endpoint
+        self.hits: Dict[str, int] = defaultdict(int)       # Peticiones adjuntadas a una ejecución en curso
+        self.abandoned: Dict[str, int] = defaultdict(int)  # Receptores que dejaron de esperar (desconexión/plazo)
+        self.max_waiters_per_execution = 0
+
+    @staticmethod
+    def _endpoint_of(key: str) -> str:
+        return key.split(":", 1)[0]
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]], cancel_token: Optional[CancellationToken] = None,
+                 is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None, poll_seconds: float = 1.0) -> Tuple[Any, bool]:
+        """
+        Ejecuta `factory()` o se adjunta a la ejecución en curso. Devuelve (resultado, compartido).
+        `cancel_token` solo cuenta para quien lanza la ejecución (los adjuntos comparten el suyo, plazo incluido).
+        Con `is_disconnected` se sondea la conexión cada `poll_seconds`: el receptor que abandona (o cuyo plazo vence)
+        recibe OperationCancelled al instante y el crew se detiene en su siguiente paso.
+        """
+        endpoint = self._endpoint_of(key)
+        task = self._inflight.get(key)
+        if task is not None and self._tokens.get(key) is not None and self._tokens[key].cancelled:
+            task = None # Ejecución cancelada que aún está deteniéndose: no adjuntarse, lanzar una nueva
+        shared = task is not None
+        if shared:
+            self.hits[endpoint] += 1
+            self._waiters[key] += 1
+            self.max_waiters_per_execution = max(self.max_waiters_per_execution, self._waiters[key])
+            logger.info(f"SingleFlight: petición adjuntada a ejecución en curso ({endpoint}, esperando: {self._waiters[key]}).")
+        else:
+            self.executions[endpoint] += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self._waiters[key] = 1
+            self._tokens[key] = cancel_token
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        token = self._tokens.get(key)
+        if is_disconnected is None and (token is None or token.deadline is None):
+            result = await asyncio.shield(task)
+        else:
+            result = await self._await_result(key, endpoint, task, token, is_disconnected, poll_seconds)
+        # Copia para los adjuntos: cada respuesta puede etiquetarse por separado sin afectar a las demás
+        return (result.model_copy() if shared and hasattr(result, "model_copy") else result), shared
+
+    async def _await_result(self, key: str, endpoint: str, task: "asyncio.Task", token: Optional[CancellationToken],
+                            is_disconnected: Optional[Callable[[], Awaitable[bool]]], poll_seconds: float) -> Any:
+        while True:
+            timeout = poll_seconds if is_disconnected else None
+            remaining = token.remaining() if token else None
+            if remaining is not None: timeout = remaining if timeout is None else min(timeout, remaining)
+            done, _ = await asyncio.wait({task}, timeout=timeout) # Sin cancelar la tarea al vencer
+            if done: return task.result()
+            if token and token.cancelled: reason = token.reason # Plazo vencido
+            elif is_disconnected and await is_disconnected(): reason = CANCEL_REASON_CLIENT_DISCONNECTED
+            else: continue
+            self.abandoned[endpoint] += 1
+            metrics.REQUESTS_ABANDONED_TOTAL.labels(endpoint=endpoint, reason=reason).inc()
+            if key in self._waiters: self._waiters[key] -= 1
+            if token and self._waiters.get(key, 0) <= 0: token.cancel(reason) # Nadie más espera: liberar el worker
+            logger.info(f"SingleFlight: receptor abandonó la ejecución ({endpoint}, {reason}, quedan: {self._waiters.get(key, 0)}).")
+            raise OperationCancelled(reason)
+
+    def submit_job(self, key: str, submit: Callable[[], str], is_active: Callable[[str], bool]) -> Tuple[str, bool]:
+        """Variante para la API de jobs: devuelve el job_id en curso para `key` o encola uno nuevo con `submit()`."""
+        endpoint = self._endpoint_of(key)
+        job_id = self._inflight_jobs.get(key)
+        if job_id and is_active(job_id):
+            self.hits[endpoint] += 1
+            logger.info(f"SingleFlight: job adjuntado a '{job_id}' en curso ({endpoint}).")
+            return job_id, True
+        if len(self._inflight_jobs) > 1000: # Purga perezosa de jobs ya terminados
+            self._inflight_jobs = {k: j for k, j in self._inflight_jobs.items() if is_active(j)}
+        job_id = submit()
+        self._inflight_jobs[key] = job_id
+        self.executions[endpoint] += 1
+        return job_id, False
+
+    def _forget(self, key: str, task: "asyncio.Task") -> None:
+        if self._inflight.get(key) is task: # Puede haber sido sustituida por una ejecución nueva tras cancelarse
+            self._inflight.pop(key, None)
+            self._waiters.pop(key, None)
+            self._tokens.pop(key, None)
+        if not task.cancelled(): task.exception() # Marca como recuperada la excepción si todos los receptores abandonaron
+
+    def get_stats(self) -> Dict[str, Any]:
+        endpoints = sorted(set(self.executions) | set(self.hits) | set(self.abandoned))
+        return {
+            "in_flight": len(self._inflight),
+            "waiters_in_flight": sum(self._waiters.values()),
+            "max_waiters_per_execution": self.max_waiters_per_execution,
+            "by_endpoint": {ep: {"executions": self.executions[ep], "hits": self.hits[ep], "abandoned": self.abandoned[ep]} for ep in endpoints},
+        }
@@ -0,0 +1,88 @@
+# app/backend/sse.py
+# Utilidades Server-Sent Events: puente hilo-worker -> event loop y generador del stream.
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.core import metrics
+from app.core.cancellation import CANCEL_REASON_CLIENT_DISCONNECTED, CANCEL_STATUS_CODES, CancellationToken
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SSE_HEARTBEAT_SECONDS = 15.0 # Comentario keep-alive para proxies mientras el crew trabaja
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Serializa un evento SSE (`event:` + `data:` JSON en una línea)."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class ProgressEventBridge:
+    """
+    Recibe eventos de progreso desde el hilo del worker (callback del crew) y los publica
+    en una asyncio.Queue del event loop del request. Añade 'elapsed_s' desde el inicio del request.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self.started_at = time.perf_counter()
+
+    def emit(self, event: str, data: Dict[str, Any]) -> None:
+        payload = {**data, "elapsed_s": round(time.perf_counter() - self.started_at, 3)}
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (event, payload))
+
+
+async def sse_event_stream(bridge: ProgressEventBridge, result_future: "asyncio.Future",
+                           cancel_token: Optional[CancellationToken] = None) -> AsyncIterator[str]:
+    """
+    Emite los eventos de progreso a medida que llegan y, al terminar el job, un evento final
+    'result' (respuesta completa del endpoint) o 'error' (status_code + detail).
+    Si el cliente cierra el stream antes del resultado, o vence el plazo de `cancel_token`, se cancela el token
+    (el crew se detiene en su siguiente paso y libera el worker).
+    """
+    try:
+        yield format_sse("accepted", {"elapsed_s": 0.0})
+        while True:
+            getter = asyncio.ensure_future(bridge.queue.get())
+            remaining = cancel_token.remaining() if cancel_token else None
+            timeout = SSE_HEARTBEAT_SECONDS if remaining is None else min(SSE_HEARTBEAT_SECONDS, remaining)
+            done, _ = await asyncio.wait({getter, result_future}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield format_sse(*getter.result())
+                continue
+            getter.cancel()
+            if not done and cancel_token and cancel_token.cancelled: # Plazo vencido: responder ya, sin esperar al crew
+                metrics.REQUESTS_ABANDONED_TOTAL.labels(endpoint="stream", reason=cancel_token.reason).inc()
+                yield format_sse("error", {"elapsed_s": round(time.perf_counter() - bridge.started_at, 3),
+                                           "status_code": CANCEL_STATUS_CODES[cancel_token.reason],
+                                           "detail": f"Ejecución cancelada ({cancel_token.reason})."})
+                return
+            if not done:
+                yield ": keep-alive\n\n"
+                continue
+            break # Job terminado: vaciar eventos pendientes y emitir resultado
+    finally:
+        if cancel_token and not result_future.done() and not cancel_token.cancelled: # Stream cerrado por el cliente
+            cancel_token.cancel(CANCEL_REASON_CLIENT_DISCONNECTED)
+            metrics.REQUESTS_ABANDONED_TOTAL.labels(endpoint="stream", reason=CANCEL_REASON_CLIENT_DISCONNECTED).inc()
+            logger.info("SSE: cliente desconectado antes del resultado; ejecución cancelada.")
+
+    while not bridge.queue.empty():
+        yield format_sse(*bridge.queue.get_nowait())
+
+    elapsed = round(time.perf_counter() - bridge.started_at, 3)
+    try:
+        result = result_future.result()
+        payload = result.model_dump() if hasattr(result, "model_dump") else result
+        yield format_sse("result", {"elapsed_s": elapsed, "response": payload})
+    except HTTPException as e_http:
+        yield format_sse("error", {"elapsed_s": elapsed, "status_code": e_http.status_code, "detail": e_http.detail})
+    except Exception as e:
+        logger.error(f"SSE: Error inesperado en job de streaming: {e}", exc_info=True)
+        yield format_sse("error", {"elapsed_s": elapsed, "status_code": 500, "detail": f"{type(e).__name__}: {e}"})
@@ -0,0 +1,80 @@
+# app/core/cancellation.py
+# Cancelación cooperativa de ejecuciones de crew (cliente desconectado, plazo vencido).
+# El backend crea un CancellationToken por ejecución y lo activa en el hilo worker con `cancellation_scope`;
+# el crew (step_callback) y las herramientas llaman a `check_cancelled()` en cada paso.
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+CANCEL_REASON_CLIENT_DISCONNECTED = "client_disconnected"
+CANCEL_REASON_DEADLINE = "deadline"
+# Respuesta HTTP por motivo. 499 = "Client Closed Request" (convención de nginx): nadie la recibe, pero queda en logs/métricas.
+CANCEL_STATUS_CODES = {CANCEL_REASON_CLIENT_DISCONNECTED: 499, CANCEL_REASON_DEADLINE: 504}
+
+
+class OperationCancelled(Exception):
+    """La ejecución se canceló. `reason`: CANCEL_REASON_*."""
+    is_cancellation = True # Las métricas de errores lo ignoran (ver app.core.metrics.timed)
+
+    def __init__(self, reason: str):
+        super().__init__(f"Operación cancelada: {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """Señal thread-safe: la activa el event loop (desconexión) o vence sola (plazo); la consulta el hilo worker."""
+
+    def __init__(self, deadline_seconds: Optional[float] = None):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+        self.created_at = time.monotonic()
+        self.deadline: Optional[float] = self.created_at + deadline_seconds if deadline_seconds else None
+
+    def cancel(self, reason: str) -> None:
+        if self._event.is_set(): return
+        self.reason = reason
+        self._event.set()
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.expired(): self.cancel(CANCEL_REASON_DEADLINE)
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        if self.cancelled: raise OperationCancelled(self.reason)
+
+
+_current_token: contextvars.ContextVar[Optional[CancellationToken]] = contextvars.ContextVar("cancellation_token", default=None)
+
+
+def current_token() -> Optional[CancellationToken]:
+    return _current_token.get()
+
+
+def check_cancelled() -> None:
+    """Punto de control: lanza OperationCancelled si la ejecución actual se canceló. Sin token activo, no hace nada."""
+    token = _current_token.get()
+    if token is not None: token.check()
+
+
+def crew_step_checkpoint(_step_output: Any = None) -> None:
+    """Para `Crew(step_callback=...)`: CrewAI lo llama tras cada paso del agente y propaga la excepción fuera de kickoff()."""
+    check_cancelled()
+
+
+@contextmanager
+def cancellation_scope(token: Optional[CancellationToken]) -> Iterator[Optional[CancellationToken]]:
+    """Activa `token` en el contexto actual (hilo worker). Los hilos que se lancen dentro deben copiar el contexto."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
@@ -0,0 +1,88 @@
+# app/core/chunking.py
+# Conteo de tokens y troceado de textos largos para el LLM. Con tiktoken (opcional) el conteo es exacto;
+# sin él se estima en ~4 caracteres por token. Los cortes respetan párrafos y frases siempre que se pueda.
+import functools
+import importlib.util
+import logging
+import re
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+TIKTOKEN_INSTALLED = importlib.util.find_spec("tiktoken") is not None
+CHARS_PER_TOKEN = 4 # Estimación sin tiktoken (algo conservadora para español)
+_encoding_error_logged = False
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+@functools.lru_cache(maxsize=8)
+def _encoding(model: Optional[str]):
+    if not TIKTOKEN_INSTALLED: return None
+    global _encoding_error_logged
+    try:
+        import tiktoken # En el primer uso: carga (o descarga) las tablas BPE
+        try: return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except KeyError: return tiktoken.get_encoding("cl100k_base") # Modelo desconocido para esta versión de tiktoken
+    except Exception as e: # Sin red o egress bloqueado: se cachea None y se estima por caracteres (sin reintentar la descarga)
+        if not _encoding_error_logged:
+            _encoding_error_logged = True
+            logger.warning(f"tiktoken no pudo cargar sus tablas BPE ({type(e).__name__}: {e}); conteo estimado en ~{CHARS_PER_TOKEN} caracteres por token.")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    encoding = _encoding(model)
+    if encoding is not None: return len(encoding.encode(text or "", disallowed_special=()))
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _hard_split(text: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    """Último recurso para un bloque sin cortes naturales: por tokens (tiktoken) o por caracteres."""
+    encoding = _encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+    step = max_tokens * CHARS_PER_TOKEN
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+def _pieces(text: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    """Párrafos; los que no caben, por frases; las frases que no caben, por tokens."""
+    pieces: List[str] = []
+    for paragraph in (p.strip() for p in _PARAGRAPH_RE.split(text)):
+        if not paragraph: continue
+        if count_tokens(paragraph, model) <= max_tokens: pieces.append(paragraph); continue
+        for sentence in (s.strip() for s in _SENTENCE_RE.split(paragraph)):
+            if not sentence: continue
+            pieces.extend([sentence] if count_tokens(sentence, model) <= max_tokens else _hard_split(sentence, max_tokens, model))
+    return pieces
+
+
+def split_into_chunks(text: str, max_tokens: int, overlap_tokens: int = 0, model: Optional[str] = None) -> List[str]:
+    """
+    Trocea `text` en fragmentos de como mucho ~`max_tokens` agrupando párrafos/frases enteros.
+    Cada fragmento repite al principio las últimas piezas del anterior (hasta `overlap_tokens`) para no perder contexto en el corte.
+    """
+    max_tokens = max(1, int(max_tokens))
+    overlap_tokens = max(0, min(int(overlap_tokens), max_tokens // 2))
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for piece in _pieces(text, max_tokens, model):
+        piece_tokens = count_tokens(piece, model)
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            overlap: List[str] = []
+            overlap_size = 0
+            for previous in reversed(current): # Solape: piezas completas del final del fragmento anterior
+                size = count_tokens(previous, model)
+                if overlap_size + size > overlap_tokens or overlap_size + size + piece_tokens > max_tokens: break
+                overlap.insert(0, previous); overlap_size += size
+            current, current_tokens = overlap, overlap_size
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current: chunks.append("\n\n".join(current))
+    return chunks
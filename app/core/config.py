@@ -20,7 +20,134 @@ class Settings:
     TAVILY_API_KEY: str | None = os.getenv("TAVILY_API_KEY") # <-- Añadido
 
     REPORTS_DIR: str = "reports"
-    CHROMA_DB_PATH: str = "chroma_db_store"
+    CHROMA_DB_PATH: str = os.getenv("CHROMA_DB_PATH", "chroma_db_store")
+
+    # Endpoints alternativos de servicios externos (stubs locales para benchmarks; ver benchmarks/stub_externals.py)
+    # OPENAI_BASE_URL lo leen directamente del entorno los clientes de openai y langchain-openai.
+    OPENAI_BASE_URL: str | None = os.getenv("OPENAI_BASE_URL")
+    TAVILY_API_URL: str | None = os.getenv("TAVILY_API_URL")
+    GDRIVE_API_ENDPOINT: str | None = os.getenv("GDRIVE_API_ENDPOINT") # Con él, Drive se usa sin credenciales reales
+
+    # Arranque: los componentes pesados (crews, Drive, ChromaDB) se inicializan perezosamente en el primer uso.
+    # Con WARMUP_ON_STARTUP=true se calientan en segundo plano nada más arrancar (sin retrasar /health/live).
+    WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+    # Monitor de retraso del event loop (GET /stats -> event_loop, métrica event_loop_lag_seconds); 0 = desactivado
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = float(os.getenv("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+    # Pool de workers para ejecutar los crews fuera del event loop (y API de jobs asíncronos)
+    CREW_WORKER_POOL_SIZE: int = int(os.getenv("CREW_WORKER_POOL_SIZE", "4"))
+    JOB_RESULT_RETENTION: int = int(os.getenv("JOB_RESULT_RETENTION", "500")) # Nº máx. de jobs terminados en memoria
+
+    # Control de admisión de ejecuciones de crew: tope global y por cliente, cola de espera acotada (429/503 + Retry-After)
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+    ADMISSION_MAX_CONCURRENT: int = int(os.getenv("ADMISSION_MAX_CONCURRENT", str(CREW_WORKER_POOL_SIZE)))
+    ADMISSION_MAX_PER_CLIENT: int = int(os.getenv("ADMISSION_MAX_PER_CLIENT", "2")) # Activas + en cola por cliente
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+    ADMISSION_MAX_QUEUE_WAIT_SECONDS: float = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_SECONDS", "30"))
+    ADMISSION_CLIENT_HEADER: str = os.getenv("ADMISSION_CLIENT_HEADER", "X-Client-ID") # Si falta: IP del cliente
+
+    # Cancelación cooperativa: plazo por defecto si la petición no trae 'deadline_seconds' (0 = sin plazo)
+    # y cada cuánto se comprueba si el cliente de una petición síncrona se desconectó.
+    REQUEST_DEFAULT_DEADLINE_SECONDS: float = float(os.getenv("REQUEST_DEFAULT_DEADLINE_SECONDS", "0"))
+    DISCONNECT_POLL_SECONDS: float = float(os.getenv("DISCONNECT_POLL_SECONDS", "1.0"))
+
+    # Lotes de investigación (/research/conduct-batch) y presupuesto compartido de búsquedas Tavily
+    RESEARCH_BATCH_MAX_ITEMS: int = int(os.getenv("RESEARCH_BATCH_MAX_ITEMS", "200"))
+    RESEARCH_BATCH_MAX_CONCURRENCY: int = int(os.getenv("RESEARCH_BATCH_MAX_CONCURRENCY", "4"))
+    TAVILY_CALLS_PER_MINUTE: int = int(os.getenv("TAVILY_CALLS_PER_MINUTE", "60"))
+    RESEARCH_EST_TAVILY_CALLS: int = int(os.getenv("RESEARCH_EST_TAVILY_CALLS", "2")) # Estimación por tema investigado
+
+    # Cliente LLM compartido por las herramientas (app/core/llm_client.py): pool keep-alive, timeouts y modelo por defecto
+    LLM_DEFAULT_MODEL: str = os.getenv("LLM_DEFAULT_MODEL", "gpt-3.5-turbo-0125")
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "120")) # Lectura/escritura por llamada
+    LLM_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "16"))
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "60"))
+    # Planificador de llamadas (app/core/llm_scheduler.py): presupuestos por minuto antes de enviar y reintentos con
+    # backoff exponencial + jitter (respeta Retry-After) ante 429, timeouts, errores de conexión y 5xx.
+    # Un único presupuesto para todas las llamadas (herramientas y pasos de razonamiento de los agentes, también en lotes).
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "300"))
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "150000")) # Prompt estimado + max_tokens por llamada
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "5"))
+    LLM_BACKOFF_BASE_SECONDS: float = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+    LLM_BACKOFF_MAX_SECONDS: float = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+    LLM_THROTTLE_MAX_WAIT_SECONDS: float = float(os.getenv("LLM_THROTTLE_MAX_WAIT_SECONDS", "120")) # Espera máx. por presupuesto
+
+    # Caché de completions del LLM (opt-in por operación): clave = huella de modelo + mensajes + parámetros de muestreo.
+    # LLM_CACHE_OPERATIONS: operaciones con caché, separadas por comas (p. ej. "content_analysis,suggest_image_prompt"),
+    # "*" para todas; vacío = desactivada.
+    LLM_CACHE_OPERATIONS: str = os.getenv("LLM_CACHE_OPERATIONS", "")
+    LLM_CACHE_DB_PATH: str = os.getenv("LLM_CACHE_DB_PATH", "cache_store/llm_cache.sqlite3")
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", "604800")) # 7 días
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")) # Desalojo LRU por encima
+
+    # Enrutado de modelos (app/core/model_router.py). LLM_MODEL_TIERS: nivel=modelo, de más rápido/barato a mejor
+    # (p. ej. "fast=gpt-4o-mini,standard=gpt-3.5-turbo-0125,quality=gpt-4o"); vacío = cada llamada usa su modelo de siempre.
+    # LLM_MODEL_ROUTES: operación o agente -> nivel. LLM_ROUTING_POLICY: 'static' o 'adaptive' (baja de nivel según el
+    # p95 observado frente al plazo de la petición y el coste estimado frente a su max_cost_usd).
+    LLM_MODEL_TIERS: str = os.getenv("LLM_MODEL_TIERS", "")
+    LLM_MODEL_ROUTES: str = os.getenv("LLM_MODEL_ROUTES", (
+        "content_analysis=quality,content_analysis_map=fast,research_agent=quality,researcher=standard,editor=quality,"
+        "generate_marketing_ideas=standard,write_social_post=standard,suggest_image_prompt=fast,marketing_agent=standard"))
+    LLM_ROUTING_POLICY: str = os.getenv("LLM_ROUTING_POLICY", "static").lower()
+    LLM_MODEL_PRICES: str = os.getenv("LLM_MODEL_PRICES", "") # "modelo=entrada:salida" en USD por millón de tokens (añade/sobrescribe)
+    LLM_ROUTING_LATENCY_WINDOW: int = int(os.getenv("LLM_ROUTING_LATENCY_WINDOW", "200")) # Últimas llamadas por modelo para el p95
+    LLM_ROUTING_MIN_SAMPLES: int = int(os.getenv("LLM_ROUTING_MIN_SAMPLES", "20")) # Menos muestras: el p95 no se usa
+    REQUEST_DEFAULT_MAX_COST_USD: float = float(os.getenv("REQUEST_DEFAULT_MAX_COST_USD", "0")) # 0 = sin presupuesto de coste
+
+    # Análisis de contenido largo (ContentAnalysisTool): hasta CONTENT_ANALYSIS_SINGLE_PASS_TOKENS va en un solo prompt;
+    # por encima se trocea (map en paralelo, bajo el planificador LLM) y los resúmenes se reducen al informe final.
+    CONTENT_ANALYSIS_SINGLE_PASS_TOKENS: int = int(os.getenv("CONTENT_ANALYSIS_SINGLE_PASS_TOKENS", "6000"))
+    CONTENT_ANALYSIS_CHUNK_TOKENS: int = int(os.getenv("CONTENT_ANALYSIS_CHUNK_TOKENS", "3000"))
+    CONTENT_ANALYSIS_CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CONTENT_ANALYSIS_CHUNK_OVERLAP_TOKENS", "150"))
+    CONTENT_ANALYSIS_MAP_MAX_TOKENS: int = int(os.getenv("CONTENT_ANALYSIS_MAP_MAX_TOKENS", "600")) # Respuesta por fragmento
+    CONTENT_ANALYSIS_MAP_CONCURRENCY: int = int(os.getenv("CONTENT_ANALYSIS_MAP_CONCURRENCY", "8"))
+    # Contenido adicional del crew de investigación: completo en la tarea hasta este tamaño; si no, su análisis map-reduce
+    RESEARCH_INLINE_CONTENT_TOKENS: int = int(os.getenv("RESEARCH_INLINE_CONTENT_TOKENS", "1500"))
+
+    # Marketing multi-plataforma (fan-out en una sola petición)
+    MARKETING_MAX_PLATFORMS: int = int(os.getenv("MARKETING_MAX_PLATFORMS", "5"))
+    # Modo por defecto de /marketing: 'crew' (agente CrewAI) o 'fast' (las tres herramientas en orden fijo, sin turnos del agente)
+    MARKETING_DEFAULT_MODE: str = os.getenv("MARKETING_DEFAULT_MODE", "crew").strip().lower()
+
+    # Memoria vectorial: 'local' (ChromaDB + modelo de embeddings en cada proceso) o 'remote' (un único proceso
+    # `python -m app.backend.persistence_server` es dueño de la colección; los workers de la API le hablan por HTTP)
+    PERSISTENCE_MODE: str = os.getenv("PERSISTENCE_MODE", "local").lower()
+    PERSISTENCE_SERVER_URL: str = os.getenv("PERSISTENCE_SERVER_URL", "http://127.0.0.1:8100")
+    PERSISTENCE_SERVER_TIMEOUT_SECONDS: float = float(os.getenv("PERSISTENCE_SERVER_TIMEOUT_SECONDS", "30"))
+    PERSISTENCE_BATCH_MAX_SIZE: int = int(os.getenv("PERSISTENCE_BATCH_MAX_SIZE", "32")) # Documentos/consultas por llamada a ChromaDB
+    PERSISTENCE_BATCH_WINDOW_MS: int = int(os.getenv("PERSISTENCE_BATCH_WINDOW_MS", "20")) # Espera máx. para completar un lote
+
+    # Memoria relevante (ChromaDB) consultada en paralelo con el crew de investigación
+    RESEARCH_MEMORY_RESULTS: int = int(os.getenv("RESEARCH_MEMORY_RESULTS", "3"))
+    RESEARCH_MEMORY_LOOKUP_TIMEOUT_SECONDS: int = int(os.getenv("RESEARCH_MEMORY_LOOKUP_TIMEOUT_SECONDS", "30"))
+
+    # Escritura diferida (write-behind) de GDrive + ChromaDB: cola durable en SQLite con reintentos
+    WRITE_BEHIND_ENABLED: bool = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() in ("1", "true", "yes")
+    WRITE_BEHIND_DB_PATH: str = os.getenv("WRITE_BEHIND_DB_PATH", "cache_store/write_behind.sqlite3")
+    WRITE_BEHIND_WORKERS: int = int(os.getenv("WRITE_BEHIND_WORKERS", "2"))
+    WRITE_BEHIND_MAX_ATTEMPTS: int = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+    WRITE_BEHIND_BACKOFF_SECONDS: float = float(os.getenv("WRITE_BEHIND_BACKOFF_SECONDS", "2")) # Base del backoff exponencial
+
+    # Caché persistente de resultados finales (informes y contenido de marketing) en SQLite
+    RESULT_CACHE_ENABLED: bool = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    RESULT_CACHE_DB_PATH: str = os.getenv("RESULT_CACHE_DB_PATH", "cache_store/result_cache.sqlite3")
+    RESULT_CACHE_TTL_SECONDS: int = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400")) # 24 h
+    RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000")) # Desalojo LRU por encima
+
+    # Caché semántica de marketing: sirve un resultado guardado si tema + plataforma(s) + contexto se parecen lo suficiente
+    # (similitud coseno de los embeddings de PersistenceService). Solo compara peticiones con las mismas plataformas.
+    MARKETING_SEMANTIC_CACHE_ENABLED: bool = os.getenv("MARKETING_SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    MARKETING_SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("MARKETING_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    MARKETING_SEMANTIC_CACHE_DB_PATH: str = os.getenv("MARKETING_SEMANTIC_CACHE_DB_PATH", "cache_store/marketing_semantic_cache.sqlite3")
+    MARKETING_SEMANTIC_CACHE_TTL_SECONDS: int = int(os.getenv("MARKETING_SEMANTIC_CACHE_TTL_SECONDS", "86400")) # 24 h
+    MARKETING_SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("MARKETING_SEMANTIC_CACHE_MAX_ENTRIES", "500"))
+
+    # Ledger de uso: tokens y coste estimado (precios de LLM_MODEL_PRICES) por petición y etapa, agregado por día (GET /usage/daily)
+    USAGE_LEDGER_ENABLED: bool = os.getenv("USAGE_LEDGER_ENABLED", "true").lower() in ("1", "true", "yes")
+    USAGE_LEDGER_DB_PATH: str = os.getenv("USAGE_LEDGER_DB_PATH", "cache_store/usage_ledger.sqlite3")
+    USAGE_LEDGER_RETENTION_DAYS: int = int(os.getenv("USAGE_LEDGER_RETENTION_DAYS", "90"))
 
     # Validaciones/Advertencias al inicio
     if not OPENAI_API_KEY: print("WARN config.py: OPENAI_API_KEY no configurada en .env.")
@@ -37,6 +164,8 @@ print(f"  - OpenAI Key: {'Sí' if settings.OPENAI_API_KEY else 'No'}")
 print(f"  - GDrive Creds Path: {settings.GOOGLE_APPLICATION_CREDENTIALS or 'No definida'}")
 print(f"  - GDrive Folder ID: {settings.GOOGLE_DRIVE_FOLDER_ID or 'No definido'}")
 print(f"  - Tavily API Key: {'Sí' if settings.TAVILY_API_KEY else 'No'}") # <-- Añadido
+for _name in ("OPENAI_BASE_URL", "TAVILY_API_URL", "GDRIVE_API_ENDPOINT"):
+    if getattr(settings, _name): print(f"  - {_name} (endpoint alternativo): {getattr(settings, _name)}")
 
 # --- Crear directorios si no existen ---
 reports_full_path = os.path.join(project_root_from_config, settings.REPORTS_DIR)
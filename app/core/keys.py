@@ -0,0 +1,25 @@
+# app/core/keys.py
+# Claves deterministas para identificar peticiones equivalentes (single-flight, cachés).
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Any
+
+
+def normalize_topic(topic: str) -> str:
+    """Normaliza un tema: Unicode NFKC, minúsculas, espacios colapsados y sin puntuación final."""
+    s = unicodedata.normalize("NFKC", topic or "").casefold()
+    s = re.sub(r"\s+", " ", s).strip()
+    return s.rstrip(" .!?¿¡;:")
+
+
+def content_hash(*parts: Any) -> str:
+    """SHA-256 estable de las partes (None, strings, listas...) serializadas como JSON."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def request_key(endpoint: str, topic: str, *parts: Any) -> str:
+    """Clave '<endpoint>:<hash>' a partir del tema normalizado y el resto de parámetros relevantes."""
+    return f"{endpoint}:{content_hash(normalize_topic(topic), *parts)}"
@@ -0,0 +1,94 @@
+# app/core/lazy.py
+# Inicialización perezosa y thread-safe de componentes pesados (crews/CrewAI, Drive, ChromaDB...).
+import datetime
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+T = TypeVar("T")
+
+STATE_NOT_INITIALIZED = "not_initialized"
+STATE_INITIALIZING = "initializing"
+STATE_READY = "ready"
+STATE_UNAVAILABLE = "unavailable" # La fábrica terminó pero el componente no es utilizable (None, sin credenciales...)
+STATE_FAILED = "failed"           # La fábrica lanzó una excepción
+
+
+class LazyComponent(Generic[T]):
+    """
+    Construye el componente con `factory()` la primera vez que alguien lo pide (`get`), una sola vez aunque
+    lo pidan varios hilos a la vez (double-checked locking). Registra estado, duración y error de la inicialización.
+    - `is_usable(valor)` decide entre 'ready' y 'unavailable' (p.ej. GDriveService sin `.service`).
+    - `get()` nunca lanza: devuelve None si la fábrica falló, como hacían los imports opcionales del backend.
+    - `critical`: su fallo hace que /health/ready responda 503.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Optional[T]],
+                 is_usable: Optional[Callable[[T], bool]] = None, critical: bool = False):
+        self.name = name
+        self.factory = factory
+        self.is_usable = is_usable or (lambda value: value is not None)
+        self.critical = critical
+        self._lock = threading.Lock()
+        self._value: Optional[T] = None
+        self._state = STATE_NOT_INITIALIZED
+        self._error: Optional[str] = None
+        self._init_duration_s: Optional[float] = None
+        self._initialized_at: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def initialized(self) -> bool:
+        return self._state in (STATE_READY, STATE_UNAVAILABLE, STATE_FAILED)
+
+    def get(self) -> Optional[T]:
+        if self.initialized: return self._value # Camino rápido sin lock
+        with self._lock:
+            if self.initialized: return self._value
+            self._state = STATE_INITIALIZING
+            started = time.perf_counter()
+            try:
+                value = self.factory()
+                usable = bool(self.is_usable(value))
+                self._value, self._error = value, None
+                if not usable:
+                    self._error = getattr(value, "initialization_error", None) or "Componente no disponible tras inicializar."
+                self._state = STATE_READY if usable else STATE_UNAVAILABLE
+            except Exception as e:
+                self._value, self._state, self._error = None, STATE_FAILED, f"{type(e).__name__}: {e}"
+                logger.error(f"LazyComponent '{self.name}': inicialización fallida: {self._error}", exc_info=True)
+            self._init_duration_s = round(time.perf_counter() - started, 3)
+            self._initialized_at = datetime.datetime.utcnow().isoformat()
+            logger.info(f"LazyComponent '{self.name}': {self._state} en {self._init_duration_s}s.")
+            return self._value
+
+    def peek(self) -> Optional[T]:
+        """El valor si ya está inicializado; nunca dispara la inicialización."""
+        return self._value if self.initialized else None
+
+    def unusable(self) -> bool:
+        """True solo si ya se intentó inicializar y no quedó utilizable (antes de inicializar se asume disponible)."""
+        return self._state in (STATE_UNAVAILABLE, STATE_FAILED)
+
+    def reset(self) -> None:
+        """Permite reintentar la inicialización (p.ej. tras corregir credenciales) en el próximo `get`."""
+        with self._lock:
+            if self._state == STATE_INITIALIZING: return
+            self._value, self._state, self._error = None, STATE_NOT_INITIALIZED, None
+            self._init_duration_s = self._initialized_at = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self._state,
+            "critical": self.critical,
+            "init_duration_s": self._init_duration_s,
+            "initialized_at": self._initialized_at,
+            "error": self._error,
+        }
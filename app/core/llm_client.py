@@ -0,0 +1,370 @@
+# app/core/llm_client.py
+# Cliente LLM compartido (chat completions de OpenAI) para todas las herramientas: un pool de conexiones keep-alive
+# por proceso, timeouts configurables, modelo/temperatura por llamada y latencia + tokens registrados en un solo sitio.
+# El SDK de openai (~0.8 s) y httpx se importan en la primera llamada, no al importar el backend.
+# Caché opcional de completions en SQLite (LLM_CACHE_OPERATIONS): mismas peticiones -> misma respuesta sin llamar a la API.
+# Cada llamada pasa por el planificador (presupuestos RPM/TPM + reintentos con backoff); el SDK no reintenta por su cuenta.
+# Con `stream=True` y un sink de tokens activo (app.core.token_stream) la respuesta se pide en streaming y cada
+# fragmento se reenvía al cliente según llega; la llamada sigue devolviendo el texto completo.
+# Sin modelo explícito, el de cada operación lo elige el enrutador de modelos (app.core.model_router).
+# Tokens y coste de cada llamada (y los aciertos de caché) se suman a la petición en curso (app.core.usage).
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from app.core import metrics
+from app.core.cancellation import OperationCancelled, check_cancelled
+from app.core.chunking import count_tokens
+from app.core.keys import content_hash
+from app.core.llm_scheduler import LLMScheduler, estimate_prompt_tokens, estimate_tokens
+from app.core.model_router import ModelRouter, model_router
+from app.core.token_stream import TokenStreamWriter, open_token_stream
+from app.core.usage import record_llm_usage
+
+try: from app.core.config import settings
+except ImportError: settings = None
+
+OPENAI_SDK_INSTALLED = importlib.util.find_spec("openai") is not None # Sin el SDK las herramientas devuelven su error de configuración
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class LLMClient:
+    """
+    Envoltorio de openai.OpenAI (hilos) y openai.AsyncOpenAI (event loop) sobre clientes httpx con pool afinado.
+    Los clientes se crean en el primer uso (importar el módulo no abre conexiones) y se comparten entre hilos.
+    `complete`/`acomplete` devuelven el texto de la respuesta ("" si viene vacía). Los errores transitorios (429,
+    timeouts, conexión, 5xx) se reintentan según `scheduler`; los demás, y los transitorios sin más intentos,
+    se propagan (AuthenticationError, RateLimitError...) para que cada herramienta decida qué devolver.
+    Caché de completions: solo para las operaciones de `cache_operations` ("*" = todas) o con `cache=True` en la llamada.
+    La clave es la huella de la petición completa (modelo, mensajes, temperatura, max_tokens y demás parámetros);
+    cada acierto suma a las estadísticas los tokens y la latencia que costó la llamada original.
+    Streaming (`stream=True`): solo si hay un sink de tokens activo; si no, la llamada es la normal. Un acierto de caché
+    se emite como un único fragmento; un reintento tras tokens ya emitidos manda "token_reset" antes de volver a emitir.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, default_model: Optional[str] = None,
+                 timeout_seconds: Optional[float] = None, connect_timeout_seconds: Optional[float] = None,
+                 max_connections: Optional[int] = None, max_keepalive_connections: Optional[int] = None,
+                 keepalive_expiry_seconds: Optional[float] = None, max_retries: Optional[int] = None,
+                 scheduler: Optional[LLMScheduler] = None, router: Optional[ModelRouter] = None, cache_operations: Optional[str] = None, cache_db_path: Optional[str] = None,
+                 cache_ttl_seconds: Optional[float] = None, cache_max_entries: Optional[int] = None):
+        self.api_key = api_key or (settings.OPENAI_API_KEY if settings else None)
+        self.base_url = base_url or (settings.OPENAI_BASE_URL if settings else None) # None: el SDK usa su valor por defecto
+        self.default_model = default_model or (settings.LLM_DEFAULT_MODEL if settings else "gpt-3.5-turbo-0125")
+        self.timeout_seconds = timeout_seconds or (settings.LLM_TIMEOUT_SECONDS if settings else 120.0)
+        self.connect_timeout_seconds = connect_timeout_seconds or (settings.LLM_CONNECT_TIMEOUT_SECONDS if settings else 10.0)
+        self.max_connections = max_connections or (settings.LLM_MAX_CONNECTIONS if settings else 32)
+        self.max_keepalive_connections = max_keepalive_connections or (settings.LLM_MAX_KEEPALIVE_CONNECTIONS if settings else 16)
+        self.keepalive_expiry_seconds = keepalive_expiry_seconds or (settings.LLM_KEEPALIVE_EXPIRY_SECONDS if settings else 60.0)
+        self.max_retries = max_retries if max_retries is not None else (settings.LLM_MAX_RETRIES if settings else 5)
+        self.scheduler = scheduler or LLMScheduler(
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE if settings else 300,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE if settings else 150000,
+            max_retries=self.max_retries,
+            backoff_base_seconds=settings.LLM_BACKOFF_BASE_SECONDS if settings else 1.0,
+            backoff_max_seconds=settings.LLM_BACKOFF_MAX_SECONDS if settings else 30.0,
+            max_wait_seconds=settings.LLM_THROTTLE_MAX_WAIT_SECONDS if settings else 120.0,
+        )
+        self.router = router or model_router
+        operations = cache_operations if cache_operations is not None else (settings.LLM_CACHE_OPERATIONS if settings else "")
+        self.cache_operations = frozenset(op.strip() for op in operations.split(",") if op.strip())
+        self.cache_db_path = os.path.join(PROJECT_ROOT, cache_db_path or (settings.LLM_CACHE_DB_PATH if settings else "cache_store/llm_cache.sqlite3"))
+        self.cache_ttl_seconds = cache_ttl_seconds or (settings.LLM_CACHE_TTL_SECONDS if settings else 604800)
+        self.cache_max_entries = cache_max_entries or (settings.LLM_CACHE_MAX_ENTRIES if settings else 5000)
+        self._sync_client = None
+        self._async_client = None
+        self._cache = None # SQLiteCache, abierta en el primer uso
+        self._cache_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+            "calls": 0, "errors": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cache_hits": 0, "cache_misses": 0, "saved_tokens": 0, "saved_seconds": 0.0})
+        self._stats_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return OPENAI_SDK_INSTALLED and bool(self.api_key)
+
+    # --- Clientes (perezosos, uno por proceso) ---
+    def _httpx_options(self) -> Dict[str, Any]:
+        import httpx
+        return {
+            "timeout": httpx.Timeout(self.timeout_seconds, connect=self.connect_timeout_seconds),
+            "limits": httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive_connections,
+                                   keepalive_expiry=self.keepalive_expiry_seconds),
+        }
+
+    def _get_sync_client(self):
+        if self._sync_client is None:
+            with self._lock:
+                if self._sync_client is None:
+                    import httpx, openai
+                    self._sync_client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0, # Reintenta el scheduler
+                                                      http_client=httpx.Client(**self._httpx_options()))
+        return self._sync_client
+
+    def _get_async_client(self):
+        # Solo se usa desde el event loop (un hilo): no necesita lock
+        if self._async_client is None:
+            import httpx, openai
+            self._async_client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                                    http_client=httpx.AsyncClient(**self._httpx_options()))
+        return self._async_client
+
+    # --- Caché de completions ---
+    def cache_enabled_for(self, operation: str) -> bool:
+        return "*" in self.cache_operations or operation in self.cache_operations
+
+    def _get_cache(self):
+        if self._cache is None and self._cache_error is None:
+            with self._lock:
+                if self._cache is None and self._cache_error is None:
+                    try:
+                        from app.services.cache_service import SQLiteCache
+                        self._cache = SQLiteCache("llm_completions", self.cache_db_path, ttl_seconds=self.cache_ttl_seconds,
+                                                  max_entries=self.cache_max_entries)
+                    except Exception as e:
+                        self._cache_error = f"{type(e).__name__} - {e}"
+                        logger.error(f"No se pudo abrir la caché de completions (se continúa sin caché): {self._cache_error}", exc_info=True)
+        return self._cache
+
+    def _cache_key(self, request: Dict[str, Any], cache: Optional[bool], operation: str) -> Optional[str]:
+        enabled = self.cache_enabled_for(operation) if cache is None else cache
+        return f"llm:{content_hash(request)}" if enabled else None
+
+    def _cache_get(self, operation: str, key: str) -> Optional[str]:
+        """Texto cacheado o None. Un acierto cuenta los tokens y segundos de la llamada original como ahorrados."""
+        cache = self._get_cache()
+        if cache is None: return None
+        try: entry = cache.get(key)
+        except Exception as e:
+            logger.warning(f"Caché de completions: error leyendo '{operation}': {e}")
+            return None
+        with self._stats_lock:
+            stats = self._stats[operation]
+            if entry is None:
+                stats["cache_misses"] += 1
+                return None
+            value = entry["value"]
+            saved_tokens = value.get("prompt_tokens", 0) + value.get("completion_tokens", 0)
+            stats["cache_hits"] += 1; stats["saved_tokens"] += saved_tokens; stats["saved_seconds"] += value.get("seconds", 0.0)
+        if saved_tokens: metrics.LLM_CACHE_SAVED_TOKENS_TOTAL.labels(operation=operation).inc(saved_tokens)
+        metrics.LLM_CACHE_SAVED_SECONDS_TOTAL.labels(operation=operation).inc(value.get("seconds", 0.0))
+        logger.debug(f"LLM '{operation}': acierto de caché ({saved_tokens} tokens ahorrados).")
+        return value["text"]
+
+    def _cache_set(self, operation: str, key: str, text: str, elapsed_s: float, usage: Any) -> None:
+        cache = self._get_cache()
+        if cache is None or not text: return # Las respuestas vacías no se cachean
+        try:
+            cache.set(key, {"text": text, "seconds": round(elapsed_s, 3),
+                            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0})
+        except Exception as e: logger.warning(f"Caché de completions: error guardando '{operation}': {e}")
+
+    # --- Llamadas ---
+    def _build_request(self, messages: List[Dict[str, str]], operation: str, model: Optional[str], temperature: Optional[float],
+                       max_tokens: Optional[int], extra: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.available:
+            raise RuntimeError("Cliente LLM no disponible: " + ("SDK 'openai' no instalado." if not OPENAI_SDK_INSTALLED else "OPENAI_API_KEY no configurada."))
+        check_cancelled() # Petición cancelada: no gastar la llamada
+        model = model or self.router.choose(operation, estimate_prompt_tokens(messages), max_tokens) or self.default_model
+        request = {"model": model, "messages": messages, **extra}
+        if temperature is not None: request["temperature"] = temperature
+        if max_tokens is not None: request["max_tokens"] = max_tokens
+        return request
+
+    def complete(self, messages: List[Dict[str, str]], operation: str = "default", model: Optional[str] = None,
+                 temperature: Optional[float] = None, max_tokens: Optional[int] = None, cache: Optional[bool] = None,
+                 stream: bool = False, stream_label: Optional[str] = None, **extra) -> str:
+        """
+        Chat completion bloqueante (herramientas de los crews, hilos worker). `operation` etiqueta métricas y estadísticas.
+        `cache`: None = según LLM_CACHE_OPERATIONS; True/False fuerza usar o saltar la caché de completions.
+        `stream`: reenviar los tokens al sink activo según llegan (sin sink se ignora); `stream_label` los distingue
+        cuando varias llamadas de la misma operación emiten a la vez (p. ej. la plataforma del post).
+        """
+        request = self._build_request(messages, operation, model, temperature, max_tokens, extra)
+        cache_key = self._cache_key(request, cache, operation)
+        writer = open_token_stream(operation, stream_label) if stream else None
+        if cache_key:
+            cached = self._cache_get(operation, cache_key)
+            if cached is not None:
+                record_llm_usage(operation, request["model"], cached=True)
+                if writer: writer.write(cached)
+                return cached
+        reserved = estimate_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            self.scheduler.acquire(operation, reserved)
+            started = time.perf_counter()
+            try:
+                if writer: text, usage = self._stream_sync(request, operation, writer, started)
+                else:
+                    response = self._get_sync_client().chat.completions.create(**request)
+                    text, usage = self._text_of(response), getattr(response, "usage", None)
+                break
+            except OperationCancelled: raise # Cortado a mitad de stream: ni reintento ni error del LLM
+            except Exception as e:
+                self.scheduler.settle(reserved, 0)
+                if writer: writer.reset()
+                delay = self.scheduler.retry_delay(operation, attempt, e)
+                if delay is None:
+                    self._record(operation, request["model"], time.perf_counter() - started, None, failed=True)
+                    raise
+                self.scheduler.backoff(delay)
+                attempt += 1
+        elapsed_s = time.perf_counter() - started
+        self.scheduler.settle(reserved, getattr(usage, "total_tokens", None) or reserved)
+        self._record(operation, request["model"], elapsed_s, usage)
+        if cache_key: self._cache_set(operation, cache_key, text, elapsed_s, usage)
+        return text
+
+    async def acomplete(self, messages: List[Dict[str, str]], operation: str = "default", model: Optional[str] = None,
+                        temperature: Optional[float] = None, max_tokens: Optional[int] = None, cache: Optional[bool] = None,
+                        stream: bool = False, stream_label: Optional[str] = None, **extra) -> str:
+        """Igual que `complete` pero sin bloquear el event loop (la caché SQLite se consulta en un hilo)."""
+        request = self._build_request(messages, operation, model, temperature, max_tokens, extra)
+        cache_key = self._cache_key(request, cache, operation)
+        writer = open_token_stream(operation, stream_label) if stream else None
+        if cache_key:
+            cached = await asyncio.to_thread(self._cache_get, operation, cache_key)
+            if cached is not None:
+                record_llm_usage(operation, request["model"], cached=True)
+                if writer: writer.write(cached)
+                return cached
+        reserved = estimate_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            await self.scheduler.acquire_async(operation, reserved)
+            started = time.perf_counter()
+            try:
+                if writer: text, usage = await self._stream_async(request, operation, writer, started)
+                else:
+                    response = await self._get_async_client().chat.completions.create(**request)
+                    text, usage = self._text_of(response), getattr(response, "usage", None)
+                break
+            except OperationCancelled: raise # Cortado a mitad de stream: ni reintento ni error del LLM
+            except Exception as e:
+                self.scheduler.settle(reserved, 0)
+                if writer: writer.reset()
+                delay = self.scheduler.retry_delay(operation, attempt, e)
+                if delay is None:
+                    self._record(operation, request["model"], time.perf_counter() - started, None, failed=True)
+                    raise
+                await self.scheduler.backoff_async(delay)
+                attempt += 1
+        elapsed_s = time.perf_counter() - started
+        self.scheduler.settle(reserved, getattr(usage, "total_tokens", None) or reserved)
+        self._record(operation, request["model"], elapsed_s, usage)
+        if cache_key: await asyncio.to_thread(self._cache_set, operation, cache_key, text, elapsed_s, usage)
+        return text
+
+    # --- Streaming ---
+    @staticmethod
+    def _stream_request(request: Dict[str, Any]) -> Dict[str, Any]:
+        # stream_options vía extra_body: el SDK lo envía tal cual aunque su versión no conozca el parámetro
+        extra_body = {**(request.get("extra_body") or {}), "stream_options": {"include_usage": True}}
+        return {**request, "stream": True, "extra_body": extra_body}
+
+    def _on_stream_chunk(self, chunk: Any, parts: List[str], writer: TokenStreamWriter, operation: str, model: str, started: float) -> Any:
+        """Reenvía el fragmento de texto del chunk y devuelve su `usage` (solo viene en el último, con include_usage)."""
+        delta = chunk.choices[0].delta.content if chunk.choices and chunk.choices[0].delta else None
+        if delta:
+            if not parts: metrics.LLM_TIME_TO_FIRST_TOKEN_SECONDS.labels(operation=operation, model=model).observe(time.perf_counter() - started)
+            parts.append(delta)
+            writer.write(delta)
+        check_cancelled() # Cliente desconectado: se corta el stream y se deja de pagar tokens
+        return getattr(chunk, "usage", None)
+
+    @staticmethod
+    def _stream_result(request: Dict[str, Any], parts: List[str], usage: Any) -> Any:
+        text = "".join(parts).strip()
+        if usage is None: # Proveedor sin include_usage: estimación para presupuestos y estadísticas
+            prompt_tokens = sum(count_tokens(str(m.get("content") or "")) for m in request["messages"])
+            completion_tokens = count_tokens(text)
+            usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+        return text, usage
+
+    def _stream_sync(self, request: Dict[str, Any], operation: str, writer: TokenStreamWriter, started: float):
+        parts: List[str] = []
+        usage = None
+        stream = self._get_sync_client().chat.completions.create(**self._stream_request(request))
+        try:
+            for chunk in stream: usage = self._on_stream_chunk(chunk, parts, writer, operation, request["model"], started) or usage
+        finally:
+            stream.close()
+        return self._stream_result(request, parts, usage)
+
+    async def _stream_async(self, request: Dict[str, Any], operation: str, writer: TokenStreamWriter, started: float):
+        parts: List[str] = []
+        usage = None
+        stream = await self._get_async_client().chat.completions.create(**self._stream_request(request))
+        try:
+            async for chunk in stream: usage = self._on_stream_chunk(chunk, parts, writer, operation, request["model"], started) or usage
+        finally:
+            await stream.close()
+        return self._stream_result(request, parts, usage)
+
+    @staticmethod
+    def _text_of(response: Any) -> str:
+        if response.choices and response.choices[0].message and response.choices[0].message.content:
+            return response.choices[0].message.content.strip()
+        return ""
+
+    def _record(self, operation: str, model: str, elapsed_s: float, usage: Any, failed: bool = False) -> None:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        metrics.LLM_CALL_SECONDS.labels(operation=operation, model=model).observe(elapsed_s)
+        if failed: metrics.ERRORS_TOTAL.labels(component=f"llm:{operation}").inc()
+        if prompt_tokens: metrics.LLM_TOKENS_TOTAL.labels(operation=operation, model=model, kind="prompt").inc(prompt_tokens)
+        if completion_tokens: metrics.LLM_TOKENS_TOTAL.labels(operation=operation, model=model, kind="completion").inc(completion_tokens)
+        if not failed:
+            self.router.observe(operation, model, elapsed_s, prompt_tokens, completion_tokens) # p95 y coste para el enrutado
+            record_llm_usage(operation, model, prompt_tokens, completion_tokens)
+        with self._stats_lock:
+            stats = self._stats[operation]
+            stats["calls"] += 1; stats["errors"] += int(failed); stats["seconds"] += elapsed_s
+            stats["prompt_tokens"] += prompt_tokens; stats["completion_tokens"] += completion_tokens
+        logger.debug(f"LLM '{operation}' ({model}): {elapsed_s:.2f}s, tokens {prompt_tokens}+{completion_tokens}{' (error)' if failed else ''}.")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            by_operation = {op: dict(s) for op, s in self._stats.items()}
+        for s in by_operation.values():
+            s["avg_seconds"] = round(s["seconds"] / s["calls"], 3) if s["calls"] else None
+            s["seconds"] = round(s["seconds"], 3)
+            lookups = s["cache_hits"] + s["cache_misses"]
+            s["cache_hit_ratio"] = round(s["cache_hits"] / lookups, 3) if lookups else None
+            s["saved_seconds"] = round(s["saved_seconds"], 3)
+        return {
+            "available": self.available,
+            "default_model": self.default_model,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "by_operation": by_operation,
+            "scheduler": self.scheduler.get_stats(),
+            "model_router": self.router.get_stats(),
+            "cache": {
+                "operations": sorted(self.cache_operations),
+                "error": self._cache_error,
+                **(self._cache.get_stats() if self._cache is not None else {}),
+                "saved_tokens": sum(s["saved_tokens"] for s in by_operation.values()),
+                "saved_seconds": round(sum(s["saved_seconds"] for s in by_operation.values()), 3),
+            },
+        }
+
+    def close(self) -> None:
+        """Cierra el pool síncrono (el asíncrono se cierra con el event loop al apagar el proceso)."""
+        if self._sync_client is not None: self._sync_client.close()
+
+
+llm_client = LLMClient() # Uno por proceso: todas las herramientas comparten pool y métricas
@@ -0,0 +1,192 @@
+# app/core/llm_scheduler.py
+# Planificador de llamadas al LLM: presupuestos de peticiones y tokens por minuto antes de enviar, y reintentos
+# con backoff exponencial + jitter que respetan Retry-After. Un 429 con Retry-After pausa a todos los llamadores
+# (no solo al que lo recibió), así el proceso se mantiene en el techo del proveedor en lugar de fallar.
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from app.core import metrics
+from app.core.cancellation import check_cancelled
+from app.core.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+RETRY_RATE_LIMIT = "rate_limit"
+RETRY_TIMEOUT = "timeout"
+RETRY_CONNECTION = "connection"
+RETRY_SERVER_ERROR = "server_error"
+
+
+class LLMThrottleTimeout(TimeoutError):
+    """El presupuesto RPM/TPM no dejó enviar la llamada dentro de `max_wait_seconds`."""
+
+
+def retry_reason(error: BaseException) -> Optional[str]:
+    """Motivo RETRY_* si el error del SDK de openai es transitorio; None si reintentar no serviría (401, 400, cuota agotada...)."""
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        return None if getattr(error, "code", None) == "insufficient_quota" else RETRY_RATE_LIMIT # Sin saldo: esperar no sirve
+    if status is not None: return RETRY_SERVER_ERROR if status >= 500 or status in (408, 409) else None
+    name = type(error).__name__ # Por nombre: este módulo no importa el SDK
+    if name == "APITimeoutError": return RETRY_TIMEOUT
+    if name == "APIConnectionError": return RETRY_CONNECTION
+    return None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Segundos pedidos por el servidor (cabeceras `retry-after-ms` / `retry-after`, en segundos o fecha HTTP)."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers: return None
+    try:
+        if headers.get("retry-after-ms"): return max(0.0, float(headers["retry-after-ms"]) / 1000.0)
+        value = headers.get("retry-after")
+        if not value: return None
+        try: return max(0.0, float(value))
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError): return None
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Tokens del prompt (~4 caracteres por token + unos pocos por mensaje), sin tokenizar."""
+    return sum(len(str(m.get("content") or "")) for m in messages) // 4 + 8 * len(messages)
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> int:
+    """Tokens que reservar antes de enviar: prompt estimado + respuesta máxima."""
+    return estimate_prompt_tokens(messages) + (max_tokens or 512)
+
+
+class LLMScheduler:
+    """
+    `acquire` reserva 1 petición y los tokens estimados de los presupuestos por minuto (espera lo necesario, sin pasar de
+    `max_wait_seconds`, y comprobando la cancelación); `settle` corrige con los tokens reales de la respuesta.
+    `retry_delay(operation, attempt, error)` decide si reintentar y cuánto esperar: Retry-After si el servidor lo manda
+    (y en un 429 pausa a todo el proceso ese tiempo), si no backoff exponencial con jitter completo.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_retries: int,
+                 backoff_base_seconds: float, backoff_max_seconds: float, max_wait_seconds: float):
+        self.requests = TokenBucket("llm_requests", requests_per_minute)
+        self.tokens = TokenBucket("llm_tokens", tokens_per_minute)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base_seconds = float(backoff_base_seconds)
+        self.backoff_max_seconds = float(backoff_max_seconds)
+        self.max_wait_seconds = float(max_wait_seconds)
+        self._lock = threading.Lock()
+        self._paused_until = 0.0 # monotonic: pausa global tras un 429 con Retry-After
+        self.throttled_total = 0
+        self.throttle_seconds_total = 0.0
+        self.pauses_total = 0
+        self.retries: Dict[str, int] = defaultdict(int)
+        self.gave_up: Dict[str, int] = defaultdict(int)
+
+    # --- Presupuestos ---
+    def _try_reserve(self, tokens: int) -> float:
+        """Reserva petición + tokens a la vez (0) o devuelve cuánto esperar sin reservar nada."""
+        with self._lock:
+            paused = self._paused_until - time.monotonic()
+            if paused > 0: return paused
+            wait = self.requests.try_take(1)
+            if wait: return wait
+            wait = self.tokens.try_take(tokens)
+            if wait: self.requests.adjust(-1); return wait
+            return 0.0
+
+    def _on_reserved(self, operation: str, waited: float) -> None:
+        metrics.LLM_THROTTLE_SECONDS.labels(operation=operation).observe(waited)
+        if waited > 0:
+            with self._lock: self.throttled_total += 1; self.throttle_seconds_total += waited
+            logger.debug(f"LLMScheduler: '{operation}' esperó {waited:.2f}s por presupuesto.")
+
+    def _check_wait(self, operation: str, waited: float, wait: float) -> None:
+        check_cancelled()
+        if waited + wait > self.max_wait_seconds:
+            raise LLMThrottleTimeout(f"Presupuesto LLM agotado: '{operation}' no pudo enviarse en {self.max_wait_seconds:.0f}s.")
+
+    def acquire(self, operation: str, tokens: int) -> None:
+        started, throttled = time.monotonic(), False
+        while True:
+            wait = self._try_reserve(tokens)
+            waited = time.monotonic() - started if throttled else 0.0
+            if not wait: self._on_reserved(operation, waited); return
+            self._check_wait(operation, waited, wait)
+            throttled = True
+            time.sleep(min(wait, 1.0)) # Tramos cortos: la cancelación se comprueba a menudo
+
+    async def acquire_async(self, operation: str, tokens: int) -> None:
+        started, throttled = time.monotonic(), False
+        while True:
+            wait = self._try_reserve(tokens)
+            waited = time.monotonic() - started if throttled else 0.0
+            if not wait: self._on_reserved(operation, waited); return
+            self._check_wait(operation, waited, wait)
+            throttled = True
+            await asyncio.sleep(min(wait, 1.0))
+
+    def settle(self, reserved_tokens: int, used_tokens: int) -> None:
+        """Ajusta el presupuesto de tokens al uso real (0 si la llamada falló sin consumir)."""
+        if used_tokens != reserved_tokens: self.tokens.adjust(used_tokens - reserved_tokens)
+
+    # --- Reintentos ---
+    def retry_delay(self, operation: str, attempt: int, error: BaseException) -> Optional[float]:
+        """Segundos antes del reintento `attempt + 1`, o None si no hay que reintentar (error no transitorio o sin intentos)."""
+        reason = retry_reason(error)
+        if reason is None: return None
+        if attempt >= self.max_retries:
+            with self._lock: self.gave_up[reason] += 1
+            logger.warning(f"LLMScheduler: '{operation}' sin más reintentos tras {attempt + 1} intentos ({reason}).")
+            return None
+        server_delay = retry_after_seconds(error)
+        backoff = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt)) # Jitter completo
+        delay = min(self.backoff_max_seconds, server_delay) if server_delay is not None else backoff
+        with self._lock:
+            self.retries[reason] += 1
+            if reason == RETRY_RATE_LIMIT and server_delay is not None:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self.pauses_total += 1
+        metrics.LLM_RETRIES_TOTAL.labels(operation=operation, reason=reason).inc()
+        logger.info(f"LLMScheduler: '{operation}' reintento {attempt + 1}/{self.max_retries} en {delay:.2f}s ({reason}"
+                    f"{', Retry-After' if server_delay is not None else ''}).")
+        return delay
+
+    @staticmethod
+    def backoff(delay: float) -> None:
+        """Espera `delay` en tramos cortos comprobando la cancelación."""
+        deadline = time.monotonic() + delay
+        while True:
+            check_cancelled()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: return
+            time.sleep(min(remaining, 0.5))
+
+    @staticmethod
+    async def backoff_async(delay: float) -> None:
+        deadline = time.monotonic() + delay
+        while True:
+            check_cancelled()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: return
+            await asyncio.sleep(min(remaining, 0.5))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests_budget": self.requests.get_stats(),
+                "tokens_budget": self.tokens.get_stats(),
+                "max_retries": self.max_retries,
+                "throttled_total": self.throttled_total,
+                "throttle_seconds_total": round(self.throttle_seconds_total, 3),
+                "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 3),
+                "pauses_total": self.pauses_total,
+                "retries": dict(self.retries),
+                "gave_up": dict(self.gave_up),
+            }
@@ -0,0 +1,135 @@
+# app/core/metrics.py
+# Métricas Prometheus (histogramas por etapa, contadores de errores/caché, peticiones en curso).
+# Multi-worker: exportar PROMETHEUS_MULTIPROC_DIR (directorio vacío y escribible) ANTES de arrancar uvicorn;
+# cada worker escribe sus valores en ficheros mmap y /metrics agrega los de todos los procesos.
+import functools
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+    )
+except ImportError: # Dependencia opcional: sin ella las métricas son no-op y /metrics responde 503
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    REGISTRY = CollectorRegistry = generate_latest = multiprocess = None
+    Counter = Gauge = Histogram = None
+    logger.warning("prometheus_client no instalado: métricas deshabilitadas.")
+
+METRICS_ENABLED = Histogram is not None
+MULTIPROCESS_MODE = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Cubetas para etapas que van de milisegundos (caché, Chroma) a minutos (crews completos)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+class _NoopMetric:
+    """Sustituto sin efecto con la misma API que usamos de prometheus_client."""
+    def labels(self, *args, **kwargs) -> "_NoopMetric": return self
+    def observe(self, *args, **kwargs) -> None: pass
+    def inc(self, *args, **kwargs) -> None: pass
+    def dec(self, *args, **kwargs) -> None: pass
+    def set(self, *args, **kwargs) -> None: pass
+
+
+def _histogram(name: str, doc: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = STAGE_BUCKETS):
+    return Histogram(name, doc, labels, buckets=buckets) if METRICS_ENABLED else _NoopMetric()
+
+def _counter(name: str, doc: str, labels: Tuple[str, ...]):
+    return Counter(name, doc, labels) if METRICS_ENABLED else _NoopMetric()
+
+def _gauge(name: str, doc: str, labels: Tuple[str, ...]):
+    # 'livesum': en modo multiproceso suma los valores de los workers vivos
+    return Gauge(name, doc, labels, multiprocess_mode="livesum") if METRICS_ENABLED else _NoopMetric()
+
+
+CREW_KICKOFF_SECONDS = _histogram("crew_kickoff_seconds", "Duración de Crew.kickoff() completo.", ("crew",))
+CREW_TASK_SECONDS = _histogram("crew_task_seconds", "Duración de cada Task dentro de un crew.", ("crew", "task"))
+TOOL_RUN_SECONDS = _histogram("tool_run_seconds", "Duración de cada ejecución de herramienta (_run).", ("tool",))
+EXTERNAL_CALL_SECONDS = _histogram("external_call_seconds", "Duración de llamadas a servicios externos (GDrive, ChromaDB).", ("service", "operation"))
+HTTP_REQUEST_SECONDS = _histogram("http_request_seconds", "Latencia HTTP hasta el inicio de la respuesta.", ("method", "route", "status"))
+LLM_CALL_SECONDS = _histogram("llm_call_seconds", "Duración de cada llamada al LLM desde las herramientas (cliente compartido).", ("operation", "model"))
+LLM_THROTTLE_SECONDS = _histogram("llm_throttle_seconds", "Espera en el planificador LLM (presupuestos RPM/TPM o pausa tras un 429) antes de enviar cada llamada.", ("operation",))
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = _histogram("llm_time_to_first_token_seconds", "Tiempo hasta el primer token en las llamadas al LLM con streaming.", ("operation", "model"))
+EVENT_LOOP_LAG_SECONDS = _histogram("event_loop_lag_seconds", "Retraso del event loop de la API al despertar de un sleep (tiempo bloqueado por trabajo síncrono).", (), buckets=LAG_BUCKETS)
+ADMISSION_QUEUE_WAIT_SECONDS = _histogram("admission_queue_wait_seconds", "Espera en la cola de admisión hasta obtener slot de crew (0 si hubo slot libre).", ("kind",))
+
+ERRORS_TOTAL = _counter("app_errors_total", "Errores por componente.", ("component",))
+CACHE_EVENTS_TOTAL = _counter("cache_events_total", "Consultas a cachés por resultado (hit/miss).", ("cache", "result"))
+ADMISSION_REJECTIONS_TOTAL = _counter("admission_rejections_total", "Peticiones rechazadas por control de admisión (429/503).", ("kind", "reason"))
+LLM_TOKENS_TOTAL = _counter("llm_tokens_total", "Tokens consumidos por las llamadas del cliente LLM compartido.", ("operation", "model", "kind"))
+LLM_ROUTE_DECISIONS_TOTAL = _counter("llm_route_decisions_total", "Modelos elegidos por el enrutador por operación, nivel y motivo (route, downgraded_latency, downgraded_cost, fallback).", ("operation", "tier", "reason"))
+LLM_RETRIES_TOTAL = _counter("llm_retries_total", "Reintentos de llamadas al LLM por motivo (rate_limit, timeout, connection, server_error).", ("operation", "reason"))
+LLM_CACHE_SAVED_TOKENS_TOTAL = _counter("llm_cache_saved_tokens_total", "Tokens no consumidos gracias a aciertos de la caché de completions.", ("operation",))
+LLM_CACHE_SAVED_SECONDS_TOTAL = _counter("llm_cache_saved_seconds_total", "Latencia de LLM ahorrada por aciertos de la caché de completions (la de la llamada original).", ("operation",))
+CREW_CANCELLATIONS_TOTAL = _counter("crew_cancellations_total", "Ejecuciones de crew canceladas (cliente desconectado / plazo vencido).", ("crew", "reason"))
+CREW_ABANDONED_SECONDS_TOTAL = _counter("crew_abandoned_seconds_total", "Segundos de worker gastados en ejecuciones que acabaron canceladas.", ("crew", "reason"))
+REQUESTS_ABANDONED_TOTAL = _counter("requests_abandoned_total", "Peticiones cuyo cliente dejó de esperar antes del resultado.", ("endpoint", "reason"))
+
+HTTP_REQUESTS_IN_FLIGHT = _gauge("http_requests_in_flight", "Peticiones HTTP en curso.", ())
+CREW_EXECUTIONS_IN_FLIGHT = _gauge("crew_executions_in_flight", "Ejecuciones de crew en curso en el pool de workers.", ("crew",))
+ADMISSION_QUEUE_DEPTH = _gauge("admission_queue_depth", "Peticiones esperando slot en la cola de admisión.", ())
+
+
+@contextmanager
+def observe_seconds(histogram: Any, **labels) -> Iterator[None]:
+    """Mide el bloque y lo registra en `histogram` (también si lanza excepción)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+def timed(histogram: Any, error_component: Optional[str] = None,
+          is_error: Optional[Callable[[Any], bool]] = None, **labels) -> Callable:
+    """
+    Decorador: registra la duración de cada llamada. Las excepciones y los resultados para los que
+    `is_error(resultado)` es True (servicios que devuelven el error en vez de lanzarlo) cuentan en ERRORS_TOTAL.
+    Las cancelaciones (excepciones con `is_cancellation`) no cuentan como error.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with observe_seconds(histogram, **labels):
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    if error_component and not getattr(e, "is_cancellation", False): ERRORS_TOTAL.labels(component=error_component).inc()
+                    raise
+            if error_component and is_error and is_error(result): ERRORS_TOTAL.labels(component=error_component).inc()
+            return result
+        return wrapper
+    return decorator
+
+
+def _is_error_string(result: Any) -> bool:
+    return isinstance(result, str) and result.lstrip().startswith("Error")
+
+def instrument_tool(tool_name: str) -> Callable:
+    """Decorador para el `_run`/función de una herramienta: tiempo por herramienta y errores ('Error...' devuelto o excepción)."""
+    return timed(TOOL_RUN_SECONDS, error_component=f"tool:{tool_name}", is_error=_is_error_string, tool=tool_name)
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Exposición en formato texto de Prometheus (agregando todos los workers en modo multiproceso)."""
+    if not METRICS_ENABLED: raise RuntimeError("prometheus_client no instalado.")
+    if MULTIPROCESS_MODE:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Al parar un worker: sus gauges 'live*' dejan de contar (solo en modo multiproceso)."""
+    if METRICS_ENABLED and MULTIPROCESS_MODE:
+        try: multiprocess.mark_process_dead(os.getpid())
+        except Exception as e: logger.warning(f"No se pudo marcar el proceso como terminado en métricas: {e}")
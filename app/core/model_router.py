@@ -0,0 +1,192 @@
+# app/core/model_router.py
+# Enrutado de modelos por operación: cada herramienta (content_analysis, write_social_post...) y cada agente de los
+# crews (researcher, editor, marketing_agent) se asigna a un nivel ("tier") y cada nivel a un modelo. Con la
+# política 'adaptive' el nivel baja (nunca sube) si el p95 observado del modelo no cabe en el plazo que le queda a la
+# petición o su coste estimado no cabe en el presupuesto de coste de la petición.
+import contextvars
+import logging
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+from app.core import metrics
+from app.core.cancellation import current_token
+
+try: from app.core.config import settings
+except ImportError: settings = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+POLICY_STATIC = "static"
+POLICY_ADAPTIVE = "adaptive"
+
+# USD por millón de tokens (prompt, completion). LLM_MODEL_PRICES añade o sobrescribe modelos ("modelo=entrada:salida,...")
+DEFAULT_MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.5, 1.5), "gpt-3.5-turbo-0125": (0.5, 1.5), "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o": (2.5, 10.0), "gpt-4-turbo": (10.0, 30.0), "gpt-4": (30.0, 60.0),
+}
+DEFAULT_COMPLETION_TOKENS = 512 # Respuesta supuesta si la llamada no fija max_tokens
+
+
+def parse_mapping(spec: Optional[str]) -> Dict[str, str]:
+    """'a=b,c=d' -> {'a': 'b', 'c': 'd'} conservando el orden (el de LLM_MODEL_TIERS define de más barato a mejor)."""
+    mapping: Dict[str, str] = {}
+    for item in (spec or "").split(","):
+        key, sep, value = item.partition("=")
+        if sep and key.strip() and value.strip(): mapping[key.strip()] = value.strip()
+    return mapping
+
+
+def parse_prices(spec: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    prices: Dict[str, Tuple[float, float]] = {}
+    for model, value in parse_mapping(spec).items():
+        prompt_price, _, completion_price = value.partition(":")
+        try: prices[model] = (float(prompt_price), float(completion_price or prompt_price))
+        except ValueError: logger.warning(f"ModelRouter: precio inválido para '{model}' en LLM_MODEL_PRICES: '{value}'.")
+    return prices
+
+
+class RequestBudget:
+    """Presupuesto de coste de una petición: las llamadas al LLM que hace (en cualquier hilo del crew) lo van gastando."""
+
+    def __init__(self, max_cost_usd: Optional[float] = None):
+        self.max_cost_usd = max_cost_usd if max_cost_usd and max_cost_usd > 0 else None
+        self.spent_usd = 0.0
+        self._lock = threading.Lock()
+
+    def charge(self, cost_usd: float) -> None:
+        with self._lock: self.spent_usd += cost_usd
+
+    def remaining(self) -> Optional[float]:
+        return None if self.max_cost_usd is None else max(0.0, self.max_cost_usd - self.spent_usd)
+
+
+_current_budget: contextvars.ContextVar[Optional[RequestBudget]] = contextvars.ContextVar("request_budget", default=None)
+
+
+def current_budget() -> Optional[RequestBudget]:
+    return _current_budget.get()
+
+
+@contextmanager
+def request_budget_scope(budget: Optional[RequestBudget]) -> Iterator[Optional[RequestBudget]]:
+    """Activa `budget` en el contexto actual (hilo worker); los hilos hijos deben copiar el contexto."""
+    reset = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(reset)
+
+
+class ModelRouter:
+    """
+    `choose(operation, prompt_tokens, max_tokens)` devuelve el modelo de la operación, o None si la operación no tiene
+    ruta o su nivel no tiene modelo (quien llama usa su modelo por defecto: así, sin LLM_MODEL_TIERS nada cambia).
+    Política 'adaptive': prueba el nivel de la ruta y los inferiores, en orden, y se queda con el primero cuyo p95
+    (de la operación con ese modelo si hay `min_samples` muestras, si no del modelo; sin muestras se da por bueno)
+    cabe en el plazo restante de la petición (`deadline_seconds`) y cuyo coste estimado cabe en su presupuesto.
+    Si ninguno cabe, el nivel más barato. `observe` registra latencia y coste de cada llamada hecha.
+    """
+
+    def __init__(self, tiers: Dict[str, str], routes: Dict[str, str], policy: str = POLICY_STATIC,
+                 prices: Optional[Dict[str, Tuple[float, float]]] = None, latency_window: int = 200, min_samples: int = 20):
+        self.tiers = dict(tiers) # Orden: de más rápido/barato a mejor
+        self.tier_order = list(self.tiers)
+        self.routes = dict(routes)
+        self.policy = policy if policy in (POLICY_STATIC, POLICY_ADAPTIVE) else POLICY_STATIC
+        self.prices = {**DEFAULT_MODEL_PRICES, **(prices or {})}
+        self.latency_window = max(1, int(latency_window))
+        self.min_samples = max(1, int(min_samples))
+        self._lock = threading.Lock()
+        self._latencies: Dict[Tuple[str, Optional[str]], Deque[float]] = defaultdict(lambda: deque(maxlen=self.latency_window))
+        self._decisions: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.downgrades = 0
+        self.cost_usd_total = 0.0
+        unknown = sorted({t for t in self.routes.values() if t not in self.tiers})
+        if self.tiers and unknown: logger.warning(f"ModelRouter: rutas a niveles sin modelo (usarán el modelo por defecto): {unknown}")
+
+    # --- Observación ---
+    def estimate_cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        price = self.prices.get(model)
+        if price is None: return None
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+    def observe(self, operation: str, model: str, elapsed_s: float, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        cost = self.estimate_cost(model, prompt_tokens, completion_tokens) or 0.0
+        with self._lock:
+            self._latencies[(model, operation)].append(elapsed_s)
+            self._latencies[(model, None)].append(elapsed_s)
+            self.cost_usd_total += cost
+        budget = _current_budget.get()
+        if budget is not None and cost: budget.charge(cost)
+
+    @staticmethod
+    def _percentile(samples: Deque[float], q: float) -> float:
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def p95(self, model: str, operation: Optional[str] = None) -> Optional[float]:
+        with self._lock:
+            samples = self._latencies.get((model, operation)) if operation else None
+            if not samples or len(samples) < self.min_samples: samples = self._latencies.get((model, None))
+            if not samples or len(samples) < self.min_samples: return None
+            return self._percentile(samples, 0.95)
+
+    # --- Decisión ---
+    def _decide(self, operation: str, tier: str, reason: str) -> str:
+        with self._lock:
+            self._decisions[operation][tier] += 1
+            if reason.startswith("downgraded") or reason == "fallback": self.downgrades += 1
+        metrics.LLM_ROUTE_DECISIONS_TOTAL.labels(operation=operation, tier=tier, reason=reason).inc()
+        return self.tiers[tier]
+
+    def choose(self, operation: str, prompt_tokens: int = 0, max_tokens: Optional[int] = None) -> Optional[str]:
+        tier = self.routes.get(operation)
+        if tier not in self.tiers: return None
+        if self.policy != POLICY_ADAPTIVE: return self._decide(operation, tier, "route")
+        token, budget = current_token(), _current_budget.get()
+        latency_budget = token.remaining() if token is not None else None
+        cost_budget = budget.remaining() if budget is not None else None
+        completion_tokens = max_tokens or DEFAULT_COMPLETION_TOKENS
+        first_reason = None
+        for candidate in reversed(self.tier_order[:self.tier_order.index(tier) + 1]):
+            model = self.tiers[candidate]
+            p95 = self.p95(model, operation)
+            if latency_budget is not None and p95 is not None and p95 > latency_budget:
+                first_reason = first_reason or "latency"; continue
+            cost = self.estimate_cost(model, prompt_tokens, completion_tokens)
+            if cost_budget is not None and cost is not None and cost > cost_budget:
+                first_reason = first_reason or "cost"; continue
+            if candidate != tier:
+                logger.info(f"ModelRouter: '{operation}' baja de '{tier}' a '{candidate}' ({first_reason}).")
+                return self._decide(operation, candidate, f"downgraded_{first_reason}")
+            return self._decide(operation, candidate, "route")
+        logger.info(f"ModelRouter: '{operation}': ningún nivel cabe en el presupuesto; se usa '{self.tier_order[0]}'.")
+        return self._decide(operation, self.tier_order[0], "fallback")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            decisions = {op: dict(by_tier) for op, by_tier in self._decisions.items()}
+            models = {model for model, _op in self._latencies}
+            downgrades, cost_usd_total = self.downgrades, self.cost_usd_total
+        return {
+            "policy": self.policy,
+            "tiers": dict(self.tiers),
+            "routes": dict(self.routes),
+            "decisions": decisions,
+            "downgrades": downgrades,
+            "p95_seconds": {model: self.p95(model) for model in sorted(models)},
+            "estimated_cost_usd_total": round(cost_usd_total, 6),
+        }
+
+
+model_router = ModelRouter(
+    tiers=parse_mapping(settings.LLM_MODEL_TIERS if settings else ""),
+    routes=parse_mapping(settings.LLM_MODEL_ROUTES if settings else ""), # Rutas por defecto: las de config.py
+    policy=settings.LLM_ROUTING_POLICY if settings else POLICY_STATIC,
+    prices=parse_prices(settings.LLM_MODEL_PRICES if settings else ""),
+    latency_window=settings.LLM_ROUTING_LATENCY_WINDOW if settings else 200,
+    min_samples=settings.LLM_ROUTING_MIN_SAMPLES if settings else 20,
+) # Uno por proceso, compartido por el cliente LLM y las fábricas de agentes
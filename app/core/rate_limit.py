@@ -0,0 +1,77 @@
+# app/core/rate_limit.py
+# Token bucket compartido (thread-safe) para presupuestos de llamadas por minuto (Tavily, LLM...).
+import asyncio
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Presupuesto de `rate_per_minute` unidades por minuto, con ráfaga máxima de `burst` (por defecto, un minuto).
+    Usable desde hilos (`acquire`) y desde el event loop (`acquire_async`).
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, burst: Optional[float] = None):
+        self.name = name
+        self.rate_per_second = max(float(rate_per_minute), 0.001) / 60.0
+        self.capacity = float(burst) if burst else max(float(rate_per_minute), 1.0)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self.wait_seconds_total = 0.0 # Tiempo total esperado por el presupuesto (throttling)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate_per_second)
+        self._last_refill = now
+
+    def try_take(self, tokens: float = 1.0) -> float:
+        """Consume `tokens` si hay saldo (devuelve 0) o, sin consumir, los segundos estimados hasta que lo haya."""
+        tokens = min(float(tokens), self.capacity) # Una petición mayor que la ráfaga espera al bucket lleno
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate_per_second
+
+    def adjust(self, tokens: float) -> None:
+        """Corrige lo consumido a posteriori: positivo cobra más (el saldo puede quedar negativo), negativo devuelve."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - float(tokens))
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Bloquea el hilo hasta disponer de `tokens` (o agotar `timeout`)."""
+        started = time.monotonic()
+        while True:
+            wait = self.try_take(tokens)
+            if wait == 0.0:
+                self.wait_seconds_total += time.monotonic() - started
+                return True
+            if timeout is not None and time.monotonic() - started + wait > timeout:
+                return False
+            time.sleep(min(wait, 1.0))
+
+    async def acquire_async(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Igual que `acquire` pero sin bloquear el event loop."""
+        started = time.monotonic()
+        while True:
+            wait = self.try_take(tokens)
+            if wait == 0.0:
+                self.wait_seconds_total += time.monotonic() - started
+                return True
+            if timeout is not None and time.monotonic() - started + wait > timeout:
+                return False
+            await asyncio.sleep(min(wait, 1.0))
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {
+                "rate_per_minute": round(self.rate_per_second * 60.0, 3),
+                "available": round(self._tokens, 3),
+                "capacity": self.capacity,
+                "wait_seconds_total": round(self.wait_seconds_total, 3),
+            }
@@ -0,0 +1,68 @@
+# app/core/token_stream.py
+# Streaming de tokens del LLM hacia el cliente. El backend activa un "sink" (callable `(event, data)`, el mismo que
+# reciben los progress_callback de las variantes /stream) con `token_stream_scope`; las llamadas al LLM que lo
+# soportan piden la respuesta en streaming y reenvían cada fragmento como evento "token". Sin sink activo, nada cambia.
+import contextvars
+import logging
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+TOKEN_EVENT = "token" # {'stream_id', 'operation', 'label'?, 'index', 'delta'}
+TOKEN_RESET_EVENT = "token_reset" # {'stream_id', 'operation'}: el intento se reintenta, descartar lo recibido de ese stream_id
+
+TokenSink = Callable[[str, Dict[str, Any]], None]
+
+_current_sink: contextvars.ContextVar[Optional[TokenSink]] = contextvars.ContextVar("token_sink", default=None)
+
+
+def current_token_sink() -> Optional[TokenSink]:
+    return _current_sink.get()
+
+
+@contextmanager
+def token_stream_scope(sink: Optional[TokenSink]) -> Iterator[Optional[TokenSink]]:
+    """Activa `sink` en el contexto actual (hilo worker). Como con la cancelación, los hilos hijos deben copiar el contexto."""
+    reset = _current_sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _current_sink.reset(reset)
+
+
+class TokenStreamWriter:
+    """Un stream (una respuesta del LLM): numera los fragmentos y aísla al productor de los errores del sink."""
+
+    def __init__(self, sink: TokenSink, operation: str, label: Optional[str] = None):
+        self.sink = sink
+        self.operation = operation
+        self.label = label
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.index = 0
+        self.chars = 0
+
+    def _emit(self, event: str, **data: Any) -> None:
+        base = {"stream_id": self.stream_id, "operation": self.operation, **({"label": self.label} if self.label else {})}
+        try: self.sink(event, {**base, **data})
+        except Exception as e: logger.warning(f"Token stream '{self.operation}': error en el sink ({type(e).__name__} - {e}).")
+
+    def write(self, delta: str) -> None:
+        if not delta: return
+        self._emit(TOKEN_EVENT, index=self.index, delta=delta)
+        self.index += 1
+        self.chars += len(delta)
+
+    def reset(self) -> None:
+        """Antes de reintentar una llamada que ya emitió tokens: el cliente descarta el texto parcial."""
+        if self.chars: self._emit(TOKEN_RESET_EVENT)
+        self.index = 0
+        self.chars = 0
+
+
+def open_token_stream(operation: str, label: Optional[str] = None) -> Optional[TokenStreamWriter]:
+    """Writer sobre el sink activo, o None si nadie consume tokens (la llamada va sin streaming)."""
+    sink = _current_sink.get()
+    return TokenStreamWriter(sink, operation, label) if sink is not None else None
@@ -0,0 +1,68 @@
+# app/core/usage.py
+# Contabilidad de tokens y coste estimado por petición. El backend activa un `RequestUsage` con `usage_scope` en el
+# hilo worker; cada llamada al LLM hecha dentro (herramientas vía LLMClient y pasos de razonamiento de los agentes
+# vía callback de LangChain) suma sus tokens a la etapa (operación) que la hizo. El coste usa los precios del
+# enrutador de modelos (LLM_MODEL_PRICES). Sin petición activa, nada se acumula.
+import contextvars
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from app.core.model_router import model_router
+
+_STAGE_FIELDS = ("llm_calls", "cache_hits", "prompt_tokens", "completion_tokens")
+
+
+class RequestUsage:
+    """Acumulador thread-safe (los crews multi-plataforma llaman al LLM desde varios hilos con el contexto copiado)."""
+
+    def __init__(self, kind: str, topic: Optional[str] = None):
+        self.kind = kind
+        self.topic = topic
+        self.ref = uuid.uuid4().hex # Identificador en el ledger (investigación: el id del documento en ChromaDB)
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, model: Optional[str], prompt_tokens: int = 0, completion_tokens: int = 0, cached: bool = False) -> None:
+        cost = model_router.estimate_cost(model, prompt_tokens, completion_tokens) if model and not cached else None
+        with self._lock:
+            entry = self._stages.setdefault(stage, {**dict.fromkeys(_STAGE_FIELDS, 0), "estimated_cost_usd": 0.0, "models": [], "unpriced_models": []})
+            entry["cache_hits" if cached else "llm_calls"] += 1
+            if cached: return # Sin tokens: los de la llamada original ya se contaron en su día
+            entry["prompt_tokens"] += prompt_tokens; entry["completion_tokens"] += completion_tokens
+            if model and model not in entry["models"]: entry["models"].append(model)
+            if cost is not None: entry["estimated_cost_usd"] += cost
+            elif model and model not in entry["unpriced_models"]: entry["unpriced_models"].append(model)
+
+    def summary(self) -> Dict[str, Any]:
+        """{'llm_calls', 'cache_hits', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'estimated_cost_usd', 'by_stage'}."""
+        with self._lock: stages = {stage: {**entry, "models": list(entry["models"]), "unpriced_models": list(entry["unpriced_models"])} for stage, entry in self._stages.items()}
+        for entry in stages.values():
+            entry["total_tokens"] = entry["prompt_tokens"] + entry["completion_tokens"]
+            entry["estimated_cost_usd"] = round(entry["estimated_cost_usd"], 6)
+        totals = {field: sum(e[field] for e in stages.values()) for field in (*_STAGE_FIELDS, "total_tokens")}
+        return {**totals, "estimated_cost_usd": round(sum(e["estimated_cost_usd"] for e in stages.values()), 6),
+                "unpriced_models": sorted({m for e in stages.values() for m in e["unpriced_models"]}), "by_stage": stages}
+
+
+_current_usage: contextvars.ContextVar[Optional[RequestUsage]] = contextvars.ContextVar("request_usage", default=None)
+
+
+def current_usage() -> Optional[RequestUsage]:
+    return _current_usage.get()
+
+
+@contextmanager
+def usage_scope(usage: Optional[RequestUsage]) -> Iterator[Optional[RequestUsage]]:
+    """Activa `usage` en el contexto actual (hilo worker); los hilos hijos deben copiar el contexto."""
+    reset = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(reset)
+
+
+def record_llm_usage(stage: str, model: Optional[str], prompt_tokens: int = 0, completion_tokens: int = 0, cached: bool = False) -> None:
+    usage = _current_usage.get()
+    if usage is not None: usage.add(stage, model, prompt_tokens, completion_tokens, cached)
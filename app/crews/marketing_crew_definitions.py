@@ -2,14 +2,18 @@
 # VERSIÓN CORREGIDA: Error de print() con exc_info solucionado.
 
 from crewai import Task, Crew, Process
-from typing import Optional, Dict, Any # Importar Dict y Any
+from typing import Optional, Dict, Any, List # Importar Dict y Any
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import logging # Importar logging
+from app.crews.progress import CrewProgressTracker, ProgressCallback
+from app.core.cancellation import OperationCancelled, check_cancelled, crew_step_checkpoint
 
 logger = logging.getLogger(__name__) # Usar el logger del módulo
 logger.setLevel(logging.INFO) # O DEBUG para más detalle
 
 try:
-    from app.agents_crewai.crew_agents import marketing_content_agent
+    from app.agents_crewai.crew_agents import marketing_content_agent, create_marketing_content_agent
     logger.debug("marketing_crew_definitions.py: Importando 'marketing_content_agent'...")
     if not marketing_content_agent or "ERROR" in marketing_content_agent.role:
          logger.warning("marketing_crew_definitions.py: 'marketing_content_agent' importado en estado de error o no definido.")
@@ -21,43 +25,88 @@ try:
 except ImportError as e:
     logger.critical(f"marketing_crew_definitions.py: No se pudo importar 'marketing_content_agent'. Error: {e}", exc_info=True)
     marketing_content_agent = None
+    create_marketing_content_agent = None
 except Exception as e_agent_load: # Captura general si algo más falla al cargar el agente
     logger.critical(f"marketing_crew_definitions.py: Excepción inesperada importando 'marketing_content_agent'. Error: {e_agent_load}", exc_info=True)
     marketing_content_agent = None
+    create_marketing_content_agent = None
 
 
 # Asumir que DallETool tiene este nombre si se instancia correctamente desde crewai_tools
 DALL_E_TOOL_NAME = "DALL-E Tool" # Nombre por defecto de DallETool de crewai_tools
 
+REQUIRED_MARKETING_TEXT_TOOLS = [
+    "Generador de Ideas de Marketing",
+    "Redactor de Posts para Redes Sociales",
+    "Generador de Prompts para DALL-E"
+]
+
+
+def _check_marketing_agent(agent) -> Optional[str]:
+    """Devuelve un mensaje de error si el agente no puede ejecutar el flujo de texto de marketing."""
+    if not agent or "ERROR" in agent.role or not agent.tools:
+        return "Error crítico: Agente de Marketing no está disponible, en estado de error, o no tiene herramientas funcionales."
+    tool_names_in_agent = [t.name for t in agent.tools if hasattr(t, 'name')]
+    if not all(req_tool in tool_names_in_agent for req_tool in REQUIRED_MARKETING_TEXT_TOOLS):
+        return f"Error: Agente marketing no tiene tools de texto requeridas. Necesita: {REQUIRED_MARKETING_TEXT_TOOLS}. Tiene: {tool_names_in_agent}"
+    return None
+
+
+def _tools_named(agent, tool_name: str) -> list:
+    return [tool for tool in agent.tools if getattr(tool, 'name', '') == tool_name]
+
+
+def _build_ideas_task(agent, topic: str) -> Task:
+    return Task(
+        description=f"Realizar un brainstorming exhaustivo de ideas de marketing (conceptos de contenido, tipos de post, hashtags relevantes, llamadas a la acción efectivas) para el tema/producto principal: '{topic}'. Si se proporciona 'contexto adicional', debe ser utilizado para refinar y enfocar estas ideas. Producir una lista clara y accionable.",
+        expected_output="Una lista formateada con al menos 5 ideas de marketing distintas y bien detalladas, cada una incluyendo: Ángulo/Concepto, Tipo de Contenido Sugerido, Hashtags Propuestos y CTA Sugerido.",
+        agent=agent,
+        tools=_tools_named(agent, "Generador de Ideas de Marketing")
+    )
+
+
+def _build_post_and_prompt_tasks(agent, topic: str, platform: str, context: Optional[str], ideas_task: Task) -> List[Task]:
+    """Tareas dependientes de la plataforma. 'ideas_task' puede pertenecer a otro crew ya ejecutado (se lee su output)."""
+    write_post_task = Task(
+        description=f"Utilizando las ideas de marketing generadas en la tarea anterior y el tema original ('{topic}'), redactar un borrador de post atractivo y optimizado para la plataforma de red social: '{platform}'. Asegurarse de adaptar el tono, la longitud y el formato del texto a las mejores prácticas de '{platform}'. Incluir emojis y hashtags si es pertinente. El contexto original es: {context if context else 'No se proporcionó contexto adicional.'}",
+        expected_output=f"El texto completo y listo para ser utilizado del post para la plataforma '{platform}'.",
+        agent=agent,
+        context=[ideas_task],
+        tools=_tools_named(agent, "Redactor de Posts para Redes Sociales")
+    )
+    suggest_prompt_task = Task(
+        description="A partir del texto del post de red social redactado en la tarea anterior, generar un prompt altamente descriptivo y efectivo para ser utilizado con un modelo de IA de generación de imágenes como DALL-E. El prompt debe capturar la esencia visual del mensaje y guiar a la IA para crear una imagen impactante y relevante.",
+        expected_output="Un único string que contenga el prompt sugerido y optimizado para la generación de imágenes.",
+        agent=agent,
+        context=[write_post_task],
+        tools=_tools_named(agent, "Generador de Prompts para DALL-E")
+    )
+    return [write_post_task, suggest_prompt_task]
+
 
 def create_marketing_content_crew_and_kickoff(
     topic: str,
     platform: str,
     context: Optional[str] = None,
     generate_image: bool = False,
+    progress_callback: Optional[ProgressCallback] = None,
 ) -> Dict[str, Any]: # Devuelve Dict para estructura clara
     """
     Crea y ejecuta el crew de contenido de marketing.
     Devuelve un diccionario con artefactos: ideas, post, prompt_imagen, [url_imagen], o error.
+    'progress_callback' (opcional) recibe eventos 'task_started'/'task_completed' con tiempos por tarea.
     """
     logger.info(f"create_marketing_content_crew: Iniciando para '{topic[:30]}' en '{platform}', Generar Imagen: {generate_image}")
 
-    if not marketing_content_agent or "ERROR" in marketing_content_agent.role or not marketing_content_agent.tools:
-        error_msg = "Error crítico: Agente de Marketing no está disponible, en estado de error, o no tiene herramientas funcionales."
-        logger.error(f"create_marketing_content_crew: {error_msg}")
-        return {"error": error_msg, "ideas": None, "post_text": None, "image_prompt": None, "generated_image_url": None}
+    # Agente propio de esta ejecución: el crew puede correr en paralelo con otros en el pool de workers.
+    marketing_content_agent = create_marketing_content_agent() if create_marketing_content_agent else None
 
-    tool_names_in_agent = [t.name for t in marketing_content_agent.tools if hasattr(t, 'name')]
-    required_text_tools = [
-        "Generador de Ideas de Marketing",
-        "Redactor de Posts para Redes Sociales",
-        "Generador de Prompts para DALL-E"
-    ]
-    if not all(req_tool in tool_names_in_agent for req_tool in required_text_tools):
-        error_msg = f"Error: Agente marketing no tiene tools de texto requeridas. Necesita: {required_text_tools}. Tiene: {tool_names_in_agent}"
+    error_msg = _check_marketing_agent(marketing_content_agent)
+    if error_msg:
         logger.error(f"create_marketing_content_crew: {error_msg}")
         return {"error": error_msg, "ideas": None, "post_text": None, "image_prompt": None, "generated_image_url": None}
-    
+    tool_names_in_agent = [t.name for t in marketing_content_agent.tools if hasattr(t, 'name')]
+
     dalle_tool_is_loaded = DALL_E_TOOL_NAME in tool_names_in_agent
     if generate_image and not dalle_tool_is_loaded:
          logger.warning(f"create_marketing_content_crew: Se solicitó imagen, pero DallETool ('{DALL_E_TOOL_NAME}') no está en agente. Se omitirá generación de imagen.")
@@ -69,31 +118,9 @@ def create_marketing_content_crew_and_kickoff(
         task_inputs_ideas = {'topic': topic}
         if context: task_inputs_ideas['context'] = context
 
-        generate_ideas_task = Task(
-            description=f"Realizar un brainstorming exhaustivo de ideas de marketing (conceptos de contenido, tipos de post, hashtags relevantes, llamadas a la acción efectivas) para el tema/producto principal: '{topic}'. Si se proporciona 'contexto adicional', debe ser utilizado para refinar y enfocar estas ideas. Producir una lista clara y accionable.",
-            expected_output="Una lista formateada con al menos 5 ideas de marketing distintas y bien detalladas, cada una incluyendo: Ángulo/Concepto, Tipo de Contenido Sugerido, Hashtags Propuestos y CTA Sugerido.",
-            agent=marketing_content_agent,
-            tools=[tool for tool in marketing_content_agent.tools if getattr(tool,'name', '') == "Generador de Ideas de Marketing"]
-        )
-        tasks_for_crew.append(generate_ideas_task)
-
-        write_post_task = Task(
-            description=f"Utilizando las ideas de marketing generadas en la tarea anterior y el tema original ('{topic}'), redactar un borrador de post atractivo y optimizado para la plataforma de red social: '{platform}'. Asegurarse de adaptar el tono, la longitud y el formato del texto a las mejores prácticas de '{platform}'. Incluir emojis y hashtags si es pertinente. El contexto original es: {context if context else 'No se proporcionó contexto adicional.'}",
-            expected_output=f"El texto completo y listo para ser utilizado del post para la plataforma '{platform}'.",
-            agent=marketing_content_agent,
-            context=[generate_ideas_task],
-            tools=[tool for tool in marketing_content_agent.tools if getattr(tool,'name', '') == "Redactor de Posts para Redes Sociales"]
-        )
-        tasks_for_crew.append(write_post_task)
-
-        suggest_prompt_task = Task(
-            description="A partir del texto del post de red social redactado en la tarea anterior, generar un prompt altamente descriptivo y efectivo para ser utilizado con un modelo de IA de generación de imágenes como DALL-E. El prompt debe capturar la esencia visual del mensaje y guiar a la IA para crear una imagen impactante y relevante.",
-            expected_output="Un único string que contenga el prompt sugerido y optimizado para la generación de imágenes.",
-            agent=marketing_content_agent,
-            context=[write_post_task],
-            tools=[tool for tool in marketing_content_agent.tools if getattr(tool,'name', '') == "Generador de Prompts para DALL-E"]
-        )
-        tasks_for_crew.append(suggest_prompt_task)
+        generate_ideas_task = _build_ideas_task(marketing_content_agent, topic)
+        write_post_task, suggest_prompt_task = _build_post_and_prompt_tasks(marketing_content_agent, topic, platform, context, generate_ideas_task)
+        tasks_for_crew.extend([generate_ideas_task, write_post_task, suggest_prompt_task])
 
         if generate_image and dalle_tool_is_loaded:
             generate_image_task = Task(
@@ -104,7 +131,7 @@ def create_marketing_content_crew_and_kickoff(
                 expected_output="La URL directa de la imagen generada por DALL-E. Si ocurre un error durante la generación, devolver un mensaje descriptivo del error.",
                 agent=marketing_content_agent,
                 context=[suggest_prompt_task],
-                tools=[tool for tool in marketing_content_agent.tools if getattr(tool, 'name', '') == DALL_E_TOOL_NAME]
+                tools=_tools_named(marketing_content_agent, DALL_E_TOOL_NAME)
             )
             tasks_for_crew.append(generate_image_task)
             logger.info("create_marketing_content_crew: Tarea de Generación de Imagen DALL-E AÑADIDA al plan.")
@@ -116,8 +143,11 @@ def create_marketing_content_crew_and_kickoff(
 
 
     # --- Crear y Ejecutar el Crew ---
+    task_names = ["generate_ideas_task", "write_post_task", "suggest_prompt_task"] + (["generate_image_task"] if len(tasks_for_crew) > 3 else [])
+    progress_tracker = CrewProgressTracker("marketing", task_names, progress_callback)
     try:
-        marketing_crew = Crew(agents=[marketing_content_agent], tasks=tasks_for_crew, process=Process.sequential, verbose=True)
+        marketing_crew = Crew(agents=[marketing_content_agent], tasks=tasks_for_crew, process=Process.sequential, verbose=True,
+                              task_callback=progress_tracker.on_task_completed, step_callback=crew_step_checkpoint)
         logger.info(f"Crew de marketing creado con {len(tasks_for_crew)} tareas.")
     except Exception as e_crew_cr_mk:
         logger.error(f"Error creando Crew de marketing: {e_crew_cr_mk}", exc_info=True)
@@ -130,7 +160,9 @@ def create_marketing_content_crew_and_kickoff(
         logger.info(f"Ejecutando kickoff marketing crew. Inputs iniciales para 1ra tarea: {task_inputs_ideas}")
         # kickoff devuelve el resultado de la ÚLTIMA tarea en un proceso secuencial.
         # Los outputs de tareas intermedias se acceden a través de las instancias de Task.
+        progress_tracker.crew_started()
         crew_kickoff_result = marketing_crew.kickoff(inputs=task_inputs_ideas)
+        progress_tracker.crew_finished()
         logger.info(f"Kickoff Marketing Crew finalizado. El output de la última tarea fue de tipo: {type(crew_kickoff_result)}")
 
         # Extraer los outputs de CADA tarea después del kickoff
@@ -153,8 +185,90 @@ def create_marketing_content_crew_and_kickoff(
 
         return final_crew_output_dict
 
+    except OperationCancelled: raise # No es un error del crew: el backend lo traduce a 499/504
     except Exception as e_kickoff_mk: # CORREGIDO AQUÍ: Usar logger.error
         error_msg = f"Error durante marketing_crew.kickoff(): {type(e_kickoff_mk).__name__} - {e_kickoff_mk}"
         logger.error(f"create_marketing_content_crew: {error_msg}", exc_info=True)
         final_crew_output_dict["error"] = error_msg
-        return final_crew_output_dict
\ No newline at end of file
+        return final_crew_output_dict
+
+def _run_platform_crew(
+    topic: str,
+    platform: str,
+    context: Optional[str],
+    ideas_task: Task,
+    progress_callback: Optional[ProgressCallback],
+) -> Dict[str, Any]:
+    """Post + prompt de imagen para UNA plataforma, reutilizando el output de 'ideas_task'. Corre en su propio hilo."""
+    check_cancelled() # Plataformas aún sin empezar cuando se canceló la petición
+    platform_agent = create_marketing_content_agent()
+    try:
+        write_post_task, suggest_prompt_task = _build_post_and_prompt_tasks(platform_agent, topic, platform, context, ideas_task)
+        progress_tracker = CrewProgressTracker(f"marketing[{platform}]", [f"write_post_task[{platform}]", f"suggest_prompt_task[{platform}]"], progress_callback)
+        platform_crew = Crew(agents=[platform_agent], tasks=[write_post_task, suggest_prompt_task], process=Process.sequential, verbose=True,
+                             task_callback=progress_tracker.on_task_completed, step_callback=crew_step_checkpoint)
+        progress_tracker.crew_started()
+        platform_crew.kickoff(inputs={'topic': topic})
+        progress_tracker.crew_finished()
+        return {
+            "post_text": write_post_task.output.raw_output if write_post_task.output else None,
+            "image_prompt": suggest_prompt_task.output.raw_output if suggest_prompt_task.output else None,
+            "error": None,
+        }
+    except OperationCancelled: raise
+    except Exception as e_platform:
+        error_msg = f"Error durante el crew de '{platform}': {type(e_platform).__name__} - {e_platform}"
+        logger.error(f"create_multiplatform_marketing_content: {error_msg}", exc_info=True)
+        return {"post_text": None, "image_prompt": None, "error": error_msg}
+
+
+def create_multiplatform_marketing_content_and_kickoff(
+    topic: str,
+    platforms: List[str],
+    context: Optional[str] = None,
+    progress_callback: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """
+    Fan-out multi-plataforma: las ideas se generan UNA vez y luego post + prompt de imagen se
+    ejecutan en paralelo (un crew por plataforma). Ahorra (N-1) brainstormings frente a N crews completos.
+    Devuelve {"ideas", "platforms": {plataforma: {"post_text", "image_prompt", "error"}}, "error"}.
+    """
+    logger.info(f"create_multiplatform_marketing_content: Iniciando para '{topic[:30]}' en {platforms}")
+    ideas_agent = create_marketing_content_agent() if create_marketing_content_agent else None
+    error_msg = _check_marketing_agent(ideas_agent)
+    if error_msg:
+        logger.error(f"create_multiplatform_marketing_content: {error_msg}")
+        return {"error": error_msg, "ideas": None, "platforms": {}}
+
+    # --- Fase 1: Ideas (una sola vez) ---
+    task_inputs_ideas = {'topic': topic}
+    if context: task_inputs_ideas['context'] = context
+    try:
+        generate_ideas_task = _build_ideas_task(ideas_agent, topic)
+        progress_tracker = CrewProgressTracker("marketing_ideas", ["generate_ideas_task"], progress_callback)
+        ideas_crew = Crew(agents=[ideas_agent], tasks=[generate_ideas_task], process=Process.sequential, verbose=True,
+                          task_callback=progress_tracker.on_task_completed, step_callback=crew_step_checkpoint)
+        progress_tracker.crew_started()
+        ideas_crew.kickoff(inputs=task_inputs_ideas)
+        progress_tracker.crew_finished()
+    except OperationCancelled: raise
+    except Exception as e_ideas:
+        error_msg = f"Error durante el crew de ideas: {type(e_ideas).__name__} - {e_ideas}"
+        logger.error(f"create_multiplatform_marketing_content: {error_msg}", exc_info=True)
+        return {"error": error_msg, "ideas": None, "platforms": {}}
+    if not generate_ideas_task.output or not generate_ideas_task.output.raw_output:
+        return {"error": "El crew de ideas no produjo resultado.", "ideas": None, "platforms": {}}
+
+    # --- Fase 2: Post + prompt por plataforma, en paralelo ---
+    # Cada hilo corre en una copia del contexto: hereda el token de cancelación de la petición
+    with ThreadPoolExecutor(max_workers=len(platforms), thread_name_prefix="marketing-platform") as executor:
+        futures = {p: executor.submit(contextvars.copy_context().run, _run_platform_crew, topic, p, context, generate_ideas_task, progress_callback) for p in platforms}
+        platform_results = {p: f.result() for p, f in futures.items()}
+
+    failed = [p for p, r in platform_results.items() if r.get("error") or not r.get("post_text")]
+    logger.info(f"create_multiplatform_marketing_content: Finalizado. Plataformas OK: {len(platforms) - len(failed)}/{len(platforms)}")
+    return {
+        "ideas": generate_ideas_task.output.raw_output,
+        "platforms": platform_results,
+        "error": f"Fallaron todas las plataformas: {failed}" if len(failed) == len(platforms) else None,
+    }
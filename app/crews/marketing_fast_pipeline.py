@@ -0,0 +1,114 @@
+# app/crews/marketing_fast_pipeline.py
+# Modo rápido de marketing (mode="fast"): cada tarea del crew de marketing usa exactamente una herramienta, así que
+# aquí se llaman directamente y en orden fijo (ideas -> post -> prompt de imagen), sin los turnos de razonamiento del
+# agente que solo deciden invocarlas. Misma forma de resultado y mismos eventos de progreso que el crew.
+# No importa CrewAI: solo las herramientas (y el decorador @tool de crewai_tools que las envuelve).
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from app.agents_crewai.tools.marketing_tools import generate_marketing_ideas, suggest_image_prompt, write_social_post
+from app.core.cancellation import OperationCancelled, check_cancelled
+from app.crews.progress import CrewProgressTracker, ProgressCallback
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class _StepFailed(Exception):
+    """Una herramienta devolvió error: no lanzan, devuelven un texto que empieza por 'Error'."""
+
+
+def _run_step(tracker: CrewProgressTracker, tool: Any, **kwargs) -> str:
+    """Ejecuta la función original de la herramienta (@tool la guarda en `.func`) y emite 'task_completed' como el crew."""
+    check_cancelled()
+    output = getattr(tool, "func", tool)(**kwargs)
+    check_cancelled() # Cancelada durante la herramienta: 499/504, no un fallo del pipeline
+    if not isinstance(output, str) or not output.strip() or output.lstrip().startswith("Error"):
+        raise _StepFailed(output or f"'{getattr(tool, 'name', tool)}' no devolvió resultado.")
+    tracker.on_task_completed(SimpleNamespace(raw_output=output))
+    return output
+
+
+def _post_context(context: Optional[str], ideas: str) -> str:
+    """El agente del crew lee las ideas como contexto de la tarea del post; aquí van en el contexto de la herramienta."""
+    return "\n\n".join(part for part in (context, f"Ideas de marketing ya generadas (apóyate en la más adecuada para la plataforma):\n{ideas}") if part)
+
+
+def _post_and_prompt(tracker: CrewProgressTracker, topic: str, platform: str, context: Optional[str], ideas: str, result: Dict[str, Any]) -> None:
+    result["post_text"] = _run_step(tracker, write_social_post, topic_or_idea=topic, platform=platform, context=_post_context(context, ideas))
+    result["image_prompt"] = _run_step(tracker, suggest_image_prompt, post_concept_or_text=result["post_text"])
+
+
+def run_marketing_fast_pipeline(
+    topic: str,
+    platform: str,
+    context: Optional[str] = None,
+    progress_callback: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """Equivalente directo de create_marketing_content_crew_and_kickoff: {"ideas", "post_text", "image_prompt", "generated_image_url", "error"}."""
+    logger.info(f"run_marketing_fast_pipeline: Iniciando para '{topic[:30]}' en '{platform}'")
+    tracker = CrewProgressTracker("marketing_fast", ["generate_ideas_task", "write_post_task", "suggest_prompt_task"], progress_callback)
+    result: Dict[str, Any] = {"ideas": None, "post_text": None, "image_prompt": None, "generated_image_url": None, "error": None}
+    tracker.crew_started()
+    try:
+        result["ideas"] = _run_step(tracker, generate_marketing_ideas, topic=topic, context=context)
+        _post_and_prompt(tracker, topic, platform, context, result["ideas"], result)
+    except OperationCancelled: raise
+    except Exception as e:
+        result["error"] = str(e) if isinstance(e, _StepFailed) else f"Error en el pipeline rápido de marketing: {type(e).__name__} - {e}"
+        logger.error(f"run_marketing_fast_pipeline: {result['error']}", exc_info=not isinstance(e, _StepFailed))
+        return result
+    tracker.crew_finished()
+    return result
+
+
+def _run_platform_pipeline(topic: str, platform: str, context: Optional[str], ideas: str, progress_callback: Optional[ProgressCallback]) -> Dict[str, Any]:
+    """Post + prompt de imagen para UNA plataforma. Corre en su propio hilo."""
+    tracker = CrewProgressTracker(f"marketing_fast[{platform}]", [f"write_post_task[{platform}]", f"suggest_prompt_task[{platform}]"], progress_callback)
+    result: Dict[str, Any] = {"post_text": None, "image_prompt": None, "error": None}
+    tracker.crew_started()
+    try:
+        _post_and_prompt(tracker, topic, platform, context, ideas, result)
+    except OperationCancelled: raise
+    except Exception as e:
+        result["error"] = str(e) if isinstance(e, _StepFailed) else f"Error en el pipeline rápido de '{platform}': {type(e).__name__} - {e}"
+        logger.error(f"run_multiplatform_marketing_fast_pipeline: {result['error']}", exc_info=not isinstance(e, _StepFailed))
+        return result
+    tracker.crew_finished()
+    return result
+
+
+def run_multiplatform_marketing_fast_pipeline(
+    topic: str,
+    platforms: List[str],
+    context: Optional[str] = None,
+    progress_callback: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """Equivalente directo de create_multiplatform_marketing_content_and_kickoff: ideas una vez, post + prompt en paralelo."""
+    logger.info(f"run_multiplatform_marketing_fast_pipeline: Iniciando para '{topic[:30]}' en {platforms}")
+    tracker = CrewProgressTracker("marketing_fast_ideas", ["generate_ideas_task"], progress_callback)
+    tracker.crew_started()
+    try:
+        ideas = _run_step(tracker, generate_marketing_ideas, topic=topic, context=context)
+    except OperationCancelled: raise
+    except Exception as e:
+        error_msg = str(e) if isinstance(e, _StepFailed) else f"Error generando ideas: {type(e).__name__} - {e}"
+        logger.error(f"run_multiplatform_marketing_fast_pipeline: {error_msg}")
+        return {"error": error_msg, "ideas": None, "platforms": {}}
+    tracker.crew_finished()
+
+    # Cada hilo corre en una copia del contexto: cancelación, presupuesto, sink de tokens y contabilidad de la petición
+    with ThreadPoolExecutor(max_workers=len(platforms), thread_name_prefix="marketing-fast-platform") as executor:
+        futures = {p: executor.submit(contextvars.copy_context().run, _run_platform_pipeline, topic, p, context, ideas, progress_callback) for p in platforms}
+        platform_results = {p: f.result() for p, f in futures.items()}
+
+    failed = [p for p, r in platform_results.items() if r.get("error") or not r.get("post_text")]
+    logger.info(f"run_multiplatform_marketing_fast_pipeline: Finalizado. Plataformas OK: {len(platforms) - len(failed)}/{len(platforms)}")
+    return {
+        "ideas": ideas,
+        "platforms": platform_results,
+        "error": f"Fallaron todas las plataformas: {failed}" if len(failed) == len(platforms) else None,
+    }
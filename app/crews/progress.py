@@ -0,0 +1,69 @@
+# app/crews/progress.py
+# Eventos de progreso por tarea para los crews secuenciales (usados por los endpoints SSE).
+import logging
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.metrics import CREW_KICKOFF_SECONDS, CREW_TASK_SECONDS
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+def _metric_label(name: str) -> str:
+    """'write_post_task[Instagram]' -> 'write_post_task': la plataforma no debe multiplicar las series de métricas."""
+    return re.sub(r"\[.*?\]", "", name)
+
+# Firma del callback: (nombre_evento, datos) -> None. Se invoca desde el hilo del worker que corre el crew.
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+
+class CrewProgressTracker:
+    """
+    Traduce el `task_callback` de CrewAI en eventos 'task_started'/'task_completed' con tiempos por tarea.
+    CrewAI 0.28 sobrescribe `Task.callback` en kickoff(), por eso se engancha vía `Crew(task_callback=...)`.
+    En un proceso secuencial el fin de la tarea N marca el inicio de la N+1.
+    """
+
+    def __init__(self, crew_name: str, task_names: List[str], progress_callback: Optional[ProgressCallback] = None):
+        self.crew_name = crew_name
+        self.task_names = list(task_names)
+        self.progress_callback = progress_callback
+        self.task_timings: Dict[str, float] = {}
+        self._current_index = 0
+        self._crew_started_at: Optional[float] = None
+        self._task_started_at: Optional[float] = None
+
+    def emit(self, event: str, **data) -> None:
+        if not self.progress_callback: return
+        try:
+            self.progress_callback(event, {"crew": self.crew_name, **data})
+        except Exception as e_cb: # Un consumidor roto no debe tumbar el crew
+            logger.warning(f"CrewProgressTracker ({self.crew_name}): callback de progreso falló en '{event}': {e_cb}")
+
+    def _start_task(self, index: int) -> None:
+        if index >= len(self.task_names): return
+        self._current_index = index
+        self._task_started_at = time.perf_counter()
+        self.emit("task_started", task=self.task_names[index], index=index, total_tasks=len(self.task_names))
+
+    def crew_started(self) -> None:
+        self._crew_started_at = time.perf_counter()
+        self.emit("crew_started", tasks=self.task_names)
+        self._start_task(0)
+
+    def on_task_completed(self, task_output: Any) -> None:
+        """Callback para `Crew(task_callback=...)`. Recibe el TaskOutput de CrewAI."""
+        index = self._current_index
+        task_name = self.task_names[index] if index < len(self.task_names) else f"task_{index}"
+        duration = round(time.perf_counter() - (self._task_started_at or time.perf_counter()), 3)
+        self.task_timings[task_name] = duration
+        CREW_TASK_SECONDS.labels(crew=_metric_label(self.crew_name), task=_metric_label(task_name)).observe(duration)
+        self.emit("task_completed", task=task_name, index=index, duration_s=duration,
+                  output=getattr(task_output, "raw_output", None) or str(task_output))
+        self._start_task(index + 1)
+
+    def crew_finished(self) -> None:
+        total = round(time.perf_counter() - (self._crew_started_at or time.perf_counter()), 3)
+        CREW_KICKOFF_SECONDS.labels(crew=_metric_label(self.crew_name)).observe(total)
+        self.emit("crew_completed", duration_s=total, task_timings=dict(self.task_timings))
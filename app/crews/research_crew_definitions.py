@@ -1,10 +1,20 @@
 # app/crews/research_crew_definitions.py
 from crewai import Task, Crew, Process
 from typing import Optional
+import logging
+from app.crews.progress import CrewProgressTracker, ProgressCallback
+from app.core.cancellation import OperationCancelled, crew_step_checkpoint
+from app.core.chunking import CHARS_PER_TOKEN, count_tokens, split_into_chunks
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+try: from app.core.config import settings
+except ImportError: settings = None
 
 try:
     # Importar AMBOS agentes definidos
-    from app.agents_crewai.crew_agents import researcher_agent, editor_agent
+    from app.agents_crewai.crew_agents import researcher_agent, editor_agent, create_researcher_agent, create_editor_agent
     print("DEBUG research_crew_definitions.py: Importando 'researcher_agent' y 'editor_agent'...")
 
     # Verificaciones rápidas de que los agentes se importaron mínimamente
@@ -25,15 +35,47 @@ except ImportError as e:
      print(f"ERROR CRITICO research_crew_definitions.py: No se pudo importar uno o ambos agentes. Error: {e}")
      researcher_agent = None
      editor_agent = None
+     create_researcher_agent = None
+     create_editor_agent = None
+
+
+def _additional_content_for_task(topic: str, content_to_analyze: str) -> str:
+    """
+    Contenido adicional para la descripción de la tarea: completo si es corto; si no, el informe map-reduce de
+    ContentAnalysisTool sobre el documento entero (antes solo se incluían sus 100 primeros caracteres).
+    """
+    inline_tokens = settings.RESEARCH_INLINE_CONTENT_TOKENS if settings else 1500
+    try: tokens = count_tokens(content_to_analyze)
+    except Exception as e_count: # Sin conteo no se decide nada más: extracto por caracteres, como la descripción truncada de siempre
+        print(f"WARN create_research_crew...: No se pudo contar los tokens del contenido adicional ({type(e_count).__name__}: {e_count}); se usa un extracto.")
+        return f"(Extracto: primeros ~{inline_tokens} tokens)\n{content_to_analyze[:inline_tokens * CHARS_PER_TOKEN]}"
+    if tokens <= inline_tokens: return content_to_analyze
+    try:
+        from app.agents_crewai.tools.research_tools import ContentAnalysisTool
+        analysis = ContentAnalysisTool().analyze(topic, content_to_analyze)
+        if analysis: return f"(Análisis del documento completo de ~{tokens} tokens, procesado por fragmentos)\n{analysis}"
+    except OperationCancelled: raise
+    except Exception as e_analysis:
+        print(f"WARN create_research_crew...: Análisis previo del contenido adicional fallido ({type(e_analysis).__name__}: {e_analysis}); se usa un extracto.")
+    return f"(Extracto: primeros ~{inline_tokens} de ~{tokens} tokens)\n{split_into_chunks(content_to_analyze, inline_tokens)[0]}"
 
 
-def create_research_crew_and_kickoff(topic: str, content_to_analyze: Optional[str] = None) -> Optional[str]:
+def create_research_crew_and_kickoff(
+    topic: str,
+    content_to_analyze: Optional[str] = None,
+    progress_callback: Optional[ProgressCallback] = None,
+) -> Optional[str]:
     """
     Crea y ejecuta el crew SECUENCIAL: Investigador -> Editor.
     Devuelve el informe FINAL EDITADO o un mensaje de error.
+    'progress_callback' (opcional) recibe eventos por tarea; el borrador llega al completar 'research_task'.
     """
     print(f"DEBUG create_research_crew...: Iniciando flujo Investigador->Editor para '{topic[:30]}...'")
 
+    # Agentes propios de esta ejecución: el crew puede correr en paralelo con otros en el pool de workers.
+    researcher_agent = create_researcher_agent() if create_researcher_agent else None
+    editor_agent = create_editor_agent() if create_editor_agent else None
+
     # Verificar que ambos agentes estén disponibles y operativos
     if not researcher_agent or "ERROR" in researcher_agent.role or not researcher_agent.tools:
         error_msg = "Error crítico: Agente Investigador no operativo (sin herramientas o error previo)."
@@ -51,7 +93,9 @@ def create_research_crew_and_kickoff(topic: str, content_to_analyze: Optional[st
              f"1. Realizar una BÚSQUEDA WEB EXHAUSTIVA sobre: '{topic}'. Usa Tavily.",
              "2. Analizar resultados de búsqueda.",
         ]
-        if content_to_analyze: task1_description_parts.append(f"3. Integrar y analizar CONTENIDO ADICIONAL: {content_to_analyze[:100]}...")
+        if content_to_analyze:
+            additional = _additional_content_for_task(topic, content_to_analyze).replace("{", "{{").replace("}", "}}") # CrewAI aplica .format(inputs) a la descripción
+            task1_description_parts.append(f"3. Integrar y analizar CONTENIDO ADICIONAL:\n---\n{additional}\n---")
         else: task1_description_parts.append("3. (Sin contenido adicional proporcionado).")
         task1_description_parts.append("4. Generar un borrador de informe en Markdown con '## Resumen Ejecutivo' y '## Vías de Acción Sugeridas'.")
         
@@ -80,12 +124,14 @@ def create_research_crew_and_kickoff(topic: str, content_to_analyze: Optional[st
         )
         print("DEBUG create_research_crew...: Tarea 2 'editing_task' creada.")
 
+    except OperationCancelled: raise # El análisis previo del contenido adicional comprueba la cancelación
     except Exception as e_task_def:
         error_msg = f"Error definiendo una de las tareas: {e_task_def}"
-        print(f"ERROR create_research_crew...: {error_msg}", exc_info=True)
+        logger.error(f"create_research_crew: {error_msg}", exc_info=True)
         return error_msg
 
     # --- Crear y Ejecutar el Crew con AMBOS Agentes y Tareas ---
+    progress_tracker = CrewProgressTracker("research", ["research_task", "editing_task"], progress_callback)
     try:
         # Incluir ambos agentes y ambas tareas en el crew
         research_crew = Crew(
@@ -93,11 +139,13 @@ def create_research_crew_and_kickoff(topic: str, content_to_analyze: Optional[st
             tasks=[research_task, editing_task],     # Lista de tareas en orden de ejecución
             process=Process.sequential, # ASEGURAR que el proceso es secuencial
             verbose=True, # Mantener True para ver el proceso
+            task_callback=progress_tracker.on_task_completed, # Eventos de progreso por tarea (SSE)
+            step_callback=crew_step_checkpoint, # Cancelación cooperativa: se detiene tras el paso en curso
         )
         print("DEBUG create_research_crew...: Crew SECUENCIAL (Investigador->Editor) creado.")
     except Exception as e_crew_def:
          error_msg = f"Error creando la instancia del Crew con 2 agentes/tareas: {e_crew_def}"
-         print(f"ERROR create_research_crew...: {error_msg}", exc_info=True)
+         logger.error(f"create_research_crew: {error_msg}", exc_info=True)
          return error_msg
 
     # Ejecutar el Crew
@@ -107,12 +155,15 @@ def create_research_crew_and_kickoff(topic: str, content_to_analyze: Optional[st
         crew_inputs = {'topic': topic} # El input inicial es para la primera tarea (investigación)
         # El 'content_to_analyze' está embebido en la descripción de la primera tarea ahora.
         
+        progress_tracker.crew_started()
         crew_final_result = research_crew.kickoff(inputs=crew_inputs)
+        progress_tracker.crew_finished()
         
         print(f"DEBUG create_research_crew...: Kickoff (2 tareas) finalizado.")
+    except OperationCancelled: raise # No es un error del crew: el backend lo traduce a 499/504
     except Exception as e_kickoff_seq:
         error_msg = f"Error durante crew.kickoff() (flujo secuencial): {type(e_kickoff_seq).__name__} - {e_kickoff_seq}"
-        print(f"ERROR create_research_crew...: {error_msg}", exc_info=True)
+        logger.error(f"create_research_crew: {error_msg}", exc_info=True)
         return error_msg
 
     # Devolver el resultado final (que debería ser el output de la Tarea 2: editing_task)
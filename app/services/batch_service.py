@@ -0,0 +1,102 @@
+# app/services/batch_service.py
+# Registro en memoria de lotes (batch) de investigación: estado por ítem y throughput agregado.
+import datetime
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+ITEM_STATUS_PENDING = "pending"
+ITEM_STATUS_RUNNING = "running"
+ITEM_STATUS_COMPLETED = "completed"
+ITEM_STATUS_FAILED = "failed"
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+class BatchService:
+    """Guarda el estado de cada lote y de sus ítems. La ejecución la orquesta el backend (main.py)."""
+
+    def __init__(self, max_batches: int = 100):
+        self.max_batches = max(1, int(max_batches))
+        self._lock = threading.Lock()
+        self._batches: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def create_batch(self, kind: str, topics: List[str], max_concurrency: int) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        batch = {
+            "batch_id": batch_id,
+            "kind": kind,
+            "max_concurrency": max_concurrency,
+            "created_at": _utcnow(),
+            "finished_at": None,
+            "items": [
+                {"index": i, "topic": topic, "status": ITEM_STATUS_PENDING, "started_at": None,
+                 "finished_at": None, "duration_s": None, "result": None, "error_details": None, "error_status_code": None}
+                for i, topic in enumerate(topics)
+            ],
+        }
+        with self._lock:
+            self._batches[batch_id] = batch
+            while len(self._batches) > self.max_batches: # Descartar el lote más antiguo
+                self._batches.popitem(last=False)
+        return batch_id
+
+    def _update_item(self, batch_id: str, index: int, **fields) -> None:
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if not batch: return
+            batch["items"][index].update(fields)
+            if all(it["status"] in (ITEM_STATUS_COMPLETED, ITEM_STATUS_FAILED) for it in batch["items"]):
+                batch["finished_at"] = _utcnow()
+
+    def mark_item_running(self, batch_id: str, index: int) -> None:
+        self._update_item(batch_id, index, status=ITEM_STATUS_RUNNING, started_at=_utcnow())
+
+    def mark_item_finished(self, batch_id: str, index: int, result: Optional[Dict[str, Any]] = None,
+                           error_details: Optional[str] = None, error_status_code: Optional[int] = None) -> None:
+        finished_at = _utcnow()
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            started_at = batch["items"][index]["started_at"] if batch else None
+        self._update_item(
+            batch_id, index,
+            status=ITEM_STATUS_FAILED if error_details else ITEM_STATUS_COMPLETED,
+            finished_at=finished_at,
+            duration_s=round((finished_at - started_at).total_seconds(), 3) if started_at else None,
+            result=result, error_details=error_details, error_status_code=error_status_code,
+        )
+
+    def get_batch(self, batch_id: str, include_results: bool = True) -> Optional[Dict[str, Any]]:
+        """Devuelve una copia serializable del lote con contadores y throughput (temas/minuto)."""
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if not batch: return None
+            items = [dict(it) for it in batch["items"]]
+            created_at, finished_at = batch["created_at"], batch["finished_at"]
+            summary = {k: batch[k] for k in ("batch_id", "kind", "max_concurrency")}
+
+        counts = {s: sum(1 for it in items if it["status"] == s)
+                  for s in (ITEM_STATUS_PENDING, ITEM_STATUS_RUNNING, ITEM_STATUS_COMPLETED, ITEM_STATUS_FAILED)}
+        elapsed = ((finished_at or _utcnow()) - created_at).total_seconds()
+        done = counts[ITEM_STATUS_COMPLETED] + counts[ITEM_STATUS_FAILED]
+        for it in items:
+            if not include_results: it["result"] = None
+            for key in ("started_at", "finished_at"):
+                if it[key]: it[key] = it[key].isoformat()
+        return {
+            **summary,
+            "status": "completed" if finished_at else "running",
+            "created_at": created_at.isoformat(),
+            "finished_at": finished_at.isoformat() if finished_at else None,
+            "total_items": len(items),
+            "pending_items": counts[ITEM_STATUS_PENDING],
+            "running_items": counts[ITEM_STATUS_RUNNING],
+            "completed_items": counts[ITEM_STATUS_COMPLETED],
+            "failed_items": counts[ITEM_STATUS_FAILED],
+            "elapsed_s": round(elapsed, 3),
+            "throughput_topics_per_minute": round(done / (elapsed / 60.0), 3) if elapsed > 0 and done else 0.0,
+            "items": items,
+        }
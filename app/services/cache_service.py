@@ -0,0 +1,105 @@
+# app/services/cache_service.py
+# Caché persistente clave -> JSON sobre SQLite (stdlib), con TTL y desalojo LRU por número de entradas.
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.core.metrics import CACHE_EVENTS_TOTAL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class SQLiteCache:
+    """
+    Caché en un fichero SQLite (modo WAL: seguro entre hilos y entre workers de uvicorn).
+    - TTL por entrada (`ttl_seconds` por defecto, sobrescribible en `set`).
+    - LRU: al superar `max_entries` se eliminan las entradas con acceso más antiguo.
+    Los valores se guardan como JSON; `get` devuelve el objeto deserializado o None (miss/expirado).
+    """
+
+    def __init__(self, name: str, db_path: str, ttl_seconds: float, max_entries: int):
+        self.name = name
+        self.db_path = db_path
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries(last_access)")
+        logger.info(f"SQLiteCache '{name}': abierta en '{db_path}' (TTL {self.ttl_seconds:.0f}s, máx. {self.max_entries} entradas).")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Devuelve {'value', 'created_at'} o None. Una lectura con acierto refresca la posición LRU."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at, expires_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                CACHE_EVENTS_TOTAL.labels(cache=self.name, result="miss").inc()
+                return None
+            value, created_at, expires_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                self.expirations += 1
+                self.misses += 1
+                CACHE_EVENTS_TOTAL.labels(cache=self.name, result="miss").inc()
+                return None
+            self._conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        CACHE_EVENTS_TOTAL.labels(cache=self.name, result="hit").inc()
+        return {"value": json.loads(value), "created_at": created_at}
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else float(ttl_seconds))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, created_at, last_access, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, now, now, expires_at),
+            )
+            self._evict_locked(now)
+
+    def _evict_locked(self, now: float) -> None:
+        """Purga expirados y, si aún se excede el tamaño, los menos usados recientemente (llamar con _lock)."""
+        self.expirations += self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,)).rowcount
+        excess = self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_entries ORDER BY last_access ASC LIMIT ?)", (excess,)
+            )
+            self.evictions += excess
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
@@ -1,8 +1,7 @@
 # app/services/gdrive_service.py
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+# Las librerías de Google se importan al instanciar/subir (no al importar el módulo): arranque rápido de la API
 from app.core.config import settings # Importa la instancia 'settings'
+from app.core.metrics import EXTERNAL_CALL_SECONDS, timed
 import os
 
 class GDriveService:
@@ -17,6 +16,11 @@ class GDriveService:
         print(f"DEBUG GDriveService init: Project root = {self.project_root}")
         print(f"DEBUG GDriveService init: Credentials path from env = {self.credentials_path_from_env}")
 
+        # Endpoint alternativo (stub local de benchmarks): sin credenciales reales
+        if settings.GDRIVE_API_ENDPOINT:
+            self._init_with_endpoint(settings.GDRIVE_API_ENDPOINT)
+            return
+
         # Validar si los paths de credenciales son Nones o vacíos primero
         if not self.credentials_path_from_env:
             self.initialization_error = "La ruta a las credenciales de Google Drive (GOOGLE_APPLICATION_CREDENTIALS) no está configurada en .env."
@@ -47,6 +51,8 @@ class GDriveService:
             return
 
         try:
+            from google.oauth2.service_account import Credentials
+            from googleapiclient.discovery import build
             self.creds = Credentials.from_service_account_file(
                 self.absolute_credentials_path, # Usar la ruta absoluta
                 scopes=['https://www.googleapis.com/auth/drive.file']
@@ -58,6 +64,26 @@ class GDriveService:
             print(f"ERROR GDriveService: {self.initialization_error}")
             # self.service permanece None
 
+    def _init_with_endpoint(self, endpoint: str):
+        """Construye el cliente contra `endpoint` con credenciales anónimas. Se reescribe el rootUrl del documento
+        de discovery (no solo api_endpoint) para que también las subidas de medios vayan al endpoint."""
+        self.folder_id = self.folder_id or "benchmark-folder"
+        try:
+            import json
+            from google.auth.credentials import AnonymousCredentials
+            from googleapiclient.discovery import build_from_document
+            from googleapiclient.discovery_cache import get_static_doc
+            discovery_doc = json.loads(get_static_doc('drive', 'v3'))
+            root_url = endpoint.rstrip('/') + '/'
+            discovery_doc['rootUrl'] = root_url
+            discovery_doc['baseUrl'] = root_url + discovery_doc['servicePath']
+            self.service = build_from_document(discovery_doc, credentials=AnonymousCredentials())
+            print(f"INFO GDriveService: Servicio de Google Drive inicializado contra endpoint alternativo '{endpoint}'.")
+        except Exception as e:
+            self.initialization_error = f"Error al inicializar Google Drive Service contra '{endpoint}': {e}"
+            print(f"ERROR GDriveService: {self.initialization_error}")
+
+    @timed(EXTERNAL_CALL_SECONDS, error_component="gdrive", is_error=lambda res: bool(res.get("error")), service="gdrive", operation="upload_text_as_md")
     def upload_text_as_md(self, content: str, filename_on_drive: str) -> dict:
         if not self.service:
             error_msg = f"El servicio de Google Drive no está inicializado. Error durante init: {self.initialization_error or 'Desconocido'}"
@@ -74,6 +100,7 @@ class GDriveService:
         local_filepath = os.path.join(local_temp_dir, f"temp_{filename_on_drive}")
 
         try:
+            from googleapiclient.http import MediaFileUpload
             with open(local_filepath, "w", encoding="utf-8") as f:
                 f.write(content)
 
@@ -0,0 +1,182 @@
+# app/services/job_service.py
+# Pool acotado de workers para ejecutar los crews (bloqueantes) fuera del event loop de FastAPI.
+import asyncio
+import datetime
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_COMPLETED = "completed"
+JOB_STATUS_FAILED = "failed"
+
+
+class JobService:
+    """
+    Ejecuta funciones bloqueantes (crews) en un ThreadPoolExecutor de tamaño fijo.
+    - `submit()`: registra un job asíncrono consultable por id (API de jobs).
+    - `run_async()`: ejecuta en el pool y devuelve un awaitable (endpoints síncronos).
+    Mantiene contadores de profundidad de cola y utilización de workers para dimensionar el pool.
+    """
+
+    def __init__(self, max_workers: int, max_finished_jobs: int = 500):
+        self.max_workers = max(1, int(max_workers))
+        self.max_finished_jobs = max(1, int(max_finished_jobs))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crew-worker")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Contadores (protegidos por _lock)
+        self._queued = 0
+        self._running = 0
+        self._submitted_total = 0
+        self._completed_total = 0
+        self._failed_total = 0
+        self._busy_seconds_total = 0.0
+        self._started_at = datetime.datetime.utcnow()
+        logger.info(f"JobService: Pool de crews inicializado con {self.max_workers} workers.")
+
+    # --- Ejecución ---
+    def _dispatch(self, func: Callable[..., Any], *args, **kwargs) -> Future:
+        """Encola `func` en el pool actualizando los contadores de cola/ejecución."""
+        with self._lock:
+            self._queued += 1
+            self._submitted_total += 1
+
+        def _wrapped():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            started = datetime.datetime.utcnow()
+            ok = False
+            try:
+                result = func(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                elapsed = (datetime.datetime.utcnow() - started).total_seconds()
+                with self._lock:
+                    self._running -= 1
+                    self._busy_seconds_total += elapsed
+                    if ok: self._completed_total += 1
+                    else: self._failed_total += 1
+
+        return self.executor.submit(_wrapped)
+
+    def run_async(self, func: Callable[..., Any], *args, **kwargs) -> "asyncio.Future":
+        """Ejecuta `func` en el pool y devuelve un awaitable para el event loop actual."""
+        return asyncio.wrap_future(self._dispatch(func, *args, **kwargs))
+
+    def submit(self, kind: str, func: Callable[..., Any], *args, **kwargs) -> str:
+        """Registra un job y lo encola. Devuelve el job_id inmediatamente."""
+        job_id = self.create(kind)
+        self.start(job_id, func, *args, **kwargs)
+        return job_id
+
+    def create(self, kind: str) -> str:
+        """Registra un job en estado 'queued' sin encolarlo aún en el pool (p.ej. mientras espera admisión)."""
+        job_id = f"job_{uuid.uuid4().hex}"
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": JOB_STATUS_QUEUED,
+            "created_at": datetime.datetime.utcnow().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error_details": None,
+            "error_status_code": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim_finished_jobs()
+        return job_id
+
+    def start(self, job_id: str, func: Callable[..., Any], *args, **kwargs) -> Future:
+        """Encola en el pool un job creado con `create`. Devuelve el Future del pool."""
+        def _job_runner():
+            self._update_job(job_id, status=JOB_STATUS_RUNNING, started_at=datetime.datetime.utcnow().isoformat())
+            return func(*args, **kwargs)
+
+        future = self._dispatch(_job_runner)
+        future.add_done_callback(lambda f: self._on_job_done(job_id, f))
+        logger.info(f"JobService: Job '{job_id}' encolado.")
+        return future
+
+    def fail(self, job_id: str, error_details: str, error_status_code: int) -> None:
+        """Marca como fallido un job que no llegó a ejecutarse (p.ej. rechazado por admisión)."""
+        now = datetime.datetime.utcnow().isoformat()
+        self._update_job(job_id, status=JOB_STATUS_FAILED, finished_at=now, error_details=error_details, error_status_code=error_status_code)
+        logger.error(f"JobService: Job '{job_id}' falló sin ejecutarse: {error_details}")
+
+    def complete(self, kind: str, result: Any) -> str:
+        """Registra un job ya terminado con `result` (p.ej. acierto de caché) sin ocupar un worker."""
+        job_id = f"job_{uuid.uuid4().hex}"
+        now = datetime.datetime.utcnow().isoformat()
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id, "kind": kind, "status": JOB_STATUS_COMPLETED,
+                "created_at": now, "started_at": now, "finished_at": now,
+                "result": result.model_dump() if hasattr(result, "model_dump") else result,
+                "error_details": None, "error_status_code": None,
+            }
+            self._trim_finished_jobs()
+        return job_id
+
+    def _on_job_done(self, job_id: str, future: Future) -> None:
+        finished_at = datetime.datetime.utcnow().isoformat()
+        exc = future.exception()
+        if exc is None:
+            result = future.result()
+            if hasattr(result, "model_dump"): result = result.model_dump()
+            self._update_job(job_id, status=JOB_STATUS_COMPLETED, finished_at=finished_at, result=result)
+            logger.info(f"JobService: Job '{job_id}' completado.")
+        else:
+            # HTTPException expone 'detail' y 'status_code'; el resto se reporta como error interno.
+            detail = getattr(exc, "detail", None) or f"{type(exc).__name__}: {exc}"
+            self._update_job(job_id, status=JOB_STATUS_FAILED, finished_at=finished_at,
+                             error_details=str(detail), error_status_code=getattr(exc, "status_code", 500))
+            logger.error(f"JobService: Job '{job_id}' falló: {detail}")
+
+    # --- Consulta ---
+    def _update_job(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None: job.update(fields)
+
+    def _trim_finished_jobs(self) -> None:
+        """Descarta los jobs terminados más antiguos si se supera la retención (llamar con _lock)."""
+        excess = len(self._jobs) - self.max_finished_jobs
+        if excess <= 0: return
+        for old_id in [jid for jid, j in self._jobs.items() if j["status"] in (JOB_STATUS_COMPLETED, JOB_STATUS_FAILED)][:excess]:
+            del self._jobs[old_id]
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            uptime = max((datetime.datetime.utcnow() - self._started_at).total_seconds(), 1e-9)
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "worker_utilization": round(self._running / self.max_workers, 3),
+                "avg_worker_utilization": round(min(self._busy_seconds_total / (uptime * self.max_workers), 1.0), 3),
+                "submitted_total": self._submitted_total,
+                "completed_total": self._completed_total,
+                "failed_total": self._failed_total,
+                "tracked_jobs": len(self._jobs),
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info("JobService: Pool de crews detenido.")
@@ -1,15 +1,16 @@
 # app/services/persistence_service.py
-import chromadb
-from chromadb.utils import embedding_functions # <--- AÑADIDO PARA DefaultEmbeddingFunction
+# chromadb (y el modelo de embeddings) se importan al instanciar el servicio, no al importar el módulo
 from app.core.config import settings
+from app.core.metrics import EXTERNAL_CALL_SECONDS, timed
 import os
 import uuid
 import datetime # Importar datetime para el timestamp
-from typing import Optional, List # <--- LÍNEA CLAVE
+from typing import Optional, List, Tuple # <--- LÍNEA CLAVE
 
 class PersistenceService:
     def __init__(self):
         self.collection = None
+        self.embedding_function = None
         self.initialization_error = None
 
         self.project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -23,13 +24,16 @@ class PersistenceService:
         
         print(f"DEBUG PersistenceService init: Absolute DB path = {self.absolute_db_path}")
 
+        self.collection_name = "research_intelligence_v2" # Cambiado el nombre para forzar nueva colección si la v1 tuvo problemas
         try:
+            import chromadb
+            from chromadb.utils import embedding_functions # <--- AÑADIDO PARA DefaultEmbeddingFunction
             self.client = chromadb.PersistentClient(path=self.absolute_db_path)
-            self.collection_name = "research_intelligence_v2" # Cambiado el nombre para forzar nueva colección si la v1 tuvo problemas
 
             # Usar explícitamente la función de embedding por defecto de ChromaDB
             # sentence-transformers/all-MiniLM-L6-v2 por defecto
             default_ef = embedding_functions.DefaultEmbeddingFunction()
+            self.embedding_function = default_ef # También para la caché semántica de marketing (embed_texts)
             
             self.collection = self.client.get_or_create_collection(
                 name=self.collection_name,
@@ -42,13 +46,29 @@ class PersistenceService:
             print(f"ERROR PersistenceService: {self.initialization_error}")
             # self.collection permanece None
 
-    def add_research_document(self, topic: str, summary: str, gdrive_id: str, gdrive_link: str, content_preview: str = "") -> Optional[str]:
+    @timed(EXTERNAL_CALL_SECONDS, error_component="chroma", is_error=lambda doc_id: doc_id is None, service="chroma", operation="add_research_document")
+    def add_research_document(self, topic: str, summary: str, gdrive_id: str, gdrive_link: str, content_preview: str = "", doc_id: Optional[str] = None) -> Optional[str]:
         if not self.collection:
             error_msg = f"Colección ChromaDB ('{self.collection_name}') no inicializada. Error de init: {self.initialization_error or 'Desconocido'}"
             print(f"ERROR PersistenceService add_research_document: {error_msg}")
             return None
         
-        doc_id = f"research_{uuid.uuid4()}"
+        doc_id, document_to_embed, metadata = self._build_record(topic, summary, gdrive_id, gdrive_link, content_preview, doc_id)
+        try:
+            self.collection.add(
+                documents=[document_to_embed],
+                metadatas=[metadata],
+                ids=[doc_id]
+            )
+            print(f"INFO PersistenceService: Documento '{doc_id}' (Tema: {topic[:30]}...) añadido a ChromaDB.")
+            return doc_id
+        except Exception as e:
+            print(f"ERROR PersistenceService: Error añadiendo documento '{doc_id}' a ChromaDB: {type(e).__name__} - {e}")
+            return None
+
+    @staticmethod
+    def _build_record(topic: str, summary: str, gdrive_id: str, gdrive_link: str, content_preview: str = "", doc_id: Optional[str] = None) -> Tuple[str, str, dict]:
+        doc_id = doc_id or f"research_{uuid.uuid4()}" # El llamador puede fijarlo de antemano (p.ej. para excluirlo de su propia búsqueda)
         document_to_embed = f"Tema: {topic}\nResumen: {summary}"
         if content_preview:
             document_to_embed += f"\nContexto original (extracto): {content_preview[:500]}..."
@@ -61,19 +81,28 @@ class PersistenceService:
             "type": "research_summary",
             "timestamp_utc": datetime.datetime.utcnow().isoformat() # Usar UTC para consistencia
         }
-        
+        return doc_id, document_to_embed, metadata
+
+    @timed(EXTERNAL_CALL_SECONDS, error_component="chroma", is_error=lambda ids: not all(ids), service="chroma", operation="add_research_documents")
+    def add_research_documents(self, documents: List[dict]) -> List[Optional[str]]:
+        """Inserta varios documentos (kwargs de `add_research_document`) en una sola llamada: los embeddings se calculan en lote."""
+        if not self.collection or not documents:
+            if documents: print(f"ERROR PersistenceService add_research_documents: Colección no inicializada ({self.initialization_error or 'Desconocido'}).")
+            return [None] * len(documents)
+        records = [self._build_record(**doc) for doc in documents]
         try:
             self.collection.add(
-                documents=[document_to_embed],
-                metadatas=[metadata],
-                ids=[doc_id]
+                documents=[r[1] for r in records],
+                metadatas=[r[2] for r in records],
+                ids=[r[0] for r in records]
             )
-            print(f"INFO PersistenceService: Documento '{doc_id}' (Tema: {topic[:30]}...) añadido a ChromaDB.")
-            return doc_id
+            print(f"INFO PersistenceService: {len(records)} documentos añadidos a ChromaDB en lote.")
+            return [r[0] for r in records]
         except Exception as e:
-            print(f"ERROR PersistenceService: Error añadiendo documento '{doc_id}' a ChromaDB: {type(e).__name__} - {e}", exc_info=True)
-            return None
+            print(f"ERROR PersistenceService: Error añadiendo lote de {len(records)} documentos a ChromaDB: {type(e).__name__} - {e}")
+            return [None] * len(records)
 
+    @timed(EXTERNAL_CALL_SECONDS, error_component="chroma", service="chroma", operation="query_similar_research")
     def query_similar_research(self, query_text: str, n_results: int = 3, where_filter: Optional[dict] = None) -> List[dict]:
         if not self.collection:
             error_msg = f"Colección ChromaDB ('{self.collection_name}') no inicializada. Error de init: {self.initialization_error or 'Desconocido'}"
@@ -86,30 +115,62 @@ class PersistenceService:
                 where=where_filter,
                 include=['metadatas', 'documents', 'distances']
             )
-            
-            processed_results = []
-            ids_list = results.get('ids', [[]])[0] # [[id1, id2]] -> [id1, id2]
-            docs_list = results.get('documents', [[]])[0]
-            metas_list = results.get('metadatas', [[]])[0]
-            dists_list = results.get('distances', [[]])[0]
-
-            if ids_list:
-                for i in range(len(ids_list)):
-                    distance_val = dists_list[i] if dists_list and i < len(dists_list) else None
-                    similarity_score_val = (1 - distance_val) if distance_val is not None else None
-                    
-                    processed_results.append({
-                        "id": ids_list[i],
-                        "document_stored": docs_list[i] if docs_list and i < len(docs_list) else None,
-                        "metadata": metas_list[i] if metas_list and i < len(metas_list) else None,
-                        "distance": distance_val,
-                        "similarity_score": similarity_score_val,
-                    })
-            return processed_results
+            return self._process_query_results(results, 0)
         except Exception as e:
-            print(f"ERROR PersistenceService: Error consultando ChromaDB con texto '{query_text[:50]}...': {type(e).__name__} - {e}", exc_info=True)
+            print(f"ERROR PersistenceService: Error consultando ChromaDB con texto '{query_text[:50]}...': {type(e).__name__} - {e}")
             return []
 
+    @timed(EXTERNAL_CALL_SECONDS, error_component="chroma", service="chroma", operation="query_similar_research_batch")
+    def query_similar_research_batch(self, query_texts: List[str], n_results: int = 3, where_filter: Optional[dict] = None) -> List[List[dict]]:
+        """Varias consultas con los mismos parámetros en una sola llamada (embeddings de las consultas en lote)."""
+        if not self.collection or not query_texts:
+            return [[] for _ in query_texts]
+        try:
+            results = self.collection.query(
+                query_texts=query_texts,
+                n_results=n_results,
+                where=where_filter,
+                include=['metadatas', 'documents', 'distances']
+            )
+            return [self._process_query_results(results, i) for i in range(len(query_texts))]
+        except Exception as e:
+            print(f"ERROR PersistenceService: Error consultando ChromaDB en lote ({len(query_texts)} consultas): {type(e).__name__} - {e}")
+            return [[] for _ in query_texts]
+
+    @timed(EXTERNAL_CALL_SECONDS, error_component="chroma", is_error=lambda vectors: not vectors, service="chroma", operation="embed_texts")
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings con la misma función que la colección (lista vacía si el servicio no está inicializado o falla)."""
+        if not self.embedding_function or not texts: return []
+        try:
+            return [[float(x) for x in vector] for vector in self.embedding_function(list(texts))]
+        except Exception as e:
+            print(f"ERROR PersistenceService: Error calculando embeddings ({len(texts)} textos): {type(e).__name__} - {e}")
+            return []
+
+    @staticmethod
+    def _process_query_results(results: dict, index: int) -> List[dict]:
+        """Convierte el resultado de `collection.query` para la consulta `index` en la lista de dicts que usa la API."""
+        def _column(name):
+            column = results.get(name) or []
+            return column[index] if index < len(column) and column[index] is not None else []
+        processed_results = []
+        ids_list = _column('ids') # [[id1, id2]] -> [id1, id2]
+        docs_list = _column('documents')
+        metas_list = _column('metadatas')
+        dists_list = _column('distances')
+        for i in range(len(ids_list)):
+            distance_val = dists_list[i] if dists_list and i < len(dists_list) else None
+            similarity_score_val = (1 - distance_val) if distance_val is not None else None
+
+            processed_results.append({
+                "id": ids_list[i],
+                "document_stored": docs_list[i] if docs_list and i < len(docs_list) else None,
+                "metadata": metas_list[i] if metas_list and i < len(metas_list) else None,
+                "distance": distance_val,
+                "similarity_score": similarity_score_val,
+            })
+        return processed_results
+
 # --- Bloque de prueba para ejecución directa (python -m app.services.persistence_service) ---
 if __name__ == '__main__':
     print("DEBUG PersistenceService: Ejecutando prueba de PersistenceService (main block)...")
@@ -0,0 +1,110 @@
+# app/services/remote_persistence_service.py
+# Cliente HTTP del servidor de persistencia (PERSISTENCE_MODE=remote): misma interfaz que PersistenceService,
+# sin cargar ChromaDB ni el modelo de embeddings en el worker de la API.
+# Si el servidor aún no está listo (p. ej. cargando ChromaDB) `collection` vuelve a sondear /health con backoff.
+from app.core.config import settings
+from app.core.metrics import EXTERNAL_CALL_SECONDS, timed
+from typing import Optional, List
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HEALTH_RETRY_BASE_SECONDS = 1.0
+HEALTH_RETRY_MAX_SECONDS = 60.0
+
+
+class RemotePersistenceService:
+    def __init__(self, base_url: Optional[str] = None, timeout: Optional[float] = None):
+        self.base_url = (base_url or (settings.PERSISTENCE_SERVER_URL if settings else "http://127.0.0.1:8100")).rstrip("/")
+        self.timeout = timeout or (settings.PERSISTENCE_SERVER_TIMEOUT_SECONDS if settings else 30.0)
+        # `collection` imita a PersistenceService: truthy (nombre de la colección remota) si el servidor está listo.
+        self._collection = None
+        self.collection_name = None
+        self.initialization_error = None
+        self._health_lock = threading.Lock()
+        self._probing = False
+        self._probe_failures = 0
+        self._next_probe_at = 0.0 # monotonic
+
+        # Conexiones keep-alive reutilizadas por todos los hilos (workers de crew, write-behind, memoria)
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=16))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=16))
+
+        self._probe_health()
+
+    @property
+    def collection(self):
+        """Si el servidor no estaba listo, re-sondea /health en segundo plano (sin bloquear a quien pregunta) con backoff."""
+        if self._collection is None and time.monotonic() >= self._next_probe_at:
+            with self._health_lock:
+                start = not self._probing and self._collection is None
+                if start: self._probing = True
+            if start: threading.Thread(target=self._probe_health, name="persistence-health-probe", daemon=True).start()
+        return self._collection
+
+    def _probe_health(self) -> None:
+        try:
+            response = self.session.get(f"{self.base_url}/health", timeout=min(self.timeout, 5.0))
+            response.raise_for_status()
+            health = response.json()
+            if health.get("ready"):
+                self.collection_name = health.get("collection")
+                self.initialization_error = None
+                self._collection = self.collection_name
+                print(f"INFO RemotePersistenceService: Conectado al servidor de persistencia '{self.base_url}' (colección '{self.collection_name}').")
+            else:
+                self.initialization_error = f"Servidor de persistencia '{self.base_url}' no listo: {health.get('error')}"
+        except Exception as e:
+            self.initialization_error = f"No se pudo conectar con el servidor de persistencia '{self.base_url}': {type(e).__name__} - {e}"
+        finally:
+            with self._health_lock:
+                self._probing = False
+                if self._collection is None:
+                    delay = min(HEALTH_RETRY_MAX_SECONDS, HEALTH_RETRY_BASE_SECONDS * 2 ** self._probe_failures)
+                    self._probe_failures += 1
+                    self._next_probe_at = time.monotonic() + delay
+                    print(f"ERROR RemotePersistenceService: {self.initialization_error} (nuevo intento en {delay:.0f}s).")
+
+    def _post(self, path: str, payload: dict) -> dict:
+        response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    @timed(EXTERNAL_CALL_SECONDS, error_component="persistence_server", is_error=lambda doc_id: doc_id is None, service="persistence_server", operation="add_research_document")
+    def add_research_document(self, topic: str, summary: str, gdrive_id: str, gdrive_link: str, content_preview: str = "", doc_id: Optional[str] = None) -> Optional[str]:
+        return self.add_research_documents([{
+            "topic": topic, "summary": summary, "gdrive_id": gdrive_id, "gdrive_link": gdrive_link,
+            "content_preview": content_preview, "doc_id": doc_id,
+        }])[0]
+
+    def add_research_documents(self, documents: List[dict]) -> List[Optional[str]]:
+        if not documents: return []
+        try:
+            return self._post("/documents", {"documents": documents})["ids"]
+        except Exception as e:
+            print(f"ERROR RemotePersistenceService: Error añadiendo {len(documents)} documento(s): {type(e).__name__} - {e}")
+            return [None] * len(documents)
+
+    @timed(EXTERNAL_CALL_SECONDS, error_component="persistence_server", service="persistence_server", operation="query_similar_research")
+    def query_similar_research(self, query_text: str, n_results: int = 3, where_filter: Optional[dict] = None) -> List[dict]:
+        return self.query_similar_research_batch([query_text], n_results=n_results, where_filter=where_filter)[0]
+
+    def query_similar_research_batch(self, query_texts: List[str], n_results: int = 3, where_filter: Optional[dict] = None) -> List[List[dict]]:
+        if not query_texts: return []
+        try:
+            return self._post("/query", {"query_texts": query_texts, "n_results": n_results, "where_filter": where_filter})["results"]
+        except Exception as e:
+            print(f"ERROR RemotePersistenceService: Error consultando ({len(query_texts)} consulta(s)): {type(e).__name__} - {e}")
+            return [[] for _ in query_texts]
+
+    @timed(EXTERNAL_CALL_SECONDS, error_component="persistence_server", is_error=lambda vectors: not vectors, service="persistence_server", operation="embed_texts")
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        if not texts: return []
+        try:
+            return self._post("/embed", {"texts": texts})["embeddings"]
+        except Exception as e:
+            print(f"ERROR RemotePersistenceService: Error calculando embeddings ({len(texts)} textos): {type(e).__name__} - {e}")
+            return []
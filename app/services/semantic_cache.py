@@ -0,0 +1,149 @@
+# app/services/semantic_cache.py
+# Caché semántica sobre SQLite: cada entrada guarda el embedding de su texto y una búsqueda devuelve la entrada
+# más parecida (similitud coseno) si supera el umbral. Los embeddings los calcula quien la crea (`embed_fn`),
+# p. ej. la misma función de embeddings de ChromaDB que usa PersistenceService.
+import importlib.util
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.core.metrics import CACHE_EVENTS_TOTAL
+
+NUMPY_INSTALLED = importlib.util.find_spec("numpy") is not None # Llega con chromadb; sin él, producto escalar en Python puro
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _normalized(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class SemanticCache:
+    """
+    Entradas agrupadas por `namespace` (solo se comparan textos del mismo namespace; p. ej. mismas plataformas).
+    - `lookup(namespace, text)`: {'value', 'created_at', 'similarity'} de la entrada más parecida con similitud >= `threshold`, o None.
+    - `store(namespace, text, value)`: guarda el valor (JSON) con el embedding normalizado del texto.
+    TTL por entrada y desalojo LRU por encima de `max_entries`, como SQLiteCache. Si `embed_fn` falla o devuelve
+    vacío, la consulta cuenta como miss y la escritura se omite: la caché nunca rompe la petición.
+    """
+
+    def __init__(self, name: str, db_path: str, embed_fn: Callable[[List[str]], List[List[float]]],
+                 threshold: float, ttl_seconds: float, max_entries: int):
+        self.name = name
+        self.db_path = db_path
+        self.embed_fn = embed_fn
+        self.threshold = float(threshold)
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.embed_errors = 0
+        self.evictions = 0
+        self._hit_similarity_sum = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_entries ("
+            " id TEXT PRIMARY KEY, namespace TEXT NOT NULL, text TEXT NOT NULL, embedding BLOB NOT NULL,"
+            " value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_semantic_namespace ON semantic_entries(namespace)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_semantic_last_access ON semantic_entries(last_access)")
+        logger.info(f"SemanticCache '{name}': abierta en '{db_path}' (umbral {self.threshold}, TTL {self.ttl_seconds:.0f}s, máx. {self.max_entries} entradas).")
+
+    def _embed(self, text: str) -> Optional[List[float]]:
+        try:
+            vectors = self.embed_fn([text])
+            if vectors is not None and len(vectors) and len(vectors[0]): return _normalized([float(x) for x in vectors[0]])
+        except Exception as e:
+            logger.warning(f"SemanticCache '{self.name}': embedding fallido: {type(e).__name__} - {e}")
+        self.embed_errors += 1
+        return None
+
+    @staticmethod
+    def _similarities(query: List[float], blobs: List[bytes]) -> List[float]:
+        if NUMPY_INSTALLED:
+            import numpy as np # En la primera consulta, no al importar el backend
+            matrix = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), -1)
+            return (matrix @ np.asarray(query, dtype=np.float32)).tolist()
+        return [sum(a * b for a, b in zip(query, array("f", blob))) for blob in blobs]
+
+    def _miss(self) -> None:
+        with self._lock: self.misses += 1
+        CACHE_EVENTS_TOTAL.labels(cache=self.name, result="miss").inc()
+
+    def lookup(self, namespace: str, text: str) -> Optional[Dict[str, Any]]:
+        query = self._embed(text)
+        if query is None: self._miss(); return None
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, embedding, value, created_at FROM semantic_entries WHERE namespace = ? AND expires_at > ?",
+                (namespace, now)).fetchall()
+        rows = [r for r in rows if len(r[1]) == 4 * len(query)] # Otro modelo de embeddings: dimensiones distintas
+        if not rows: self._miss(); return None
+        similarities = self._similarities(query, [r[1] for r in rows])
+        best = max(range(len(rows)), key=similarities.__getitem__)
+        if similarities[best] < self.threshold: self._miss(); return None
+        entry_id, _embedding, value, created_at = rows[best]
+        with self._lock:
+            self._conn.execute("UPDATE semantic_entries SET last_access = ? WHERE id = ?", (now, entry_id))
+            self.hits += 1
+            self._hit_similarity_sum += similarities[best]
+        CACHE_EVENTS_TOTAL.labels(cache=self.name, result="hit").inc()
+        return {"value": json.loads(value), "created_at": created_at, "similarity": round(similarities[best], 4)}
+
+    def store(self, namespace: str, text: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        vector = self._embed(text)
+        if vector is None: return False
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else float(ttl_seconds))
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        with self._lock:
+            # El mismo texto exacto sustituye a su entrada anterior en vez de duplicarla
+            self._conn.execute("DELETE FROM semantic_entries WHERE namespace = ? AND text = ?", (namespace, text))
+            self._conn.execute(
+                "INSERT INTO semantic_entries (id, namespace, text, embedding, value, created_at, last_access, expires_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, namespace, text, array("f", vector).tobytes(), payload, now, now, expires_at),
+            )
+            self._evict_locked(now)
+        return True
+
+    def _evict_locked(self, now: float) -> None:
+        """Purga expirados y, si aún se excede el tamaño, los menos usados recientemente (llamar con _lock)."""
+        self._conn.execute("DELETE FROM semantic_entries WHERE expires_at <= ?", (now,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM semantic_entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM semantic_entries WHERE id IN (SELECT id FROM semantic_entries ORDER BY last_access ASC LIMIT ?)", (excess,)
+            )
+            self.evictions += excess
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM semantic_entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "avg_hit_similarity": round(self._hit_similarity_sum / self.hits, 4) if self.hits else None,
+            "embed_errors": self.embed_errors,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,104 @@
+# app/services/usage_ledger.py
+# Ledger local (SQLite) de tokens y coste estimado por petición y etapa, para agregarlo por día y ver qué etapa
+# conviene optimizar primero. Una fila por (petición, etapa); las peticiones de investigación se cruzan con su
+# documento en ChromaDB por `ref` (= doc_id).
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+_SUM_FIELDS = ("llm_calls", "cache_hits", "prompt_tokens", "completion_tokens", "estimated_cost_usd")
+
+
+class UsageLedger:
+    """`record` desde los hilos worker al terminar cada petición (también si falla: los tokens se gastaron igual)."""
+
+    def __init__(self, db_path: str, retention_days: int = 90):
+        self.db_path = db_path
+        self.retention_days = max(1, int(retention_days))
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.errors = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage_entries ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, day TEXT NOT NULL, kind TEXT NOT NULL,"
+            " ref TEXT NOT NULL, topic TEXT, status TEXT NOT NULL, stage TEXT NOT NULL, models TEXT NOT NULL,"
+            " llm_calls INTEGER NOT NULL, cache_hits INTEGER NOT NULL, prompt_tokens INTEGER NOT NULL,"
+            " completion_tokens INTEGER NOT NULL, estimated_cost_usd REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_day ON usage_entries(day)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_ref ON usage_entries(ref)")
+        cutoff = (datetime.datetime.utcnow() - datetime.timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        purged = self._conn.execute("DELETE FROM usage_entries WHERE day < ?", (cutoff,)).rowcount
+        logger.info(f"UsageLedger: abierto en '{db_path}' (retención {self.retention_days} días, {purged} filas purgadas).")
+
+    def record(self, kind: str, ref: str, summary: Dict[str, Any], topic: Optional[str] = None, status: str = "ok") -> None:
+        """`summary` es RequestUsage.summary(); peticiones sin llamadas al LLM no dejan filas."""
+        now = time.time()
+        day = datetime.datetime.utcfromtimestamp(now).strftime("%Y-%m-%d")
+        rows = [(now, day, kind, ref, (topic or "")[:200], status, stage, json.dumps(s.get("models", [])),
+                 s["llm_calls"], s["cache_hits"], s["prompt_tokens"], s["completion_tokens"], s["estimated_cost_usd"])
+                for stage, s in summary.get("by_stage", {}).items()]
+        if not rows: return
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO usage_entries (created_at, day, kind, ref, topic, status, stage, models, llm_calls, cache_hits,"
+                    " prompt_tokens, completion_tokens, estimated_cost_usd) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+                self.recorded += 1
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                if self._conn.in_transaction: self._conn.execute("ROLLBACK")
+            logger.error(f"UsageLedger: no se pudo registrar '{kind}' {ref}: {e}")
+
+    @staticmethod
+    def _totals(row: sqlite3.Row) -> Dict[str, Any]:
+        totals = {field: row[field] or 0 for field in _SUM_FIELDS}
+        totals["total_tokens"] = totals["prompt_tokens"] + totals["completion_tokens"]
+        totals["estimated_cost_usd"] = round(totals["estimated_cost_usd"], 6)
+        return totals
+
+    def daily(self, days: int = 7, kind: Optional[str] = None) -> Dict[str, Any]:
+        """Totales por día (con desglose por etapa y tipo) de los últimos `days` días y ranking de etapas por coste."""
+        since = (datetime.datetime.utcnow() - datetime.timedelta(days=max(1, days) - 1)).strftime("%Y-%m-%d")
+        where, params = "WHERE day >= ?" + (" AND kind = ?" if kind else ""), [since] + ([kind] if kind else [])
+        sums = ", ".join(f"SUM({field}) AS {field}" for field in _SUM_FIELDS)
+        with self._lock:
+            self._conn.row_factory = sqlite3.Row
+            try:
+                by_day = self._conn.execute(f"SELECT day, COUNT(DISTINCT ref) AS requests, {sums} FROM usage_entries {where} GROUP BY day ORDER BY day", params).fetchall()
+                by_day_stage = self._conn.execute(f"SELECT day, stage, COUNT(DISTINCT ref) AS requests, {sums} FROM usage_entries {where} GROUP BY day, stage", params).fetchall()
+                by_day_kind = self._conn.execute(f"SELECT day, kind, COUNT(DISTINCT ref) AS requests, {sums} FROM usage_entries {where} GROUP BY day, kind", params).fetchall()
+                by_stage = self._conn.execute(f"SELECT stage, COUNT(DISTINCT ref) AS requests, {sums} FROM usage_entries {where} GROUP BY stage", params).fetchall()
+            finally:
+                self._conn.row_factory = None
+        entries: Dict[str, Dict[str, Any]] = {r["day"]: {"day": r["day"], "requests": r["requests"], **self._totals(r), "by_stage": {}, "by_kind": {}} for r in by_day}
+        for r in by_day_stage: entries[r["day"]]["by_stage"][r["stage"]] = {"requests": r["requests"], **self._totals(r)}
+        for r in by_day_kind: entries[r["day"]]["by_kind"][r["kind"]] = {"requests": r["requests"], **self._totals(r)}
+        stages = sorted(({"stage": r["stage"], "requests": r["requests"], **self._totals(r)} for r in by_stage),
+                        key=lambda s: (s["estimated_cost_usd"], s["total_tokens"]), reverse=True)
+        return {"since": since, "kind": kind, "days": list(entries.values()), "stages_by_cost": stages}
+
+    def get_request(self, ref: str) -> List[Dict[str, Any]]:
+        """Filas de una petición (p. ej. el doc_id de un informe en ChromaDB)."""
+        with self._lock:
+            self._conn.row_factory = sqlite3.Row
+            try: rows = self._conn.execute("SELECT * FROM usage_entries WHERE ref = ? ORDER BY id", (ref,)).fetchall()
+            finally: self._conn.row_factory = None
+        return [{**dict(r), "models": json.loads(r["models"])} for r in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"db_path": self.db_path, "retention_days": self.retention_days, "recorded": self.recorded, "errors": self.errors}
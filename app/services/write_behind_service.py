@@ -0,0 +1,205 @@
+# app/services/write_behind_service.py
+# Cola durable (SQLite) de escritura diferida: subida a Google Drive + indexación en ChromaDB fuera del request path.
+import datetime
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.metrics import ERRORS_TOTAL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+TASK_STATUS_PENDING = "pending"
+TASK_STATUS_RUNNING = "running"
+TASK_STATUS_DONE = "done"
+TASK_STATUS_FAILED = "failed"
+
+_TASK_COLUMNS = (
+    "task_id", "topic", "filename", "summary", "doc_id", "status", "attempts", "last_error",
+    "gdrive_id", "gdrive_link", "chroma_doc_id", "gdrive_upload_s", "chroma_insert_s",
+    "created_at", "updated_at", "next_attempt_at",
+)
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.datetime.utcfromtimestamp(ts).isoformat() if ts else None
+
+
+class WriteBehindService:
+    """
+    El endpoint encola el informe terminado (`enqueue`) y responde al instante; `workers` hilos en segundo plano
+    suben el Markdown a Drive e insertan el resumen en ChromaDB, con reintentos y backoff exponencial con jitter.
+    - Durable: las tareas viven en SQLite; al reiniciar se retoman las pendientes y las 'running' cuyo lease expiró
+      (proceso caído a mitad de tarea). Varios workers de uvicorn pueden compartir el mismo fichero.
+    - Idempotente por etapas: si Drive ya respondió, un reintento solo repite la inserción en ChromaDB (mismo doc_id).
+    Los servicios se reciben como getters: Drive/ChromaDB se inicializan (perezosamente) en el hilo worker, no al arrancar.
+    """
+
+    def __init__(self, db_path: str, get_gdrive_svc: Callable[[], Any], get_persistence_svc: Callable[[], Any], workers: int = 2,
+                 max_attempts: int = 5, backoff_seconds: float = 2.0, lease_seconds: float = 600.0,
+                 poll_interval: float = 1.0):
+        self.db_path = db_path
+        self.get_gdrive_svc = get_gdrive_svc
+        self.get_persistence_svc = get_persistence_svc
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_seconds = float(backoff_seconds)
+        self.lease_seconds = float(lease_seconds)
+        self.poll_interval = float(poll_interval)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS persistence_tasks ("
+            " task_id TEXT PRIMARY KEY, topic TEXT NOT NULL, filename TEXT NOT NULL, summary TEXT NOT NULL,"
+            " content TEXT NOT NULL, doc_id TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " last_error TEXT, gdrive_id TEXT, gdrive_link TEXT, chroma_doc_id TEXT,"
+            " gdrive_upload_s REAL, chroma_insert_s REAL,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL, next_attempt_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_persistence_tasks_status ON persistence_tasks(status, next_attempt_at)")
+
+    # --- Ciclo de vida ---
+    def start(self) -> None:
+        if self._threads: return
+        self._stop.clear()
+        counts = self.get_status()["counts"]
+        logger.info(f"WriteBehindService: {counts[TASK_STATUS_PENDING]} pendientes y {counts[TASK_STATUS_RUNNING]} en curso a retomar; "
+                    f"arrancando {self.workers} workers.")
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"write-behind-{i}", daemon=True)
+            t.start(); self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Detiene los workers. Una tarea a medias queda 'running' y se retoma al expirar su lease."""
+        self._stop.set()
+        with self._wakeup: self._wakeup.notify_all()
+        for t in self._threads: t.join(timeout=timeout)
+        self._threads = []
+
+    # --- Encolado ---
+    def enqueue(self, topic: str, content: str, summary: str, filename: str, doc_id: str) -> str:
+        """Persiste la tarea (durable antes de responder al cliente) y despierta a un worker. Devuelve el task_id."""
+        task_id = f"persist_{uuid.uuid4().hex}"
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO persistence_tasks (task_id, topic, filename, summary, content, doc_id, status, created_at, updated_at, next_attempt_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (task_id, topic, filename, summary, content, doc_id, TASK_STATUS_PENDING, now, now, now),
+            )
+        with self._wakeup: self._wakeup.notify()
+        logger.info(f"WriteBehindService: Tarea '{task_id}' encolada (tema: '{topic[:40]}').")
+        return task_id
+
+    # --- Workers ---
+    def _claim_next(self) -> Optional[Dict[str, Any]]:
+        """Reclama atómicamente la siguiente tarea lista (pendiente vencida o 'running' con lease expirado)."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id FROM persistence_tasks WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND updated_at < ?)"
+                " ORDER BY next_attempt_at LIMIT 5",
+                (TASK_STATUS_PENDING, now, TASK_STATUS_RUNNING, now - self.lease_seconds),
+            ).fetchall()
+            for (task_id,) in rows: # Otro proceso puede haberla tomado entre el SELECT y el UPDATE
+                claimed = self._conn.execute(
+                    "UPDATE persistence_tasks SET status = ?, updated_at = ? WHERE task_id = ?"
+                    " AND ((status = ? AND next_attempt_at <= ?) OR (status = ? AND updated_at < ?))",
+                    (TASK_STATUS_RUNNING, now, task_id, TASK_STATUS_PENDING, now, TASK_STATUS_RUNNING, now - self.lease_seconds),
+                ).rowcount
+                if claimed:
+                    cur = self._conn.execute("SELECT * FROM persistence_tasks WHERE task_id = ?", (task_id,))
+                    return dict(zip([c[0] for c in cur.description], cur.fetchone()))
+        return None
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            try: task = self._claim_next()
+            except Exception as e: logger.error(f"WriteBehindService: Error reclamando tarea: {e}", exc_info=True); task = None
+            if task is None:
+                with self._wakeup: self._wakeup.wait(timeout=self.poll_interval)
+                continue
+            self._process(task)
+
+    def _update(self, task_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE persistence_tasks SET {assignments} WHERE task_id = ?", (*fields.values(), task_id))
+
+    def _process(self, task: Dict[str, Any]) -> None:
+        task_id = task["task_id"]
+        try:
+            if not task["gdrive_id"]: # Etapa 1: Drive (se omite en reintentos si ya se subió)
+                gdrive_svc = self.get_gdrive_svc()
+                if not gdrive_svc or not gdrive_svc.service: raise RuntimeError("GDrive: servicio no disponible.")
+                t_stage = time.perf_counter()
+                res = gdrive_svc.upload_text_as_md(task["content"], task["filename"])
+                if res.get("error") or not res.get("id"): raise RuntimeError(f"GDrive: {res.get('error') or 'sin id'}")
+                task["gdrive_id"], task["gdrive_link"] = res["id"], res.get("webViewLink") or ""
+                self._update(task_id, gdrive_id=task["gdrive_id"], gdrive_link=task["gdrive_link"],
+                             gdrive_upload_s=round(time.perf_counter() - t_stage, 3))
+            chroma_doc_id = None
+            persistence_svc = self.get_persistence_svc()
+            if persistence_svc is not None: # Etapa 2: ChromaDB (mismo doc_id en reintentos); sin servicio = memoria desactivada
+                # Caído o sin colección aún (p. ej. servidor remoto cargando): reintento con backoff, no 'done' sin indexar
+                if not persistence_svc.collection: raise RuntimeError(f"ChromaDB: servicio no disponible ({getattr(persistence_svc, 'initialization_error', None) or 'sin colección'}).")
+                t_stage = time.perf_counter()
+                chroma_doc_id = persistence_svc.add_research_document(
+                    topic=task["topic"], summary=task["summary"], gdrive_id=task["gdrive_id"],
+                    gdrive_link=task["gdrive_link"] or "", doc_id=task["doc_id"])
+                if not chroma_doc_id: raise RuntimeError("ChromaDB: inserción fallida.")
+                self._update(task_id, chroma_insert_s=round(time.perf_counter() - t_stage, 3))
+            # Terminada: el contenido completo ya está en Drive, no hace falta conservarlo en la cola
+            self._update(task_id, status=TASK_STATUS_DONE, chroma_doc_id=chroma_doc_id, content="", last_error=None)
+            logger.info(f"WriteBehindService: Tarea '{task_id}' completada (Drive: {task['gdrive_id']}).")
+        except Exception as e:
+            attempts = task["attempts"] + 1
+            ERRORS_TOTAL.labels(component="write_behind").inc()
+            if attempts >= self.max_attempts:
+                self._update(task_id, status=TASK_STATUS_FAILED, attempts=attempts, last_error=str(e))
+                logger.error(f"WriteBehindService: Tarea '{task_id}' fallida definitivamente tras {attempts} intentos: {e}")
+            else:
+                delay = self.backoff_seconds * (2 ** (attempts - 1)) * (0.5 + random.random())
+                self._update(task_id, status=TASK_STATUS_PENDING, attempts=attempts, last_error=str(e), next_attempt_at=time.time() + delay)
+                logger.warning(f"WriteBehindService: Tarea '{task_id}' falló (intento {attempts}/{self.max_attempts}), reintento en {delay:.1f}s: {e}")
+
+    # --- Consulta ---
+    def _row_to_dict(self, row) -> Dict[str, Any]:
+        task = dict(zip(_TASK_COLUMNS, row))
+        for key in ("created_at", "updated_at", "next_attempt_at"): task[key] = _iso(task[key])
+        if task["status"] != TASK_STATUS_PENDING: task["next_attempt_at"] = None
+        return task
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_TASK_COLUMNS)} FROM persistence_tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def get_status(self, limit: int = 20) -> Dict[str, Any]:
+        """Contadores por estado y las tareas pendientes/fallidas más recientes."""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM persistence_tasks GROUP BY status").fetchall())
+            recent = {
+                status: self._conn.execute(
+                    f"SELECT {', '.join(_TASK_COLUMNS)} FROM persistence_tasks WHERE status = ? ORDER BY updated_at DESC LIMIT ?", (status, limit)
+                ).fetchall()
+                for status in (TASK_STATUS_PENDING, TASK_STATUS_FAILED)
+            }
+        return {
+            "workers": len(self._threads),
+            "counts": {s: counts.get(s, 0) for s in (TASK_STATUS_PENDING, TASK_STATUS_RUNNING, TASK_STATUS_DONE, TASK_STATUS_FAILED)},
+            "recent_pending": [self._row_to_dict(r) for r in recent[TASK_STATUS_PENDING]],
+            "recent_failed": [self._row_to_dict(r) for r in recent[TASK_STATUS_FAILED]],
+        }
@@ -0,0 +1,373 @@
+# benchmarks/load_test.py
+# Prueba de carga de extremo a extremo: N clientes concurrentes (bucle cerrado) contra la API, con OpenAI, Tavily
+# y Google Drive sustituidos por el stub local (benchmarks/stub_externals.py). Reporta throughput, latencia
+# p50/p95/p99, errores por código, retraso del event loop (GET /stats) y RSS del servidor a lo largo del tiempo.
+# Guarda los resultados en JSON (benchmarks/results/) y los compara con la ejecución anterior.
+#
+# Uso (desde la raíz del proyecto):
+#   python -m benchmarks.load_test --concurrency 8 --duration 60
+#   python -m benchmarks.load_test --scenarios research_conduct=1 marketing_generate=2 research_memory=4 \
+#       --stub-config stub.json --stub-latency-ms 300 --token-interval-ms 5
+#   python -m benchmarks.load_test --url http://127.0.0.1:8000 --server-pid 12345  # Servidor ya arrancado
+import argparse
+import datetime
+import glob
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlparse
+
+from benchmarks.startup_benchmark import PROJECT_ROOT, DEFAULT_RESULTS_DIR, _free_port, _git, _http, _proc_status_mb
+from benchmarks.stub_externals import start_stub_server, stub_env
+
+# nombre -> (método, ruta(i), cuerpo(i)); `i` numera la petición para variar el tema y no acertar en cachés
+SCENARIOS: Dict[str, Tuple[str, Callable[[int], str], Optional[Callable[[int], Dict[str, Any]]]]] = {
+    "research_conduct": ("POST", lambda i: "/research/conduct",
+                         lambda i: {"topic": f"Prueba de carga {i}: adopción de IA en pymes", "bypass_cache": True}),
+    "marketing_generate": ("POST", lambda i: "/marketing/generate-content",
+                           lambda i: {"topic": f"Prueba de carga {i}: lanzamiento de un curso online", "platform": "LinkedIn",
+                                      "bypass_cache": True, "use_semantic_cache": False}),
+    "research_memory": ("GET", lambda i: f"/research/memory?query={quote(f'adopción de IA {i % 20}')}", None),
+    "health_live": ("GET", lambda i: "/health/live", None), # Referencia: coste del servidor HTTP sin trabajo
+}
+DEFAULT_SCENARIOS = ["research_conduct=1", "marketing_generate=1", "research_memory=2"]
+
+# Métricas comparadas entre ejecuciones: (métrica, True si más alto = peor)
+_COMPARED_SCENARIO_METRICS = (("latency_p50_s", True), ("latency_p95_s", True), ("latency_p99_s", True),
+                              ("error_rate", True), ("throughput_rps", False))
+_COMPARED_SERVER_METRICS = (("peak_rss_mb", True), ("event_loop_p99_lag_ms", True))
+
+
+# --- Utilidades ---
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values: return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+
+def parse_scenarios(specs: List[str]) -> Dict[str, float]:
+    """['research_conduct=1', 'research_memory=3'] -> pesos relativos del reparto de peticiones."""
+    weights: Dict[str, float] = {}
+    for spec in specs:
+        name, _, weight = spec.partition("=")
+        if name not in SCENARIOS: raise SystemExit(f"Escenario desconocido: '{name}'. Disponibles: {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return {name: w for name, w in weights.items() if w > 0}
+
+
+class Recorder:
+    """Resultados de todas las peticiones (thread-safe) y contadores para el muestreo periódico."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records: List[Dict[str, Any]] = []
+        self.in_flight = 0
+
+    def started(self) -> None:
+        with self._lock: self.in_flight += 1
+
+    def finished(self, scenario: str, offset_s: float, latency_s: float, status: Optional[int], error: Optional[str]) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.records.append({"scenario": scenario, "t": round(offset_s, 3), "latency_s": round(latency_s, 4), "status": status, "error": error})
+
+    def snapshot(self) -> Tuple[int, int, int]:
+        """(completadas, con error, en curso)."""
+        with self._lock:
+            errors = sum(1 for r in self.records if r["error"] or not (200 <= (r["status"] or 0) < 300))
+            return len(self.records), errors, self.in_flight
+
+
+# --- Carga ---
+def _worker(worker_id: int, base_url: str, weights: Dict[str, float], deadline: float, started_at: float,
+            counter: List[int], counter_lock: threading.Lock, recorder: Recorder, timeout: float, seed: int) -> None:
+    """Cliente en bucle cerrado: lanza la siguiente petición en cuanto termina la anterior (conexión keep-alive propia)."""
+    rng = random.Random(seed + worker_id)
+    names, scenario_weights = list(weights), list(weights.values())
+    target = urlparse(base_url)
+    conn = http.client.HTTPConnection(target.hostname, target.port, timeout=timeout)
+    client_id = f"load-{worker_id}" # X-Client-ID distinto por cliente: la admisión reparte cupo como con usuarios reales
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(names, scenario_weights)[0]
+        with counter_lock:
+            index = counter[0]; counter[0] += 1
+        method, path_for, body_for = SCENARIOS[scenario]
+        body = body_for(index) if body_for else None
+        recorder.started()
+        t0 = time.perf_counter()
+        status, error = None, None
+        try:
+            data = json.dumps(body).encode("utf-8") if body is not None else None
+            headers = {"X-Client-ID": client_id, **({"Content-Type": "application/json"} if data else {})}
+            conn.request(method, path_for(index), body=data, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:200]
+            conn.close() # Conexión en estado desconocido: la siguiente petición abre otra
+        recorder.finished(scenario, t0 - started_at, time.perf_counter() - t0, status, error)
+    conn.close()
+
+
+def _sampler(base_url: str, server_pid: Optional[int], recorder: Recorder, started_at: float, interval: float,
+             stop: threading.Event, timeline: List[Dict[str, Any]]) -> None:
+    """Cada `interval` s: RSS del servidor, peticiones completadas/errores/en curso y retraso del event loop (/stats)."""
+    previous_completed, previous_t = 0, 0.0
+    while not stop.wait(interval):
+        completed, errors, in_flight = recorder.snapshot()
+        t = time.perf_counter() - started_at
+        sample: Dict[str, Any] = {"t": round(t, 2), "completed": completed, "errors": errors, "in_flight": in_flight,
+                                  "throughput_rps": round((completed - previous_completed) / max(t - previous_t, 1e-6), 2),
+                                  "rss_mb": _proc_status_mb(server_pid, "VmRSS") if server_pid else None}
+        previous_completed, previous_t = completed, t
+        try:
+            stats = json.loads(_http("GET", f"{base_url}/stats", timeout=5.0)[1])
+            loop = stats.get("event_loop") or {}
+            sample.update(event_loop_last_lag_ms=loop.get("last_lag_ms"), event_loop_p99_lag_ms=loop.get("p99_lag_ms"),
+                          admission_active=(stats.get("admission") or {}).get("active"), admission_queued=(stats.get("admission") or {}).get("queued"))
+        except Exception as e:
+            sample["stats_error"] = f"{type(e).__name__}: {e}"[:200]
+        timeline.append(sample)
+
+
+def run_load(base_url: str, weights: Dict[str, float], concurrency: int, duration_s: float, timeout: float,
+             sample_interval: float, server_pid: Optional[int], seed: int) -> Tuple[Recorder, List[Dict[str, Any]], float]:
+    recorder, timeline, stop = Recorder(), [], threading.Event()
+    counter, counter_lock = [0], threading.Lock()
+    started_at = time.perf_counter()
+    deadline = started_at + duration_s
+    sampler = threading.Thread(target=_sampler, args=(base_url, server_pid, recorder, started_at, sample_interval, stop, timeline), daemon=True)
+    sampler.start()
+    workers = [threading.Thread(target=_worker, args=(i, base_url, weights, deadline, started_at, counter, counter_lock, recorder, timeout, seed),
+                                name=f"load-{i}", daemon=True) for i in range(concurrency)]
+    for w in workers: w.start()
+    for w in workers: w.join() # Las peticiones en curso al vencer la duración terminan y cuentan
+    elapsed = time.perf_counter() - started_at
+    stop.set(); sampler.join(timeout=10)
+    return recorder, timeline, elapsed
+
+
+def summarize(records: List[Dict[str, Any]], elapsed_s: float) -> Dict[str, Any]:
+    latencies = [r["latency_s"] for r in records]
+    ok = [r for r in records if not r["error"] and 200 <= (r["status"] or 0) < 300]
+    errors: Dict[str, int] = {}
+    for r in records:
+        if r in ok: continue
+        key = str(r["status"]) if r["status"] is not None else (r["error"] or "error").split(":")[0]
+        errors[key] = errors.get(key, 0) + 1
+    ok_latencies = [r["latency_s"] for r in ok]
+    return {
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": errors,
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else None,
+        "throughput_rps": round(len(records) / elapsed_s, 3) if elapsed_s else None,
+        "ok_throughput_rps": round(len(ok) / elapsed_s, 3) if elapsed_s else None,
+        "latency_mean_s": round(statistics.mean(latencies), 4) if latencies else None,
+        "latency_p50_s": _percentile(latencies, 0.50),
+        "latency_p95_s": _percentile(latencies, 0.95),
+        "latency_p99_s": _percentile(latencies, 0.99),
+        "latency_max_s": round(max(latencies), 4) if latencies else None,
+        "ok_latency_p95_s": _percentile(ok_latencies, 0.95),
+    }
+
+
+# --- Servidor bajo prueba ---
+def isolated_server_env(stub_url: str, state_dir: str, extra: Optional[List[str]] = None) -> Dict[str, str]:
+    """Entorno del servidor: servicios externos en el stub y ChromaDB, cachés, cola write-behind y ledger en `state_dir`."""
+    env = {
+        **os.environ,
+        **stub_env(stub_url),
+        "PYTHONPATH": PROJECT_ROOT,
+        "CHROMA_DB_PATH": os.path.join(state_dir, "chroma"),
+        "RESULT_CACHE_DB_PATH": os.path.join(state_dir, "result_cache.sqlite3"),
+        "MARKETING_SEMANTIC_CACHE_DB_PATH": os.path.join(state_dir, "semantic_cache.sqlite3"),
+        "LLM_CACHE_DB_PATH": os.path.join(state_dir, "llm_cache.sqlite3"),
+        "WRITE_BEHIND_DB_PATH": os.path.join(state_dir, "write_behind.sqlite3"),
+        "USAGE_LEDGER_DB_PATH": os.path.join(state_dir, "usage_ledger.sqlite3"),
+        "WARMUP_ON_STARTUP": "false",
+        **dict(item.split("=", 1) for item in (extra or [])),
+    }
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    return env
+
+
+def start_server(env: Dict[str, str], startup_timeout: float) -> Tuple[subprocess.Popen, str, Any]:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    stderr_log = tempfile.TemporaryFile() # Fichero y no PIPE: un servidor con mucho log no se bloquea
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+                             "--log-level", "warning"], cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=stderr_log)
+    started = time.perf_counter()
+    while True:
+        if proc.poll() is not None:
+            stderr_log.seek(0)
+            raise SystemExit(f"El servidor terminó al arrancar: {stderr_log.read().decode(errors='replace')[-800:]}")
+        if time.perf_counter() - started > startup_timeout:
+            proc.kill(); raise SystemExit(f"El servidor no respondió en {startup_timeout}s.")
+        try:
+            if _http("GET", f"{base_url}/health/live", timeout=1.0)[0] == 200: return proc, base_url, stderr_log
+        except OSError:
+            time.sleep(0.05)
+
+
+def warm_up(base_url: str, weights: Dict[str, float], per_scenario: int, timeout: float) -> Dict[str, List[Optional[int]]]:
+    """Peticiones previas (no medidas) por escenario: la inicialización perezosa de crews/ChromaDB no cuenta en la carga."""
+    statuses: Dict[str, List[Optional[int]]] = {}
+    for name in weights:
+        method, path_for, body_for = SCENARIOS[name]
+        for i in range(per_scenario):
+            index = -1 - i # Temas distintos de los de la carga
+            try: statuses.setdefault(name, []).append(_http(method, base_url + path_for(index), body_for(index) if body_for else None, timeout=timeout)[0])
+            except OSError: statuses.setdefault(name, []).append(None)
+    return statuses
+
+
+# --- Comparación entre ejecuciones ---
+def _latest_result(results_dir: str) -> Optional[str]:
+    files = sorted(glob.glob(os.path.join(results_dir, "load_*.json")))
+    return files[-1] if files else None
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Métricas que empeoran más de `threshold` (relativo) respecto a la ejecución de referencia."""
+    regressions = []
+    def _check(section: str, name: str, metric: str, higher_is_worse: bool, new: Any, old: Any) -> None:
+        if new is None or old is None: return
+        if not old: # Referencia 0 (p. ej. sin errores): cualquier aparición cuenta si empeora
+            if higher_is_worse and new > 0: regressions.append({"section": section, "name": name, "metric": metric, "baseline": old, "current": new, "change_pct": None})
+            return
+        change = (new - old) / old if higher_is_worse else (old - new) / old
+        if change > threshold:
+            regressions.append({"section": section, "name": name, "metric": metric, "baseline": old, "current": new,
+                                "change_pct": round((new - old) / old * 100, 1)})
+    for name, values in current.get("scenarios", {}).items():
+        base_values = baseline.get("scenarios", {}).get(name) or {}
+        for metric, higher_is_worse in _COMPARED_SCENARIO_METRICS: _check("scenarios", name, metric, higher_is_worse, values.get(metric), base_values.get(metric))
+    for metric, higher_is_worse in _COMPARED_SERVER_METRICS:
+        _check("server", "server", metric, higher_is_worse, current.get("server", {}).get(metric), baseline.get("server", {}).get(metric))
+    return regressions
+
+
+# --- CLI ---
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API contra servicios externos simulados.")
+    parser.add_argument("--scenarios", nargs="*", default=DEFAULT_SCENARIOS,
+                        help=f"Escenarios con peso relativo (nombre=peso). Disponibles: {', '.join(SCENARIOS)}.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clientes concurrentes (bucle cerrado).")
+    parser.add_argument("--duration", type=float, default=60.0, help="Segundos de carga medida.")
+    parser.add_argument("--warmup", type=int, default=1, help="Peticiones previas no medidas por escenario.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Timeout por petición.")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Segundos entre muestras de RSS / event loop.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="API ya arrancada (no se lanza servidor ni stub; apúntala tú al stub).")
+    parser.add_argument("--server-pid", type=int, help="PID del servidor de --url para muestrear su RSS (solo Linux).")
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0, help="Latencia por defecto del stub (OpenAI/Tavily/Drive).")
+    parser.add_argument("--token-interval-ms", type=float, default=0.0, help="Tiempo de generación por palabra del stub de OpenAI.")
+    parser.add_argument("--stub-config", help="JSON de perfiles del stub (latencias, errores, 429, salidas fijas).")
+    parser.add_argument("--server-env", nargs="*", default=[], help="Variables extra para el servidor (CLAVE=valor).")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR)
+    parser.add_argument("--compare", default="latest", help="JSON de referencia, 'latest' (el anterior en --results-dir) o 'none'.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Empeoramiento relativo considerado regresión (0.2 = 20%%).")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Código de salida 1 si hay regresiones.")
+    args = parser.parse_args()
+    weights = parse_scenarios(args.scenarios)
+
+    stub, proc, stderr_log, state_dir = None, None, None, None
+    stub_config: Dict[str, Any] = {}
+    if args.stub_config:
+        with open(args.stub_config, encoding="utf-8") as f: stub_config = json.load(f)
+    results: Dict[str, Any] = {
+        "benchmark": "load",
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "git_commit": _git("rev-parse", "--short", "HEAD"),
+        "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"scenarios": weights, "concurrency": args.concurrency, "duration_s": args.duration, "warmup": args.warmup,
+                   "url": args.url, "stub_latency_ms": args.stub_latency_ms, "token_interval_ms": args.token_interval_ms,
+                   "stub_config": stub_config or None, "server_env": args.server_env},
+    }
+    try:
+        if args.url:
+            base_url, server_pid = args.url.rstrip("/"), args.server_pid
+        else:
+            stub = start_stub_server(latency_ms=args.stub_latency_ms, token_interval_ms=args.token_interval_ms, config=stub_config)
+            state_dir = tempfile.mkdtemp(prefix="load_test_") # ChromaDB, cachés y cola write-behind aislados por ejecución
+            env = isolated_server_env(f"http://127.0.0.1:{stub.server_address[1]}", state_dir, args.server_env)
+            proc, base_url, stderr_log = start_server(env, args.startup_timeout)
+            server_pid = proc.pid
+        results["server"] = {"rss_after_startup_mb": _proc_status_mb(server_pid, "VmRSS") if server_pid else None}
+        results["warmup_statuses"] = warm_up(base_url, weights, args.warmup, args.timeout) if args.warmup else {}
+        print(f"Carga: {args.concurrency} clientes durante {args.duration:.0f}s contra {base_url} ({', '.join(f'{k}={v:g}' for k, v in weights.items())})")
+
+        recorder, timeline, elapsed = run_load(base_url, weights, args.concurrency, args.duration, args.timeout,
+                                               args.sample_interval, server_pid, args.seed)
+        results["elapsed_s"] = round(elapsed, 3)
+        results["overall"] = summarize(recorder.records, elapsed)
+        results["scenarios"] = {name: summarize([r for r in recorder.records if r["scenario"] == name], elapsed) for name in weights}
+        results["timeline"] = timeline
+        try: final_stats = json.loads(_http("GET", f"{base_url}/stats", timeout=10.0)[1])
+        except Exception: final_stats = {}
+        loop = final_stats.get("event_loop") or {}
+        rss_samples = [s["rss_mb"] for s in timeline if s.get("rss_mb") is not None]
+        results["server"].update({
+            "peak_rss_mb": _proc_status_mb(server_pid, "VmHWM") if server_pid else None,
+            "rss_end_mb": rss_samples[-1] if rss_samples else None,
+            "rss_max_sampled_mb": max(rss_samples) if rss_samples else None,
+            "event_loop_p99_lag_ms": loop.get("p99_lag_ms"),
+            "event_loop_max_lag_ms": loop.get("max_lag_ms"),
+        })
+        results["final_stats"] = final_stats
+        if stub is not None:
+            with stub.counter_lock: results["stub_requests"] = dict(stub.request_counts)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try: proc.wait(timeout=10)
+            except subprocess.TimeoutExpired: proc.kill()
+        if stderr_log is not None: stderr_log.close()
+        if stub is not None: stub.shutdown()
+        if state_dir: shutil.rmtree(state_dir, ignore_errors=True)
+
+    for name, s in {**results["scenarios"], "TOTAL": results["overall"]}.items():
+        print(f"[{name:18s}] {s['requests']:5d} peticiones | {s['throughput_rps']} rps | p50 {s['latency_p50_s']}s p95 {s['latency_p95_s']}s "
+              f"p99 {s['latency_p99_s']}s | errores {s['error_rate']} {s['errors'] or ''}")
+    server = results["server"]
+    print(f"[servidor] RSS arranque {server['rss_after_startup_mb']} MB, pico {server['peak_rss_mb']} MB | "
+          f"event loop p99 {server['event_loop_p99_lag_ms']} ms, máx {server['event_loop_max_lag_ms']} ms")
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    output_path = os.path.join(args.results_dir, f"load_{stamp}_{results['git_commit'] or 'nogit'}.json")
+    baseline_path = None if args.compare == "none" else (_latest_result(args.results_dir) if args.compare == "latest" else args.compare)
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as f: baseline = json.load(f)
+        if baseline.get("config", {}).get("scenarios") != weights or baseline.get("config", {}).get("concurrency") != args.concurrency:
+            print(f"\nAVISO: {os.path.basename(baseline_path)} usó otra mezcla/concurrencia; la comparación es orientativa.")
+        regressions = compare_results(results, baseline, args.threshold)
+        results["comparison"] = {"baseline": os.path.basename(baseline_path), "baseline_commit": baseline.get("git_commit"), "regressions": regressions}
+        print(f"\nComparación con {os.path.basename(baseline_path)} (commit {baseline.get('git_commit')}): {len(regressions)} regresiones")
+        for r in regressions:
+            change = "" if r["change_pct"] is None else f" ({r['change_pct']:+}%)"
+            print(f"  - {r['section']}/{r['name']} {r['metric']}: {r['baseline']} -> {r['current']}{change}")
+
+    with open(output_path, "w", encoding="utf-8") as f: json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {output_path}")
+    return 1 if args.fail_on_regression and results.get("comparison", {}).get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
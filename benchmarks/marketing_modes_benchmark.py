@@ -0,0 +1,163 @@
+# benchmarks/marketing_modes_benchmark.py
+# Compara los modos de /marketing/generate-content: 'crew' (agente CrewAI que decide invocar cada herramienta) frente a
+# 'fast' (las tres herramientas en orden fijo). Por modo: latencia p50/p95, llamadas al LLM por petición (campo
+# `usage` de la respuesta y, como contraste, las recibidas por el stub de OpenAI), tokens y coste estimado.
+# Los modos se ejecutan uno tras otro (no intercalados) para que los contadores del stub sean atribuibles.
+#
+# Uso (desde la raíz del proyecto):
+#   python -m benchmarks.marketing_modes_benchmark --requests 10
+#   python -m benchmarks.marketing_modes_benchmark --platforms LinkedIn Instagram --concurrency 2 --stub-latency-ms 400
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from benchmarks.load_test import _percentile, isolated_server_env, start_server
+from benchmarks.startup_benchmark import DEFAULT_RESULTS_DIR, _git, _http
+from benchmarks.stub_externals import start_stub_server
+
+MODES = ("crew", "fast")
+
+
+def _stub_llm_calls(stub) -> int:
+    with stub.counter_lock: return sum(n for kind, n in stub.request_counts.items() if kind.startswith("openai_chat"))
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return round(statistics.mean(values), 4) if values else None
+
+
+def run_mode(base_url: str, stub, mode: str, n_requests: int, concurrency: int, platforms: List[str], context: Optional[str],
+             timeout: float) -> Dict[str, Any]:
+    """`n_requests` peticiones en `mode` con temas únicos y sin cachés; devuelve resumen + detalle por petición."""
+    stub_calls_before = _stub_llm_calls(stub)
+    records: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def _one(i: int) -> None:
+        body = {"topic": f"Benchmark de modos {mode} {i}: lanzamiento de una app de finanzas personales", "context": context,
+                "mode": mode, "bypass_cache": True, "use_semantic_cache": False,
+                **({"platforms": platforms} if len(platforms) > 1 else {"platform": platforms[0]})}
+        t0 = time.perf_counter()
+        try:
+            status, payload = _http("POST", f"{base_url}/marketing/generate-content", body, timeout=timeout)
+            data = json.loads(payload) if payload else {}
+        except Exception as e:
+            status, data = None, {"detail": f"{type(e).__name__}: {e}"}
+        usage = data.get("usage") or {}
+        record = {"index": i, "status": status, "latency_s": round(time.perf_counter() - t0, 4),
+                  "llm_calls": usage.get("llm_calls"), "total_tokens": usage.get("total_tokens"),
+                  "estimated_cost_usd": usage.get("estimated_cost_usd"),
+                  "stages": {stage: s.get("llm_calls") for stage, s in (usage.get("by_stage") or {}).items()},
+                  "error": None if status == 200 else str(data.get("detail") or data)[:300]}
+        with lock: records.append(record)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor: list(executor.map(_one, range(n_requests)))
+    elapsed = time.perf_counter() - started
+    ok = [r for r in records if r["status"] == 200]
+    latencies = [r["latency_s"] for r in ok]
+    stub_calls = _stub_llm_calls(stub) - stub_calls_before
+    return {
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": [r["error"] for r in records if r["error"]][:5],
+        "elapsed_s": round(elapsed, 3),
+        "latency_mean_s": _mean(latencies),
+        "latency_p50_s": _percentile(latencies, 0.50),
+        "latency_p95_s": _percentile(latencies, 0.95),
+        "llm_calls_per_request": _mean([r["llm_calls"] for r in ok if r["llm_calls"] is not None]),
+        "stub_llm_calls_per_request": round(stub_calls / len(records), 2) if records else None, # Incluye reintentos y peticiones fallidas
+        "tokens_per_request": _mean([r["total_tokens"] for r in ok if r["total_tokens"] is not None]),
+        "cost_usd_per_request": _mean([r["estimated_cost_usd"] for r in ok if r["estimated_cost_usd"] is not None]),
+        "records": sorted(records, key=lambda r: r["index"]),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compara los modos 'crew' y 'fast' de /marketing/generate-content.")
+    parser.add_argument("--modes", nargs="*", default=list(MODES), choices=MODES)
+    parser.add_argument("--requests", type=int, default=5, help="Peticiones medidas por modo.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Peticiones simultáneas dentro de cada modo.")
+    parser.add_argument("--warmup", type=int, default=1, help="Peticiones previas no medidas por modo (inicialización perezosa).")
+    parser.add_argument("--platforms", nargs="+", default=["LinkedIn"], help="Una plataforma o varias (fan-out multi-plataforma).")
+    parser.add_argument("--context", default="Audiencia: jóvenes profesionales. Objetivo: descargas de la app.")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0, help="Latencia por defecto del stub (hasta el primer token).")
+    parser.add_argument("--token-interval-ms", type=float, default=0.0, help="Tiempo de generación por palabra del stub de OpenAI.")
+    parser.add_argument("--stub-config", help="JSON de perfiles del stub (latencias, errores, 429, salidas fijas).")
+    parser.add_argument("--server-env", nargs="*", default=[], help="Variables extra para el servidor (CLAVE=valor).")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR)
+    args = parser.parse_args()
+
+    stub_config: Dict[str, Any] = {}
+    if args.stub_config:
+        with open(args.stub_config, encoding="utf-8") as f: stub_config = json.load(f)
+    results: Dict[str, Any] = {
+        "benchmark": "marketing_modes",
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "git_commit": _git("rev-parse", "--short", "HEAD"),
+        "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"modes": args.modes, "requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup,
+                   "platforms": args.platforms, "stub_latency_ms": args.stub_latency_ms, "token_interval_ms": args.token_interval_ms,
+                   "stub_config": stub_config or None, "server_env": args.server_env},
+        "modes": {},
+    }
+    stub = start_stub_server(latency_ms=args.stub_latency_ms, token_interval_ms=args.token_interval_ms, config=stub_config)
+    state_dir = tempfile.mkdtemp(prefix="marketing_modes_")
+    proc, stderr_log = None, None
+    try:
+        env = isolated_server_env(f"http://127.0.0.1:{stub.server_address[1]}", state_dir, ["RESULT_CACHE_ENABLED=false", *args.server_env])
+        proc, base_url, stderr_log = start_server(env, args.startup_timeout)
+        for mode in args.modes:
+            if args.warmup: run_mode(base_url, stub, mode, args.warmup, 1, args.platforms, args.context, args.timeout)
+            print(f"Modo '{mode}': {args.requests} peticiones ({args.concurrency} simultáneas, plataformas {', '.join(args.platforms)})...")
+            results["modes"][mode] = run_mode(base_url, stub, mode, args.requests, args.concurrency, args.platforms, args.context, args.timeout)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try: proc.wait(timeout=10)
+            except subprocess.TimeoutExpired: proc.kill()
+        if stderr_log is not None: stderr_log.close()
+        stub.shutdown()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    for mode, s in results["modes"].items():
+        print(f"[{mode:5s}] {s['ok']}/{s['requests']} OK | p50 {s['latency_p50_s']}s p95 {s['latency_p95_s']}s | "
+              f"LLM/petición {s['llm_calls_per_request']} (stub {s['stub_llm_calls_per_request']}) | "
+              f"tokens {s['tokens_per_request']} | coste {s['cost_usd_per_request']} USD" + (f" | errores: {s['errors'][0]}" if s["errors"] else ""))
+    crew, fast = results["modes"].get("crew"), results["modes"].get("fast")
+    if crew and fast and crew["ok"] and fast["ok"]:
+        ratio = lambda a, b: round(a / b, 2) if a and b else None
+        results["comparison"] = {
+            "latency_p50_speedup": ratio(crew["latency_p50_s"], fast["latency_p50_s"]),
+            "latency_p95_speedup": ratio(crew["latency_p95_s"], fast["latency_p95_s"]),
+            "llm_calls_ratio": ratio(crew["llm_calls_per_request"], fast["llm_calls_per_request"]),
+            "tokens_ratio": ratio(crew["tokens_per_request"], fast["tokens_per_request"]),
+        }
+        print(f"\ncrew / fast: latencia p50 x{results['comparison']['latency_p50_speedup']}, "
+              f"llamadas al LLM x{results['comparison']['llm_calls_ratio']}, tokens x{results['comparison']['tokens_ratio']}")
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    output_path = os.path.join(args.results_dir, f"marketing_modes_{stamp}_{results['git_commit'] or 'nogit'}.json")
+    with open(output_path, "w", encoding="utf-8") as f: json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {output_path}")
+    return 0 if all(s["ok"] for s in results["modes"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
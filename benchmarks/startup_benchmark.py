@@ -0,0 +1,289 @@
+# benchmarks/startup_benchmark.py
+# Benchmark de arranque: tiempo de import por módulo, tiempo hasta la primera respuesta de cada endpoint y
+# RSS pico tras el arranque, contra servicios externos simulados (benchmarks/stub_externals.py).
+# Guarda los resultados en JSON (benchmarks/results/) y los compara con la ejecución anterior.
+#
+# Uso (desde la raíz del proyecto):
+#   python -m benchmarks.startup_benchmark
+#   python -m benchmarks.startup_benchmark --repeat 5 --endpoints health_live research_conduct
+#   python -m benchmarks.startup_benchmark --skip-endpoints --compare benchmarks/results/startup_XXXX.json
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.stub_externals import start_stub_server, stub_env
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+
+DEFAULT_MODULES = [
+    "app.core.config",
+    "app.core.metrics",
+    "app.services.cache_service",
+    "app.services.job_service",
+    "app.services.write_behind_service",
+    "app.services.gdrive_service",
+    "app.services.persistence_service",
+    "app.agents_crewai.tools.research_tools",
+    "app.agents_crewai.tools.marketing_tools",
+    "app.agents_crewai.crew_agents",
+    "app.crews.research_crew_definitions",
+    "app.crews.marketing_crew_definitions",
+    "app.backend.main",
+]
+
+# nombre -> (método, ruta, cuerpo JSON)
+ENDPOINTS: Dict[str, Tuple[str, str, Optional[Dict[str, Any]]]] = {
+    "root": ("GET", "/", None),
+    "health_live": ("GET", "/health/live", None),
+    "health_ready": ("GET", "/health/ready", None),
+    "stats": ("GET", "/stats", None),
+    "metrics": ("GET", "/metrics", None),
+    "research_memory": ("GET", "/research/memory?query=benchmark", None),
+    "research_conduct": ("POST", "/research/conduct", {"topic": "Benchmark de arranque", "bypass_cache": True}),
+    "marketing_generate": ("POST", "/marketing/generate-content",
+                           {"topic": "Benchmark de arranque", "platform": "LinkedIn", "bypass_cache": True}),
+}
+
+# Métricas comparadas entre ejecuciones (todas: más alto = peor)
+_COMPARED_IMPORT_METRICS = ("import_s_median",)
+_COMPARED_ENDPOINT_METRICS = ("time_to_live_s", "first_request_s", "time_to_first_response_s", "peak_rss_mb")
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(.+)$")
+
+
+# --- Utilidades ---
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _proc_status_mb(pid: int, field: str) -> Optional[float]:
+    """VmRSS/VmHWM (pico) de /proc/<pid>/status en MB. Solo Linux; None en otros sistemas."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"): return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _http(method: str, url: str, body: Optional[Dict[str, Any]] = None, timeout: float = 300.0) -> Tuple[int, bytes]:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"} if data else {})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp: return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def _median(values: List[float]) -> Optional[float]:
+    return round(statistics.median(values), 4) if values else None
+
+
+# --- Imports ---
+def measure_import(module: str, env: Dict[str, str], repeat: int, top: int) -> Dict[str, Any]:
+    """Importa `module` en `repeat` intérpretes nuevos (import en frío, acumulando sus dependencias)."""
+    code = f"import time; t = time.perf_counter(); import {module}; print('__IMPORT_S__', time.perf_counter() - t)"
+    samples, top_imports, error = [], [], None
+    for i in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=PROJECT_ROOT, env=env,
+                              capture_output=True, text=True, timeout=600)
+        match = re.search(r"__IMPORT_S__ ([\d.e-]+)", proc.stdout)
+        if proc.returncode != 0 or not match:
+            error = (proc.stderr.strip().splitlines() or ["error desconocido"])[-1]
+            break
+        samples.append(float(match.group(1)))
+        if i == 0: # Desglose de -X importtime: dependencias con más tiempo acumulado
+            rows = [m.groups() for m in map(_IMPORTTIME_RE.search, proc.stderr.splitlines()) if m and m.group(3).strip() != module]
+            rows.sort(key=lambda r: int(r[1]), reverse=True)
+            top_imports = [{"module": name.strip(), "cumulative_s": round(int(cum) / 1e6, 4), "self_s": round(int(self_us) / 1e6, 4)}
+                           for self_us, cum, name in rows[:top]]
+    return {
+        "import_s_median": _median(samples),
+        "import_s_min": round(min(samples), 4) if samples else None,
+        "samples": [round(s, 4) for s in samples],
+        "top_imports": top_imports,
+        "error": error,
+    }
+
+
+# --- Endpoints ---
+def measure_endpoint(name: str, env: Dict[str, str], startup_timeout: float) -> Dict[str, Any]:
+    """Arranca un servidor nuevo por endpoint para medir su primera petición en frío (incluye la
+    inicialización perezosa de crews/Drive/ChromaDB que dispare) y una segunda ya en caliente."""
+    method, path, body = ENDPOINTS[name]
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    result: Dict[str, Any] = {"method": method, "path": path}
+    stderr_log = tempfile.TemporaryFile() # Fichero y no PIPE: un servidor con mucho log no se bloquea
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+                             "--log-level", "warning"], cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=stderr_log)
+    try:
+        while True: # Esperar a /health/live
+            if proc.poll() is not None:
+                stderr_log.seek(0)
+                result["error"] = f"El servidor terminó al arrancar: {stderr_log.read().decode(errors='replace')[-500:]}"
+                return result
+            if time.perf_counter() - started > startup_timeout:
+                result["error"] = f"El servidor no respondió en {startup_timeout}s."
+                return result
+            try:
+                if _http("GET", f"{base_url}/health/live", timeout=1.0)[0] == 200: break
+            except OSError:
+                time.sleep(0.02)
+        result["time_to_live_s"] = round(time.perf_counter() - started, 4)
+        result["rss_after_startup_mb"] = _proc_status_mb(proc.pid, "VmRSS")
+
+        t_request = time.perf_counter()
+        status, _ = _http(method, base_url + path, body)
+        result["first_request_s"] = round(time.perf_counter() - t_request, 4)
+        result["time_to_first_response_s"] = round(time.perf_counter() - started, 4)
+        result["status"] = status
+
+        t_request = time.perf_counter()
+        result["second_status"] = _http(method, base_url + path, body)[0]
+        result["second_request_s"] = round(time.perf_counter() - t_request, 4)
+
+        result["peak_rss_mb"] = _proc_status_mb(proc.pid, "VmHWM")
+        try: # Duración de la inicialización de cada componente perezoso
+            ready = json.loads(_http("GET", f"{base_url}/health/ready", timeout=10.0)[1])
+            result["component_init_s"] = {c: s.get("init_duration_s") for c, s in ready.get("components", {}).items()}
+        except Exception:
+            pass
+        return result
+    finally:
+        proc.terminate()
+        try: proc.wait(timeout=10)
+        except subprocess.TimeoutExpired: proc.kill()
+        stderr_log.close()
+
+
+# --- Comparación entre ejecuciones ---
+def _latest_result(results_dir: str, exclude: Optional[str] = None) -> Optional[str]:
+    files = sorted(f for f in glob.glob(os.path.join(results_dir, "startup_*.json")) if f != exclude)
+    return files[-1] if files else None
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta: float) -> List[Dict[str, Any]]:
+    """Métricas que empeoran más de `threshold` (relativo) y de `min_delta` (absoluto, para ignorar ruido)."""
+    regressions = []
+    sections = (("imports", _COMPARED_IMPORT_METRICS), ("endpoints", _COMPARED_ENDPOINT_METRICS))
+    for section, metrics in sections:
+        for name, values in current.get(section, {}).items():
+            base_values = baseline.get(section, {}).get(name) or {}
+            for metric in metrics:
+                new, old = values.get(metric), base_values.get(metric)
+                if new is None or not old: continue
+                if (new - old) / old > threshold and new - old > min_delta:
+                    regressions.append({"section": section, "name": name, "metric": metric, "baseline": old, "current": new,
+                                        "change_pct": round((new - old) / old * 100, 1)})
+    return regressions
+
+
+# --- CLI ---
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de la API (imports, primera petición por endpoint, RSS).")
+    parser.add_argument("--modules", nargs="*", default=DEFAULT_MODULES, help="Módulos a medir (import en frío).")
+    parser.add_argument("--endpoints", nargs="*", default=list(ENDPOINTS), choices=list(ENDPOINTS), help="Endpoints a medir.")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por módulo (se reporta la mediana).")
+    parser.add_argument("--top-imports", type=int, default=10, help="Dependencias más lentas a listar por módulo.")
+    parser.add_argument("--skip-imports", action="store_true")
+    parser.add_argument("--skip-endpoints", action="store_true")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Latencia añadida por el stub a OpenAI/Tavily/Drive.")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR)
+    parser.add_argument("--compare", default="latest", help="JSON de referencia, 'latest' (el anterior en --results-dir) o 'none'.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Empeoramiento relativo considerado regresión (0.2 = 20%%).")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="Diferencia absoluta mínima (s o MB) para reportar regresión.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Código de salida 1 si hay regresiones.")
+    args = parser.parse_args()
+
+    stub = start_stub_server(latency_ms=args.stub_latency_ms)
+    state_dir = tempfile.mkdtemp(prefix="startup_benchmark_") # ChromaDB, caché y cola write-behind aislados por ejecución
+    env = {
+        **os.environ,
+        **stub_env(f"http://127.0.0.1:{stub.server_address[1]}"),
+        "PYTHONPATH": PROJECT_ROOT,
+        "CHROMA_DB_PATH": os.path.join(state_dir, "chroma"),
+        "RESULT_CACHE_ENABLED": "false", # Medir ejecuciones reales, no aciertos de caché
+        "RESULT_CACHE_DB_PATH": os.path.join(state_dir, "result_cache.sqlite3"),
+        "WRITE_BEHIND_DB_PATH": os.path.join(state_dir, "write_behind.sqlite3"),
+        "WARMUP_ON_STARTUP": "false",
+    }
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+    results: Dict[str, Any] = {
+        "benchmark": "startup",
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "git_commit": _git("rev-parse", "--short", "HEAD"),
+        "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"repeat": args.repeat, "stub_latency_ms": args.stub_latency_ms},
+        "imports": {},
+        "endpoints": {},
+    }
+    try:
+        if not args.skip_imports:
+            # Un import previo descartado compila los .pyc: las muestras no incluyen la compilación
+            subprocess.run([sys.executable, "-c", "import app.backend.main"], cwd=PROJECT_ROOT, env=env, capture_output=True, timeout=600)
+            for module in args.modules:
+                results["imports"][module] = res = measure_import(module, env, max(1, args.repeat), args.top_imports)
+                print(f"[import] {module:45s} {res['import_s_median'] if res['error'] is None else 'ERROR: ' + res['error']}")
+        if not args.skip_endpoints:
+            for name in args.endpoints:
+                results["endpoints"][name] = res = measure_endpoint(name, env, args.startup_timeout)
+                if res.get("error"): print(f"[endpoint] {name:20s} ERROR: {res['error']}")
+                else: print(f"[endpoint] {name:20s} live {res['time_to_live_s']}s | 1ª petición {res['first_request_s']}s "
+                            f"(HTTP {res['status']}) | 2ª {res['second_request_s']}s | RSS pico {res['peak_rss_mb']} MB")
+        results["stub_requests"] = dict(stub.request_counts)
+    finally:
+        stub.shutdown()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    output_path = os.path.join(args.results_dir, f"startup_{stamp}_{results['git_commit'] or 'nogit'}.json")
+
+    baseline_path = None if args.compare == "none" else (_latest_result(args.results_dir) if args.compare == "latest" else args.compare)
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as f: baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold, args.min_delta)
+        results["comparison"] = {"baseline": os.path.basename(baseline_path), "baseline_commit": baseline.get("git_commit"),
+                                 "regressions": regressions}
+        print(f"\nComparación con {os.path.basename(baseline_path)} (commit {baseline.get('git_commit')}): {len(regressions)} regresiones")
+        for r in regressions:
+            print(f"  - {r['section']}/{r['name']} {r['metric']}: {r['baseline']} -> {r['current']} (+{r['change_pct']}%)")
+
+    with open(output_path, "w", encoding="utf-8") as f: json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {output_path}")
+    return 1 if args.fail_on_regression and results.get("comparison", {}).get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+# benchmarks/stub_externals.py
+# Stub local de los servicios externos (OpenAI chat completions, Tavily /search, subida a Google Drive)
+# para medir la app sin red ni claves reales. Solo librería estándar: arranca en milisegundos.
+# Cada servicio tiene su perfil: distribución de latencia, tasa de errores 5xx y de 429 (con Retry-After);
+# las respuestas de OpenAI y Tavily pueden sustituirse por salidas fijas (fichero JSON, ver --config).
+#
+# Uso independiente:
+#   python -m benchmarks.stub_externals --port 8765 --latency-ms 50 [--token-interval-ms 20]
+#   python -m benchmarks.stub_externals --openai-latency lognormal:800:3000 --openai-429-rate 0.05 --error-rate 0.01
+#   python -m benchmarks.stub_externals --config benchmarks/stub_config.json
+# y arrancar la API con:
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub TAVILY_API_URL=http://127.0.0.1:8765
+#   TAVILY_API_KEY=stub GDRIVE_API_ENDPOINT=http://127.0.0.1:8765 uvicorn app.backend.main:app
+#
+# Latencias (ms): "50" fija | "uniform:MIN:MAX" | "normal:MEDIA:DESV" | "lognormal:P50:P95" | "exp:MEDIA".
+# Fichero --config (todas las claves opcionales; los flags de la línea de comandos tienen prioridad):
+#   {"seed": 1,
+#    "openai": {"latency": "lognormal:600:2500", "token_interval_ms": 10, "error_rate": 0.01, "rate_limit_rate": 0.05, "retry_after_ms": 800},
+#    "tavily": {"latency": "uniform:200:900"}, "drive": {"latency": "normal:300:80", "error_rate": 0.02},
+#    "canned": {"report": "...", "chat_rules": [{"match": "Plataforma", "content": "..."}], "search_results": [{"title": "...", "url": "...", "content": "..."}]}}
+import argparse
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+STUB_REPORT = (
+    "## Resumen Ejecutivo\n\n"
+    "Informe generado por el stub de benchmarks: el contenido es fijo y no depende del tema.\n\n"
+    "## Vías de Acción\n\n"
+    "1. Revisar las métricas de latencia.\n"
+    "2. Comparar con la versión anterior.\n"
+)
+# Respuesta en formato ReAct para que los agentes de CrewAI terminen su tarea en una sola llamada
+STUB_AGENT_ANSWER = f"Thought: Ya tengo la respuesta final.\nFinal Answer: {STUB_REPORT}"
+_STREAM_PIECE_RE = re.compile(r"\S+\s*|\s+") # Un "token" del stream = una palabra con su espacio
+
+SERVICES = ("openai", "tavily", "drive")
+
+
+def stub_env(base_url: str) -> Dict[str, str]:
+    """Variables de entorno que redirigen la app a este stub (base_url = 'http://host:puerto')."""
+    return {
+        "OPENAI_API_KEY": "stub-openai-key",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "TAVILY_API_KEY": "stub-tavily-key",
+        "TAVILY_API_URL": base_url,
+        "GDRIVE_API_ENDPOINT": base_url,
+        "GOOGLE_DRIVE_FOLDER_ID": "stub-folder",
+    }
+
+
+def parse_latency(spec: Any, rng: random.Random) -> Callable[[], float]:
+    """Muestreador de latencia en segundos a partir de un número (ms fijos) o "distribución:parámetros" en ms."""
+    kind, *params = str(spec if spec is not None else 0).split(":")
+    try:
+        values = [float(p) / 1000.0 for p in params]
+        if not params: fixed = max(0.0, float(kind) / 1000.0); return lambda: fixed
+        if kind == "uniform": low, high = values; return lambda: rng.uniform(low, high)
+        if kind == "normal": mean, std = values; return lambda: max(0.0, rng.gauss(mean, std))
+        if kind == "exp": (mean,) = values; return lambda: rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+        if kind == "lognormal": # Parametrizada por p50 y p95, más fácil de leer que mu/sigma
+            p50, p95 = values
+            mu, sigma = math.log(p50), max(0.0, math.log(p95 / p50) / 1.645)
+            return lambda: rng.lognormvariate(mu, sigma)
+    except (ValueError, ZeroDivisionError): pass
+    raise ValueError(f"Latencia no válida: '{spec}' (ej: 50, uniform:20:200, normal:100:30, lognormal:400:1500, exp:100).")
+
+
+class ServiceProfile:
+    """Comportamiento simulado de un servicio: latencia, fallos y (OpenAI) tiempo de generación por palabra."""
+
+    def __init__(self, rng: random.Random, latency: Any = 0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after_ms: float = 1000.0, token_interval_ms: float = 0.0):
+        self.rng = rng
+        self.latency_spec = str(latency)
+        self.sample_latency = parse_latency(latency, rng)
+        self.error_rate = max(0.0, float(error_rate))
+        self.rate_limit_rate = max(0.0, float(rate_limit_rate))
+        self.retry_after_ms = max(0.0, float(retry_after_ms))
+        self.token_interval_s = max(0.0, float(token_interval_ms)) / 1000.0
+
+    def fault(self) -> Optional[int]:
+        """429, 500 o None (respuesta normal), según las tasas configuradas."""
+        draw = self.rng.random()
+        if draw < self.rate_limit_rate: return 429
+        if draw < self.rate_limit_rate + self.error_rate: return 500
+        return None
+
+    def describe(self) -> Dict[str, Any]:
+        return {"latency": self.latency_spec, "error_rate": self.error_rate, "rate_limit_rate": self.rate_limit_rate,
+                "retry_after_ms": self.retry_after_ms, "token_interval_ms": self.token_interval_s * 1000.0}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256 # Backlog de accept(): con el valor por defecto (5) una prueba de carga ve conexiones rechazadas
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "StubExternals/1.0"
+
+    # --- Utilidades ---
+    def log_message(self, format: str, *args: Any) -> None: # Silencia el log por petición de http.server
+        logger.debug(format % args)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items(): self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _profile(self, service: str) -> ServiceProfile:
+        return self.server.profiles[service]
+
+    def _simulate_latency(self, service: str) -> None:
+        latency_s = self._profile(service).sample_latency()
+        if latency_s > 0: time.sleep(latency_s)
+
+    def _write_chunk(self, data: bytes) -> None:
+        """Un trozo de Transfer-Encoding: chunked (b"" cierra la respuesta)."""
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _count(self, kind: str) -> None:
+        with self.server.counter_lock: self.server.request_counts[kind] = self.server.request_counts.get(kind, 0) + 1
+
+    def _inject_fault(self, service: str, kind: str) -> bool:
+        """Responde con un 429 (al instante, con Retry-After) o un 500 (tras la latencia) con el formato de cada API."""
+        profile = self._profile(service)
+        status = profile.fault()
+        if status is None: return False
+        self._count(f"{kind}:{status}")
+        if status == 429:
+            headers = {"retry-after-ms": str(int(profile.retry_after_ms)), "retry-after": str(max(1, math.ceil(profile.retry_after_ms / 1000.0)))}
+            if service == "openai":
+                payload = {"error": {"message": "Rate limit reached (stub).", "type": "requests", "param": None, "code": "rate_limit_exceeded"}}
+            elif service == "drive":
+                payload = {"error": {"code": 429, "message": "Rate limit exceeded (stub).", "errors": [{"reason": "rateLimitExceeded"}]}}
+            else: payload = {"detail": {"error": "Rate limit exceeded (stub)."}}
+            self._send_json(payload, status=429, headers=headers)
+            return True
+        self._simulate_latency(service)
+        if service == "openai": payload = {"error": {"message": "The server had an error (stub).", "type": "server_error", "param": None, "code": None}}
+        elif service == "drive": payload = {"error": {"code": 500, "message": "Backend Error (stub).", "errors": [{"reason": "backendError"}]}}
+        else: payload = {"detail": {"error": "Internal error (stub)."}}
+        self._send_json(payload, status=500)
+        return True
+
+    # --- Rutas ---
+    def do_GET(self) -> None:
+        if urlparse(self.path).path == "/health":
+            with self.server.counter_lock: counts = dict(self.server.request_counts)
+            self._send_json({"status": "ok", "requests": counts,
+                             "profiles": {name: profile.describe() for name, profile in self.server.profiles.items()}})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self) -> None:
+        parsed = urlparse(self.path)
+        body = self._read_body()
+        if parsed.path.endswith("/chat/completions"): return self._chat_completions(body)
+        if parsed.path == "/search": return self._tavily_search(body)
+        if parsed.path.startswith("/upload/drive/v3/files"): return self._drive_upload_start(parsed)
+        if parsed.path.startswith("/drive/v3/files"): return self._drive_file_created(body)
+        self._send_json({"error": "not found"}, status=404)
+
+    def do_PUT(self) -> None:
+        parsed = urlparse(self.path)
+        body = self._read_body()
+        if parsed.path.startswith("/upload/drive/v3/files"): return self._drive_file_created(body)
+        self._send_json({"error": "not found"}, status=404)
+
+    # --- OpenAI ---
+    def _chat_content(self, prompt: str) -> str:
+        """Salida fija: la primera regla `chat_rules` cuyo `match` aparece en el prompt; si no, el informe (en ReAct para agentes)."""
+        canned = self.server.canned
+        for rule in canned.get("chat_rules") or []:
+            if rule.get("match") and rule["match"] in prompt: return rule.get("content") or ""
+        report = canned.get("report") or STUB_REPORT
+        if "Final Answer" in prompt: return canned.get("agent_answer") or f"Thought: Ya tengo la respuesta final.\nFinal Answer: {report}"
+        return report
+
+    def _chat_completions(self, body: bytes) -> None:
+        self._count("openai_chat")
+        if self._inject_fault("openai", "openai_chat"): return
+        self._simulate_latency("openai") # Hasta el primer token
+        request = json.loads(body or b"{}")
+        prompt = " ".join(str(m.get("content") or "") for m in request.get("messages", []))
+        content = self._chat_content(prompt)
+        prompt_tokens, completion_tokens = max(1, len(prompt) // 4), max(1, len(content) // 4)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        pieces = _STREAM_PIECE_RE.findall(content)
+        if request.get("stream"): return self._chat_completions_stream(request, pieces, usage)
+        token_interval_s = self._profile("openai").token_interval_s
+        if token_interval_s > 0: time.sleep(token_interval_s * len(pieces)) # Sin streaming el cliente espera a la generación completa
+        self._send_json({
+            "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model") or "gpt-3.5-turbo",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _chat_completions_stream(self, request: Dict[str, Any], pieces: List[str], usage: Dict[str, int]) -> None:
+        """`stream: true`: un chunk SSE por palabra cada `token_interval_ms`, y el de `usage` si lo pide `stream_options`."""
+        base = {"id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get("model") or "gpt-3.5-turbo"}
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        token_interval_s = self._profile("openai").token_interval_s
+        try:
+            for i, piece in enumerate(pieces):
+                if i and token_interval_s > 0: time.sleep(token_interval_s)
+                delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+                chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self._write_chunk(f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n".encode("utf-8"))
+            if (request.get("stream_options") or {}).get("include_usage"):
+                self._write_chunk(f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError): # El cliente cortó el stream (cancelación)
+            self.close_connection = True
+
+    # --- Tavily ---
+    def _tavily_search(self, body: bytes) -> None:
+        self._count("tavily_search")
+        if self._inject_fault("tavily", "tavily_search"): return
+        started = time.perf_counter()
+        self._simulate_latency("tavily")
+        request = json.loads(body or b"{}")
+        query = request.get("query") or ""
+        max_results = int(request.get("max_results") or 5)
+        canned_results = self.server.canned.get("search_results")
+        results = [dict(r) for r in canned_results[:max_results]] if canned_results else [
+            {"title": f"Resultado {i + 1} sobre {query}", "url": f"https://example.com/stub/{i + 1}",
+             "content": f"Contenido de ejemplo {i + 1} para '{query}'.", "score": round(0.9 - i * 0.1, 2)}
+            for i in range(max_results)
+        ]
+        self._send_json({"query": query, "results": results, "answer": None, "images": [], "response_time": round(time.perf_counter() - started, 3)})
+
+    # --- Google Drive ---
+    def _drive_upload_start(self, parsed) -> None:
+        # uploadType=resumable: devolver la URL de sesión; el cliente hace después un PUT con el contenido
+        if parse_qs(parsed.query).get("uploadType") == ["resumable"]:
+            session_url = f"http://{self.headers.get('Host')}/upload/drive/v3/files?upload_id={uuid.uuid4().hex}"
+            self.send_response(200)
+            self.send_header("Location", session_url)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._drive_file_created(b"")
+
+    def _drive_file_created(self, body: bytes) -> None:
+        self._count("gdrive_upload")
+        if self._inject_fault("drive", "gdrive_upload"): return
+        self._simulate_latency("drive")
+        file_id = f"stub-{uuid.uuid4().hex[:16]}"
+        self._send_json({
+            "id": file_id, "name": f"{file_id}.md",
+            "webViewLink": f"https://drive.example.com/file/d/{file_id}/view",
+            "webContentLink": f"https://drive.example.com/uc?id={file_id}",
+        })
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, token_interval_ms: float = 0.0,
+                      config: Optional[Dict[str, Any]] = None) -> StubServer:
+    """
+    Arranca el stub en un hilo daemon y devuelve el servidor (`server.server_address` tiene el puerto real).
+    `latency_ms` y `token_interval_ms` son los valores por defecto de todos los servicios; `config` (mismo formato
+    que el fichero --config) los sobrescribe por servicio y añade fallos y salidas fijas. `token_interval_ms` simula
+    la generación: tiempo entre palabras en streaming (sin streaming se suma todo antes de responder).
+    """
+    config = config or {}
+    rng = random.Random(config.get("seed"))
+    server = StubServer((host, port), StubHandler)
+    server.profiles = {}
+    for service in SERVICES:
+        options = {"latency": latency_ms, "token_interval_ms": token_interval_ms, **(config.get(service) or {})}
+        server.profiles[service] = ServiceProfile(rng, **options)
+    server.canned = config.get("canned") or {}
+    server.latency_s = max(0.0, latency_ms) / 1000.0
+    server.request_counts = {}
+    server.counter_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name="stub-externals", daemon=True).start()
+    logger.info(f"Stub de servicios externos escuchando en http://{host}:{server.server_address[1]} "
+                f"({', '.join(f'{name}: {profile.latency_spec} ms' for name, profile in server.profiles.items())}).")
+    return server
+
+
+def _config_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    config: Dict[str, Any] = {}
+    if args.config:
+        with open(args.config, encoding="utf-8") as config_file: config = json.load(config_file)
+    if args.seed is not None: config["seed"] = args.seed
+    for service in SERVICES:
+        overrides = {
+            "latency": getattr(args, f"{service}_latency"),
+            "error_rate": getattr(args, f"{service}_error_rate") if getattr(args, f"{service}_error_rate") is not None else args.error_rate,
+            "rate_limit_rate": getattr(args, f"{service}_429_rate") if getattr(args, f"{service}_429_rate") is not None else args.rate_limit_rate,
+            "retry_after_ms": args.retry_after_ms,
+        }
+        config[service] = {**(config.get(service) or {}), **{k: v for k, v in overrides.items() if v is not None}}
+    return config
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub local de OpenAI/Tavily/Google Drive para benchmarks y pruebas de carga.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia fija por defecto de todos los servicios.")
+    parser.add_argument("--token-interval-ms", type=float, default=0.0, help="Tiempo de generación por palabra de las chat completions.")
+    parser.add_argument("--config", help="Fichero JSON con perfiles por servicio y salidas fijas (ver cabecera del módulo).")
+    parser.add_argument("--seed", type=int, help="Semilla para latencias y fallos reproducibles.")
+    parser.add_argument("--error-rate", type=float, help="Fracción de respuestas 500 en todos los servicios.")
+    parser.add_argument("--rate-limit-rate", type=float, help="Fracción de respuestas 429 en todos los servicios.")
+    parser.add_argument("--retry-after-ms", type=float, help="Retry-After de los 429 (por defecto 1000).")
+    for service in SERVICES:
+        parser.add_argument(f"--{service}-latency", help=f"Latencia de {service}: 50 | uniform:MIN:MAX | normal:MEDIA:DESV | lognormal:P50:P95 | exp:MEDIA (ms).")
+        parser.add_argument(f"--{service}-error-rate", type=float, help=f"Fracción de 500 en {service}.")
+        parser.add_argument(f"--{service}-429-rate", type=float, help=f"Fracción de 429 en {service}.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = start_stub_server(args.host, args.port, args.latency_ms, args.token_interval_ms, config=_config_from_args(args))
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    print("Variables de entorno para la API:")
+    for key, value in stub_env(base_url).items(): print(f"  {key}={value}")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
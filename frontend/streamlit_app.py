@@ -2,8 +2,9 @@
 import streamlit as st
 import requests
 import os
+import json
 import logging
-from typing import Optional # <-- AÑADIR IMPORT
+from typing import Optional, Iterator, Tuple # <-- AÑADIR IMPORT
 
 # Configuración Logger y URL Backend
 logging.basicConfig(level=logging.INFO)
@@ -19,6 +20,8 @@ def handle_api_error(err, endpoint_name):
         if isinstance(err, requests.exceptions.HTTPError):
             error_detail = err.response.json().get("detail", err.response.text[:200])
             error_message = f"Error HTTP ({err.response.status_code}) en {endpoint_name}: {error_detail}"
+            if err.response.headers.get("Retry-After"): # 429/503 del control de admisión
+                error_message += f" (servidor saturado: reintenta en {err.response.headers['Retry-After']} s)"
     except Exception: pass
     st.error(error_message)
     streamlit_logger.error(error_message, exc_info=True if not isinstance(err, requests.exceptions.HTTPError) else False)
@@ -28,7 +31,8 @@ def handle_api_error(err, endpoint_name):
 def conduct_research_request(topic: str, content: Optional[str]):
     """Llama al endpoint de investigación."""
     api_endpoint = f"{FASTAPI_URL}/research/conduct"
-    payload = {"topic": topic, "content_to_analyze": content}
+    # deadline_seconds < timeout del cliente: el servidor cancela el crew antes de que nadie pueda recibir el resultado
+    payload = {"topic": topic, "content_to_analyze": content, "deadline_seconds": 400}
     streamlit_logger.info(f"POST {api_endpoint} - Tema: {topic[:30]}...")
     try:
         response = requests.post(api_endpoint, json=payload, timeout=420) # Timeout 7 mins
@@ -37,6 +41,29 @@ def conduct_research_request(topic: str, content: Optional[str]):
     except Exception as e:
         return handle_api_error(e, "/research/conduct")
 
+def iter_sse_events(response: requests.Response) -> Iterator[Tuple[str, dict]]:
+    """Parsea un stream text/event-stream y devuelve tuplas (evento, datos)."""
+    event_name, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None: continue
+        if not line: # Línea vacía = fin del evento
+            if data_lines:
+                yield event_name, json.loads("\n".join(data_lines))
+            event_name, data_lines = "message", []
+        elif line.startswith(":"): continue # Comentario keep-alive
+        elif line.startswith("event:"): event_name = line[len("event:"):].strip()
+        elif line.startswith("data:"): data_lines.append(line[len("data:"):].strip())
+
+def conduct_research_stream_request(topic: str, content: Optional[str], bypass_cache: bool = False) -> Iterator[Tuple[str, dict]]:
+    """Llama a la variante SSE del endpoint de investigación y devuelve los eventos a medida que llegan."""
+    api_endpoint = f"{FASTAPI_URL}/research/conduct/stream"
+    payload = {"topic": topic, "content_to_analyze": content, "bypass_cache": bypass_cache}
+    streamlit_logger.info(f"POST {api_endpoint} (SSE) - Tema: {topic[:30]}...")
+    # timeout=(conexión, lectura entre eventos): el servidor envía keep-alive cada 15 s
+    with requests.post(api_endpoint, json=payload, stream=True, timeout=(10, 120)) as response:
+        response.raise_for_status()
+        yield from iter_sse_events(response)
+
 # Corregido con Optional
 def query_memory_request(query: str) -> Optional[list]: # Añadir tipo de retorno opcional
     """Llama al endpoint de consulta de memoria."""
@@ -53,11 +80,11 @@ def query_memory_request(query: str) -> Optional[list]: # Añadir tipo de retorn
         return None # Devuelve None si falla
 
 # Corregido con Optional
-def generate_marketing_content_request(topic: str, platform: str, context: Optional[str]):
-    """Llama al nuevo endpoint de marketing."""
+def generate_marketing_content_request(topic: str, platforms: list, context: Optional[str], bypass_cache: bool = False):
+    """Llama al nuevo endpoint de marketing (una o varias plataformas en la misma petición)."""
     api_endpoint = f"{FASTAPI_URL}/marketing/generate-content"
-    payload = {"topic": topic, "platform": platform, "context": context}
-    streamlit_logger.info(f"POST {api_endpoint} - Tema: {topic[:30]}, Plataforma: {platform}...")
+    payload = {"topic": topic, "platforms": platforms, "context": context, "bypass_cache": bypass_cache, "deadline_seconds": 280}
+    streamlit_logger.info(f"POST {api_endpoint} - Tema: {topic[:30]}, Plataformas: {platforms}...")
     try:
         response = requests.post(api_endpoint, json=payload, timeout=300) # 5 minutos
         response.raise_for_status()
@@ -82,19 +109,53 @@ with tab_research:
     with st.form("new_research_form"):
         research_topic = st.text_input("Tema de la Investigación:", placeholder="Ej: Futuro del trabajo remoto")
         research_content = st.text_area("Contenido Base (Opcional):", height=150, placeholder="Pega texto aquí si quieres analizarlo junto con la búsqueda web.")
+        research_bypass_cache = st.checkbox("Ignorar caché (forzar nueva investigación)", key="research_bypass_cache")
         submit_research_button = st.form_submit_button("🚀 Iniciar Investigación")
 
     if submit_research_button and research_topic:
+        api_result = None
+        progress_placeholder = st.empty()
+        draft_placeholder = st.empty()
+        live_report_placeholder = st.empty()
+        live_report = {} # stream_id -> texto recibido del informe final (eventos 'token' del editor)
+        task_labels = {"research_task": "Investigación (borrador)", "editing_task": "Edición final"}
         with st.spinner(f"🔎 Procesando investigación sobre '{research_topic}'..."):
             # Pasa None explícitamente si research_content está vacío
-            api_result = conduct_research_request(research_topic, research_content if research_content and research_content.strip() else None)
+            try:
+                for event, data in conduct_research_stream_request(research_topic, research_content if research_content and research_content.strip() else None, research_bypass_cache):
+                    if event == "task_started":
+                        progress_placeholder.info(f"⏳ {task_labels.get(data.get('task'), data.get('task'))} en curso... ({data.get('elapsed_s', 0):.0f}s)")
+                    elif event == "task_completed":
+                        progress_placeholder.info(f"✅ {task_labels.get(data.get('task'), data.get('task'))} completada en {data.get('duration_s', 0):.1f}s")
+                        if data.get("task") == "research_task" and data.get("output"):
+                            with draft_placeholder.container():
+                                with st.expander("Ver Borrador (pendiente de edición)", expanded=False):
+                                    st.markdown(data["output"])
+                    elif event == "token" and data.get("operation") == "editor":
+                        live_report[data["stream_id"]] = live_report.get(data["stream_id"], "") + data.get("delta", "")
+                        live_report_placeholder.markdown(live_report[data["stream_id"]])
+                    elif event == "token_reset":
+                        live_report.pop(data.get("stream_id"), None)
+                        live_report_placeholder.empty()
+                    elif event == "result":
+                        api_result = data.get("response")
+                        progress_placeholder.empty(); draft_placeholder.empty(); live_report_placeholder.empty()
+                    elif event == "error":
+                        progress_placeholder.empty()
+                        st.error(f"Error ({data.get('status_code')}) en /research/conduct/stream: {data.get('detail')}")
+            except Exception as e:
+                handle_api_error(e, "/research/conduct/stream")
 
         if api_result:
             st.success(api_result.get("message", "Proceso completado."))
+            if api_result.get("cache_hit"): st.caption(f"⚡ Resultado desde caché (generado el {api_result.get('cached_at', '?')} UTC).")
             if api_result.get("report_gdrive_link"): st.markdown(f"📄 **Informe Final:** [Ver en Google Drive]({api_result['report_gdrive_link']})")
+            elif api_result.get("persistence_task_id"): st.caption(f"💾 Guardado en Google Drive/ChromaDB en segundo plano (tarea `{api_result['persistence_task_id']}`, ver `GET /persistence/tasks/{{id}}`).")
             if api_result.get("full_report_content"):
                 with st.expander("Ver Contenido del Informe Final", expanded=False):
                     st.markdown(api_result["full_report_content"])
+            if api_result.get("stage_timings"):
+                st.caption("⏱️ Tiempos por etapa: " + ", ".join(f"{k}: {v:.1f}s" for k, v in api_result["stage_timings"].items()))
             # Mostrar memoria relevante (si existe y no está vacía)
             past_research = api_result.get("relevant_past_research")
             if past_research:
@@ -131,24 +192,33 @@ with tab_marketing:
     st.markdown("Genera ideas, texto para posts y prompts para imágenes basado en un tema.")
     with st.form("marketing_content_form"):
         mk_topic = st.text_input("Tema Central o Producto:", placeholder="Ej: Nuestro nuevo curso online")
-        mk_platform = st.selectbox("Plataforma Destino:", ("Instagram", "LinkedIn", "Twitter/X", "Facebook", "General"), index=0)
+        mk_platforms = st.multiselect("Plataformas Destino:", ["Instagram", "LinkedIn", "Twitter/X", "Facebook", "General"], default=["Instagram"])
         mk_context = st.text_area("Contexto Adicional (Opcional):", placeholder="Ej: Audiencia: emprendedores. Objetivo: inscripciones.", height=100)
+        mk_bypass_cache = st.checkbox("Ignorar caché (forzar nueva generación)", key="mk_bypass_cache")
         submit_marketing_button = st.form_submit_button("✨ Generar Contenido de Marketing")
 
-    if submit_marketing_button and mk_topic and mk_platform:
-        with st.spinner(f"✍️ Creando contenido para '{mk_topic}' en {mk_platform}..."):
+    if submit_marketing_button and mk_topic and mk_platforms:
+        with st.spinner(f"✍️ Creando contenido para '{mk_topic}' en {', '.join(mk_platforms)}..."):
             # Pasa None explícitamente si mk_context está vacío
-            mk_api_result = generate_marketing_content_request(mk_topic, mk_platform, mk_context if mk_context and mk_context.strip() else None)
+            mk_api_result = generate_marketing_content_request(mk_topic, mk_platforms, mk_context if mk_context and mk_context.strip() else None, mk_bypass_cache)
 
         if mk_api_result:
             st.success(mk_api_result.get("message", "Contenido generado."))
+            if mk_api_result.get("cache_hit"): st.caption(f"⚡ Resultado desde caché (generado el {mk_api_result.get('cached_at', '?')} UTC).")
             st.divider()
             ideas = mk_api_result.get("marketing_ideas")
             post = mk_api_result.get("post_text")
             prompt = mk_api_result.get("image_prompt")
 
             if ideas: st.subheader("💡 Ideas Sugeridas:"); st.markdown(ideas); st.divider()
-            if post: st.subheader(f"✍️ Borrador de Post ({mk_platform}):"); st.text_area("Texto:", value=post, height=150, disabled=False, key="post_text_area"); st.divider() # Permitir copiar
+            platform_results = mk_api_result.get("platform_results")
+            if platform_results: # Respuesta multi-plataforma: una pestaña por plataforma
+                for platform_tab, (platform_name, content) in zip(st.tabs(list(platform_results.keys())), platform_results.items()):
+                    with platform_tab:
+                        if content.get("post_text"): st.subheader(f"✍️ Borrador de Post ({platform_name}):"); st.text_area("Texto:", value=content["post_text"], height=150, key=f"post_text_area_{platform_name}")
+                        if content.get("image_prompt"): st.subheader("🎨 Prompt de Imagen (DALL-E):"); st.code(content["image_prompt"], language=None)
+                        if content.get("error_details"): st.error(content["error_details"])
+            if post: st.subheader(f"✍️ Borrador de Post ({mk_api_result.get('platform')}):"); st.text_area("Texto:", value=post, height=150, disabled=False, key="post_text_area"); st.divider() # Permitir copiar
             if prompt: st.subheader("🎨 Prompt de Imagen (DALL-E):"); st.code(prompt, language=None)
             if mk_api_result.get("error_details"): st.error(f"Problema reportado: {mk_api_result['error_details']}")
         # Error ya manejado por handle_api_error si devuelve None